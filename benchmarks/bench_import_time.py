@@ -0,0 +1,90 @@
+"""
+Cold-start benchmark of the modules imported by the Streamlit pages.
+
+Imports each module on a fresh interpreter with `-X importtime` and reports the
+total time and the slowest imports it pulls in, so a library loaded at module
+level by mistake shows up at the top of the list.
+
+Usage:
+    python benchmarks/bench_import_time.py [module ...]
+"""
+
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(__file__), "..", "src")
+
+MODULES = (
+    "university_helper.metadata",
+    "university_helper.pdf_to_markdown",
+    "university_helper.transcription",
+    "university_helper.stats",
+    "university_helper.cli",
+)
+
+# Number of slowest imports shown per module
+TOP = 8
+
+
+def import_times(module: str) -> list[tuple[int, str]]:
+    """
+    Import a module on a fresh interpreter and collect the cumulative time of its imports.
+
+    Args:
+        module (str): The dotted name of the module.
+
+    Returns:
+        list[tuple[int, str]]: The cumulative microseconds and the name of each import.
+    """
+
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": SRC},
+    )
+
+    if completed.returncode != 0:
+
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+
+    times = []
+
+    for line in completed.stderr.splitlines():
+
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+
+            continue
+
+        _, cumulative, name = line.split("|")
+        times.append((int(cumulative), name.strip()))
+
+    return times
+
+
+def main() -> None:
+
+    for module in sys.argv[1:] or MODULES:
+
+        try:
+
+            times = import_times(module)
+
+        except RuntimeError as e:
+
+            print(f"{module}: failed ({e})")
+            continue
+
+        total = next(us for us, name in times if name == module)
+        print(f"{module}: {total / 1000:.1f} ms")
+
+        for us, name in sorted(times, reverse=True)[1 : TOP + 1]:
+
+            print(f"    {us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+
+    main()
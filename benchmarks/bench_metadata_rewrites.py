@@ -0,0 +1,173 @@
+"""
+Regression benchmark for the Metadata directory pipeline.
+
+Builds synthetic trees of growing size, runs the `metadata` command on them, the
+same plan_directory -> process_files -> rewrite path the Metadata page runs, and
+counts the PDFs actually written by the worker processes. Every PDF must be written
+exactly once, so the number of writes (and the time per file) grows linearly with
+the number of files, and a second, incremental run must write none.
+
+Usage:
+    python benchmarks/bench_metadata_rewrites.py
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from university_helper import cli, metadata
+
+SIZES = (10, 40, 160)
+FILES_PER_FOLDER = 10
+
+# File where the worker processes append the path of every PDF they write, passed
+# through the environment so the spawned workers find the one of the parent
+WRITE_LOG = os.environ.setdefault(
+    "BENCH_METADATA_WRITE_LOG",
+    os.path.join(tempfile.gettempdir(), f"bench_metadata_{os.getpid()}.log"),
+)
+
+_write_pdf = metadata.modify_metadata_and_add_cover
+
+
+def logged_write(pdf_path: str, degree_name: str, output_path: str) -> None:
+    """
+    Write a PDF like `modify_metadata_and_add_cover`, logging its output path.
+
+    Args:
+        pdf_path (str): The path to the original PDF.
+        degree_name (str): The name of the degree to display on the cover.
+        output_path (str): The path where the modified PDF will be saved.
+    """
+
+    _write_pdf(pdf_path, degree_name, output_path)
+
+    # Appends of a single short line are atomic, so workers never interleave them
+    with open(WRITE_LOG, "a", encoding="utf-8") as f:
+
+        f.write(output_path + "\n")
+
+
+# Installed at import, since the spawned workers import this script before running
+# any task
+metadata.modify_metadata_and_add_cover = logged_write
+
+
+def build_tree(root: str, n_files: int) -> None:
+    """
+    Create a tree with `n_files` single-page PDFs spread across several folders.
+
+    Args:
+        root (str): The directory where the tree will be created.
+        n_files (int): The number of PDFs to create.
+    """
+
+    for i in range(n_files):
+
+        folder = os.path.join(root, f"folder_{i // FILES_PER_FOLDER}")
+        os.makedirs(folder, exist_ok=True)
+        metadata.create_cover(
+            f"doc_{i}", "Benchmark", os.path.join(folder, f"doc_{i}.pdf")
+        )
+
+
+def run_pipeline(original_directory: str, new_directory: str) -> Counter:
+    """
+    Run the `metadata` command and count the writes of each output PDF.
+
+    Args:
+        original_directory (str): The tree to process.
+        new_directory (str): The directory for the modified tree.
+
+    Returns:
+        Counter: The number of times each output PDF was written.
+    """
+
+    open(WRITE_LOG, "w").close()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+
+        exit_code = cli.main(
+            [
+                "metadata",
+                original_directory,
+                new_directory,
+                "--degree",
+                "Benchmark",
+                "--jobs",
+                "2",
+            ]
+        )
+
+    assert exit_code == 0, "the metadata command reported errors"
+
+    with open(WRITE_LOG, encoding="utf-8") as f:
+
+        return Counter(f.read().split())
+
+
+def run(n_files: int) -> tuple[int, float]:
+    """
+    Process a synthetic tree twice, checking the PDFs written by each run.
+
+    Args:
+        n_files (int): The number of PDFs in the tree.
+
+    Returns:
+        tuple[int, float]: The number of writes of the first run and its time in seconds.
+    """
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+
+        original_directory = os.path.join(temp_dir, "original")
+        new_directory = os.path.join(temp_dir, "new")
+        build_tree(original_directory, n_files)
+
+        start = time.perf_counter()
+        writes = run_pipeline(original_directory, new_directory)
+        elapsed = time.perf_counter() - start
+
+        assert all(count == 1 for count in writes.values()), writes
+        assert len(writes) == n_files, f"{n_files - len(writes)} PDFs never written"
+
+        # Nothing changed, so the incremental run must not write anything
+        rewrites = run_pipeline(original_directory, new_directory)
+        assert not rewrites, f"{sum(rewrites.values())} unchanged PDFs rewritten"
+
+    return sum(writes.values()), elapsed
+
+
+def main() -> None:
+
+    per_file = []
+
+    try:
+
+        for n_files in SIZES:
+
+            writes, elapsed = run(n_files)
+            per_file.append(elapsed / n_files)
+            print(
+                f"{n_files:>5} files: {writes:>5} writes, "
+                f"{elapsed:.2f} s, {1000 * per_file[-1]:.1f} ms/file"
+            )
+
+            assert writes == n_files, f"expected {n_files} writes, got {writes}"
+
+    finally:
+
+        os.remove(WRITE_LOG)
+
+    # Pool start-up dominates small trees, so only guard against super-linear growth
+    assert per_file[-1] < 3 * per_file[0], "time per file grows with the tree size"
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,120 @@
+"""
+Microbenchmark of the OCR preprocessing stage.
+
+Compares the previous PIL -> BGR -> gray -> Otsu -> RGB -> PIL round trip with the
+single-channel, buffer-reusing `preprocess_image`, reporting the time per page and the
+peak RSS of a process running each variant.
+
+Usage:
+    python benchmarks/bench_ocr_preprocessing.py
+"""
+
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from university_helper.pdf_to_markdown import PreprocessConfig, preprocess_image
+
+# A4 page rendered at 200 DPI
+PAGE_SHAPE = (2339, 1654)
+PAGES = 50
+
+
+def make_page() -> np.ndarray:
+    """
+    Create a synthetic grayscale page with dark text-like strokes on a light background.
+
+    Returns:
+        np.ndarray: The page.
+    """
+
+    rng = np.random.default_rng(0)
+    page = np.full(PAGE_SHAPE, 235, dtype=np.uint8)
+
+    for y in range(100, PAGE_SHAPE[0] - 100, 40):
+
+        for x in rng.integers(100, PAGE_SHAPE[1] - 100, 60):
+
+            page[y : y + 18, x : x + 10] = 30
+
+    return page + rng.integers(0, 15, PAGE_SHAPE, dtype=np.uint8)
+
+
+def legacy(gray: np.ndarray) -> Image:
+    """
+    The preprocessing as it was done before: from an RGB PIL image back to an RGB PIL image.
+
+    Args:
+        gray (np.ndarray): The grayscale page.
+
+    Returns:
+        Image: The preprocessed page.
+    """
+
+    img = Image.fromarray(gray).convert("RGB")
+    img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+    gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
+    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+
+    return Image.fromarray(cv2.cvtColor(thresh, cv2.COLOR_GRAY2RGB))
+
+
+VARIANTS = {
+    "legacy": legacy,
+    "single-channel": preprocess_image,
+    "single-channel+denoise+deskew": lambda gray: preprocess_image(
+        gray, PreprocessConfig(denoise=True, deskew=True)
+    ),
+}
+
+
+def run(name: str, results: multiprocessing.Queue) -> None:
+    """
+    Time a variant on a fresh process and report its peak RSS.
+
+    Args:
+        name (str): The name of the variant.
+        results (multiprocessing.Queue): The queue receiving the measurements.
+    """
+
+    page = make_page()
+    preprocess = VARIANTS[name]
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+
+    for _ in range(PAGES):
+
+        preprocess(page)
+
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    results.put((name, 1000 * elapsed / PAGES, (peak - baseline) / 1024))
+
+
+def main() -> None:
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+
+    for name in VARIANTS:
+
+        process = context.Process(target=run, args=(name, results))
+        process.start()
+        process.join()
+        name, ms_per_page, rss = results.get()
+        print(f"{name:<30} {ms_per_page:7.1f} ms/page, +{rss:6.1f} MiB peak RSS")
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,179 @@
+"""
+Speed and accuracy benchmark of the Whisper models on each inference backend.
+
+Transcribes a short recording with every (backend, model) pair on a fresh process,
+reporting the load time, the real-time factor (seconds of processing per second of
+audio, lower is faster) and the word error rate against a reference transcript,
+then picks the fastest pair within the accepted error rate.
+
+Usage:
+    python benchmarks/bench_transcription_backends.py sample.wav sample.txt \
+        [--models tiny base small] [--backends whisper whisper-int8] [--max-wer 0.15]
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from university_helper.transcription import (
+    BACKENDS,
+    SAMPLE_RATE,
+    load_audio,
+    load_whisper_model,
+    transcribe,
+)
+
+
+def normalize(text: str) -> list[str]:
+    """
+    Split a transcript into lowercase words without punctuation.
+
+    Args:
+        text (str): The transcript.
+
+    Returns:
+        list[str]: The words.
+    """
+
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    Compute the word error rate of a transcript with the Levenshtein distance.
+
+    Args:
+        reference (str): The correct transcript.
+        hypothesis (str): The transcript to evaluate.
+
+    Returns:
+        float: The substitutions, deletions and insertions per reference word.
+    """
+
+    reference_words = normalize(reference)
+    hypothesis_words = normalize(hypothesis)
+    distances = list(range(len(hypothesis_words) + 1))
+
+    for i, reference_word in enumerate(reference_words, 1):
+
+        previous, distances[0] = distances[0], i
+
+        for j, hypothesis_word in enumerate(hypothesis_words, 1):
+
+            previous, distances[j] = distances[j], min(
+                distances[j] + 1,
+                distances[j - 1] + 1,
+                previous + (reference_word != hypothesis_word),
+            )
+
+    return distances[-1] / max(len(reference_words), 1)
+
+
+def run(
+    backend: str,
+    model_option: str,
+    audio_path: str,
+    reference: str,
+    results: multiprocessing.Queue,
+) -> None:
+    """
+    Load a model and transcribe the sample on a fresh process.
+
+    Args:
+        backend (str): The inference backend.
+        model_option (str): The name of the Whisper model.
+        audio_path (str): The path to the recording.
+        reference (str): The correct transcript.
+        results (multiprocessing.Queue): The queue receiving the measurements.
+    """
+
+    try:
+
+        audio = load_audio(audio_path)
+
+        start = time.perf_counter()
+        model = load_whisper_model(model_option, backend)
+        load_seconds = time.perf_counter() - start
+
+        # Warm-up, so that lazy initialization is not counted
+        transcribe(model, audio[: SAMPLE_RATE * 5])
+
+        start = time.perf_counter()
+        text = transcribe(model, audio)["text"]
+        rtf = (time.perf_counter() - start) / (len(audio) / SAMPLE_RATE)
+
+        results.put(
+            (backend, model_option, load_seconds, rtf, word_error_rate(reference, text))
+        )
+
+    except Exception as e:
+
+        results.put((backend, model_option, f"{type(e).__name__}: {e}"))
+
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("audio", help="Short recording to transcribe.")
+    parser.add_argument("reference", help="Text file with its correct transcript.")
+    parser.add_argument("--models", nargs="+", default=["tiny", "base", "small"])
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--max-wer", type=float, default=0.15)
+    args = parser.parse_args()
+
+    with open(args.reference, encoding="utf-8") as f:
+
+        reference = f.read()
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    accepted = []
+
+    print(f"{'backend':<16} {'model':<8} {'load s':>7} {'RTF':>7} {'WER':>7}")
+
+    for model_option in args.models:
+
+        for backend in args.backends:
+
+            process = context.Process(
+                target=run, args=(backend, model_option, args.audio, reference, results)
+            )
+            process.start()
+            process.join()
+            measurement = results.get()
+
+            if len(measurement) == 3:
+
+                print(f"{backend:<16} {model_option:<8} failed ({measurement[2]})")
+                continue
+
+            _, _, load_seconds, rtf, wer = measurement
+            print(
+                f"{backend:<16} {model_option:<8} {load_seconds:7.1f} {rtf:7.3f} {wer:7.1%}"
+            )
+
+            if wer <= args.max_wer:
+
+                accepted.append((rtf, backend, model_option))
+
+    if accepted:
+
+        rtf, backend, model_option = min(accepted)
+        print(
+            f"\nFastest within {args.max_wer:.0%} WER: {model_option} on {backend} "
+            f"(RTF {rtf:.3f})"
+        )
+
+    else:
+
+        print(f"\nNo model reached {args.max_wer:.0%} WER")
+
+
+if __name__ == "__main__":
+
+    main()
@@ -1,16 +1,11 @@
 import os
-import shutil
 
 import streamlit as st
-import pikepdf
-from PyPDF2 import PdfReader, PdfWriter
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from faker import Faker
 from stqdm import stqdm
 
-# Generate random data for metadata
-fake = Faker()
+from university_helper.file_transfer import LINK_STRATEGIES
+from university_helper.manifest import Manifest
+from university_helper.metadata import Throughput, plan_directory, process_files
 
 
 # Set the page configuration for Streamlit
@@ -19,123 +14,63 @@ st.title("📝 Metadata")
 st.sidebar.image("./images/logo.png")
 
 
-def create_cover(file_name: str, degree_name: str, output_path: str) -> None:
-    """
-    Create a cover page for the PDF with the file name and degree name.
-
-    Args:
-        file_name (str): The name of the file to display on the cover.
-        degree_name (str): The name of the degree to display on the cover.
-        output_path (str): The path where the cover PDF will be saved.
-    """
-
-    c = canvas.Canvas(output_path, pagesize=letter)
-    width, height = letter
-
-    # Write the file name on the cover
-    c.setFont("Helvetica", 24)
-    c.drawCentredString(width / 2.0, height / 2.0 + 40, f"File Name: {file_name}")
-
-    # Write the degree name on the cover
-    c.setFont("Helvetica", 20)
-    c.drawCentredString(width / 2.0, height / 2.0, f"Degree: {degree_name}")
-
-    c.save()
-
-
-def modify_metadata_and_add_cover(
-    pdf_path: str, degree_name: str, output_path: str
+def analyze_directory(
+    original_directory: str,
+    new_directory: str,
+    degree_name: str,
+    jobs: int,
+    incremental: bool = True,
+    link_strategy: str = "copy",
 ) -> None:
     """
-    Modify the metadata and add a cover page to the PDF.
+    Analyze the directory, modify PDF metadata, and add a cover page.
 
     Args:
-        pdf_path (str): The path to the original PDF.
+        original_directory (str): The path to the original directory.
+        new_directory (str): The path to the new directory.
         degree_name (str): The name of the degree to display on the cover.
-        output_path (str): The path where the modified PDF will be saved.
+        jobs (int): The number of worker processes to use.
+        incremental (bool, optional): Whether to skip the files unchanged since the previous run. Defaults to True.
+        link_strategy (str, optional): How to mirror files other than PDFs. Defaults to "copy".
     """
 
-    reader = PdfReader(pdf_path)
-    writer = PdfWriter()
-
-    # Create a temporary cover in the same directory as the PDF
-    cover_path = os.path.join(os.path.dirname(output_path), "cover_temp.pdf")
-    create_cover(os.path.basename(pdf_path), degree_name, cover_path)
-
-    # Read the cover and add it
-    cover_reader = PdfReader(cover_path)
-    writer.add_page(cover_reader.pages[0])
-
-    # Add the original PDF pages
-    for page in reader.pages:
-
-        writer.add_page(page)
-
-    # Random metadata
-    metadata = {
-        "/Title": fake.sentence(nb_words=5),
-        "/Author": fake.name(),
-        "/Subject": fake.sentence(nb_words=7),
-        "/Producer": fake.company(),
-        "/Creator": fake.name(),
-        "/Keywords": ", ".join(fake.words(nb=5)),
-    }
-
-    writer.add_metadata(metadata)
+    with Manifest(new_directory) as manifest:
 
-    # Save the file with modified metadata and added cover
-    temp_output_path = output_path + ".temp"
+        tasks = plan_directory(original_directory, new_directory)
 
-    with open(temp_output_path, "wb") as modified_file:
+        if incremental:
 
-        writer.write(modified_file)
+            tasks = list(manifest.pending(tasks))
 
-    # Remove the temporary cover file
-    os.remove(cover_path)
+        throughput = Throughput()
+        progress_bar = stqdm(total=len(tasks), desc="Making the modifications...")
 
-    # Compress the PDF
-    with pikepdf.open(temp_output_path) as pdf:
+        for result in process_files(
+            tasks, degree_name, jobs=jobs, link_strategy=link_strategy
+        ):
 
-        pdf.save(output_path)
+            manifest.record(result)
+            throughput.update(result)
+            progress_bar.set_postfix_str(str(throughput))
+            progress_bar.update(1)
 
-    # Remove the temporary uncompressed file
-    os.remove(temp_output_path)
+            if result.error is not None:
 
+                st.error(f"Error processing {result.task.source_path}: {result.error}")
 
-def analyze_directory(
-    original_directory: str, new_directory: str, degree_name: str
-) -> None:
-    """
-    Analyze the directory, modify PDF metadata, and add a cover page.
-
-    Args:
-        original_directory (str): The path to the original directory.
-        new_directory (str): The path to the new directory.
-        degree_name (str): The name of the degree to display on the cover.
-    """
-
-    for root, dirs, files in os.walk(original_directory):
+            elif not result.skipped:
 
-        # Create the directory structure in the new directory
-        relative_path = os.path.relpath(root, original_directory)
-        new_root = os.path.join(new_directory, relative_path)
-        os.makedirs(new_root, exist_ok=True)
+                print(f"Processed {result.task.output_path}")
 
-        for _ in stqdm(range(len(files)), desc="Making the modifications..."):
+        progress_bar.close()
 
-            for file in files:
-
-                if file.lower().endswith(".pdf"):
-
-                    pdf_path = os.path.join(root, file)
-                    new_pdf_path = os.path.join(new_root, file)
-                    modify_metadata_and_add_cover(pdf_path, degree_name, new_pdf_path)
-                    print(f"Metadata and cover modified for {new_pdf_path}")
-
-                else:
-
-                    # Copy other files without modifications
-                    shutil.copy(os.path.join(root, file), os.path.join(new_root, file))
+    st.success(
+        f"{throughput.files - throughput.skipped - throughput.errors} files processed, "
+        f"{manifest.skipped + throughput.skipped} unchanged files skipped, "
+        f"{throughput.errors} errors, "
+        f"{throughput.bytes_moved / 1e6:.1f} MB written, "
+        f"{throughput.bytes_linked / 1e6:.1f} MB linked"
+    )
 
 
 def main() -> None:
@@ -160,13 +95,32 @@ def main() -> None:
 
         degree = st.text_input("Enter the name of the degree:")
 
+    jobs = st.number_input(
+        "Number of worker processes", min_value=1, value=os.cpu_count() or 1
+    )
+
+    incremental = st.checkbox("Skip files unchanged since the previous run", True)
+
+    link_strategy = st.selectbox(
+        "How to mirror files other than PDFs",
+        LINK_STRATEGIES,
+        help="Linking strategies fall back to a copy if the filesystem does not support them.",
+    )
+
     start_button = st.button("Initialize metadata modification")
 
     if start_button:
 
         new_directory = f"./{output_directory}/{degree}/"
         os.makedirs(new_directory, exist_ok=True)
-        analyze_directory(data_directory, new_directory, degree)
+        analyze_directory(
+            data_directory,
+            new_directory,
+            degree,
+            int(jobs),
+            incremental,
+            link_strategy,
+        )
 
 
 if __name__ == "__main__":
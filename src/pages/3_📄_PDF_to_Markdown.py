@@ -1,12 +1,25 @@
-from PIL import Image
+import hashlib
+import io
+import os
+from typing import Iterator
 
 import streamlit as st
 import fitz
 import pytesseract
-import cv2
-import numpy as np
-from markdownify import markdownify as md
-from PyPDF2 import PdfReader
+
+from university_helper.cache import DiskCache
+from university_helper.jobs import JobQueue
+from university_helper.pdf_to_markdown import (
+    PreprocessConfig,
+    RenderConfig,
+    convert_pdf_to_markdown,
+    extract_pages_ctrl_a,
+    extract_pages_pypdf2,
+    ocr_pages,
+    open_ocr_cache,
+    plan_markdown_tree,
+    write_markdown,
+)
 
 
 # Set the page configuration for Streamlit
@@ -15,135 +28,234 @@ st.title("📄 PDF to Markdown")
 st.sidebar.image("./images/logo.png")
 
 
-def preprocess_image(img: Image) -> Image:
+@st.cache_resource
+def get_ocr_cache() -> DiskCache:
+    """
+    Get the persistent OCR cache, shared by every session of the process.
+
+    Returns:
+        DiskCache: The OCR cache.
     """
-    Apply basic image preprocessing techniques to improve OCR accuracy.
+
+    return open_ocr_cache()
+
+
+def get_open_document(pdf_file) -> dict:
+    """
+    Get the parsed documents of an upload, opening them only once per session.
+
+    Documents are kept in the session state, keyed by the upload's file ID, and shared by
+    every extraction method and rerun. Uploads with the same contents share one entry.
+    Documents of previous uploads are closed, and the rest are released with the session.
 
     Args:
-        img (Image): The input image.
+        pdf_file (UploadedFile): The uploaded PDF file.
 
     Returns:
-        Image: The preprocessed image.
+        dict: The content hash, the raw bytes, the PyMuPDF document and the (lazily created) PyPDF2 reader.
     """
 
-    img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-    gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
-    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    documents = st.session_state.setdefault("pdf_documents", {})
+
+    if pdf_file.file_id not in documents:
+
+        data = pdf_file.getvalue()
+        content_hash = hashlib.sha256(data).hexdigest()
+        entry = next((e for e in documents.values() if e["hash"] == content_hash), None)
 
-    return Image.fromarray(cv2.cvtColor(thresh, cv2.COLOR_GRAY2RGB))
+        if entry is None:
 
+            entry = {
+                "hash": content_hash,
+                "data": data,
+                "document": fitz.open(stream=data, filetype="pdf"),
+                "reader": None,
+            }
 
-def extract_text_from_pdf_ocr(pdf_file, ln: str) -> str or None:
+        # Only the current upload is kept open
+        for old_entry in documents.values():
+
+            if old_entry is not entry:
+
+                old_entry["document"].close()
+
+        documents.clear()
+        documents[pdf_file.file_id] = entry
+
+    return documents[pdf_file.file_id]
+
+
+def extract_pages(
+    pdf_file,
+    extraction_method: str,
+    ln: str = "eng",
+    workers: int = 1,
+    preprocessing: PreprocessConfig = PreprocessConfig(),
+    rendering: RenderConfig = RenderConfig(),
+) -> tuple[Iterator[str], int]:
     """
-    Extract text from a PDF file using OCR.
+    Open a PDF file and start extracting its text with the selected method.
 
     Args:
-        pdf_file (BytesIO): The PDF file object.
+        pdf_file (UploadedFile): The uploaded PDF file.
+        extraction_method (str): One of "Auto", "OCR", "PyPDF2" or "Ctrl+A".
+        ln (str, optional): The tesseract languages, joined with "+". Defaults to "eng".
+        workers (int, optional): The number of pages processed at once. Defaults to 1.
+        preprocessing (PreprocessConfig, optional): The optional preprocessing steps. Defaults to none.
+        rendering (RenderConfig, optional): The rendering settings. Defaults to RenderConfig().
 
     Returns:
-        str: The extracted text from the PDF, or None if there was an error.
+        tuple[Iterator[str], int]: The text of each page as it is extracted, and the number of pages.
     """
 
-    try:
+    entry = get_open_document(pdf_file)
 
-        # Open the PDF file
-        pdf_document = fitz.open(stream=pdf_file.read(), filetype="pdf")
-        text = ""
+    if extraction_method == "PyPDF2":
 
-        for page_num in range(len(pdf_document)):
+        if entry["reader"] is None:
 
-            page = pdf_document.load_page(page_num)
-            pix = page.get_pixmap()
+            from PyPDF2 import PdfReader
 
-            # Save the page image
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+            entry["reader"] = PdfReader(io.BytesIO(entry["data"]))
 
-            # Apply image preprocessing
-            img = preprocess_image(img)
+        pdf_reader = entry["reader"]
 
-            # Apply OCR to the image
-            page_text = pytesseract.image_to_string(img, lang=ln)
-            text += page_text + "\n"
+        return extract_pages_pypdf2(pdf_reader), len(pdf_reader.pages)
 
-        return text
+    pdf_document = entry["document"]
 
-    except Exception as e:
+    if extraction_method == "Ctrl+A":
 
-        st.error(f"Error extracting text from PDF using OCR: {e}")
-        return None
+        return extract_pages_ctrl_a(pdf_document), len(pdf_document)
+
+    pages = ocr_pages(
+        pdf_document,
+        ln,
+        workers,
+        get_ocr_cache(),
+        extraction_method == "Auto",
+        preprocessing,
+        rendering,
+    )
+
+    return pages, len(pdf_document)
 
 
-def extract_text_from_pdf_pypdf2(pdf_file) -> str or None:
+def show_pages(pages: Iterator[str], total: int) -> bool:
     """
-    Extract text from a PDF file using PyPDF2.
+    Display each page as soon as it is extracted.
 
     Args:
-        pdf_file (BytesIO): The PDF file object.
+        pages (Iterator[str]): The text of each page.
+        total (int): The number of pages.
 
     Returns:
-        str: The extracted text from the PDF, or None if there was an error.
+        bool: True if every page was extracted, False if there was an error.
     """
 
+    progress_bar = st.progress(0.0)
+    container = st.container(height=300)
+
     try:
 
-        # Open the PDF file
-        pdf_reader = PdfReader(pdf_file)  # Updated to PdfReader
-        text = ""
+        for page_num, page_text in enumerate(pages, start=1):
 
-        for page in pdf_reader.pages:
+            container.text(page_text)
+            progress_bar.progress(page_num / total, f"Page {page_num} of {total}")
 
-            text += page.extract_text() + "\n"
+    except Exception as e:
 
-        return text
+        st.error(f"Error extracting text from PDF: {e}")
+        return False
 
-    except Exception as e:
+    progress_bar.empty()
 
-        st.error(f"Error extracting text from PDF using PyPDF2: {e}")
-        return None
+    return True
 
 
-def extract_text_from_pdf_ctrl_a(pdf_file) -> str or None:
+@st.cache_data
+def get_ocr_languages() -> list[str]:
     """
-    Extract text from a PDF file by emulating Ctrl+A.
-
-    Args:
-        pdf_file (BytesIO): The PDF file object.
+    Get the languages installed for tesseract, asking the binary once per process.
 
     Returns:
-        str: The extracted text from the PDF, or None if there was an error.
+        list[str]: The available languages.
     """
 
-    try:
+    return pytesseract.get_languages()
 
-        # Open the PDF file
-        pdf_document = fitz.open(stream=pdf_file.read(), filetype="pdf")
-        text = ""
 
-        for page in pdf_document:
+def batch_busy() -> bool:
+    """
+    Check whether the batch conversion of the session still has jobs to process.
 
-            text += page.get_text() + "\n"  # Updated to get_text()
+    Returns:
+        bool: Whether any job is queued or running.
+    """
 
-        return text
+    if "pdf_jobs" not in st.session_state:
 
-    except Exception as e:
+        return False
 
-        st.error(f"Error extracting text from PDF using Ctrl+A: {e}")
-        return None
+    summary = st.session_state.pdf_jobs.summary()
+
+    return summary["queued"] + summary["running"] > 0
 
 
-def convert_text_to_markdown(text: str) -> str:
+def get_batch_queue(files_at_once: int) -> JobQueue:
     """
-    Convert plain text to Markdown format.
+    Get the batch conversion queue of the session, creating it on first use.
+
+    The queue lives in the session state, so its jobs keep running across reruns. It
+    is replaced when the number of files converted at once changes, which the page
+    only allows while the queue is idle.
 
     Args:
-        text (str): The plain text to convert.
+        files_at_once (int): The number of files converted at once.
 
     Returns:
-        str: The converted Markdown text.
+        JobQueue: The batch conversion queue.
+    """
+
+    queue = st.session_state.get("pdf_jobs")
+
+    if queue is None or (queue.workers != files_at_once and not batch_busy()):
+
+        if queue is not None:
+
+            queue.shutdown()
+
+        st.session_state.pdf_jobs = JobQueue(convert_pdf_to_markdown, files_at_once)
+
+    return st.session_state.pdf_jobs
+
+
+@st.fragment(run_every=2)
+def show_batch_status() -> None:
+    """
+    Display the status of the batch conversion, refreshing it every two seconds.
     """
 
-    markdown_text = md(text)
-    return markdown_text
+    if "pdf_jobs" not in st.session_state:
+
+        return
+
+    queue = st.session_state.pdf_jobs
+    summary = queue.summary()
+
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Queued", summary["queued"])
+    col2.metric("Running", summary["running"])
+    col3.metric("Done", summary["done"])
+    col4.metric("Failed", summary["failed"])
+    col5.metric("Pages/s", f"{summary['units_per_second']:.2f}")
+
+    st.dataframe(
+        queue.table(),
+        use_container_width=True,
+        hide_index=True,
+        column_config={"units": "pages"},
+    )
 
 
 def main() -> None:
@@ -157,11 +269,34 @@ def main() -> None:
 
         st.subheader("File configuration")
 
-        uploaded_file = st.file_uploader("Choose a PDF file", type="pdf")
+        mode = st.radio("Mode", ["Single file", "Batch"], horizontal=True)
+
+        if mode == "Single file":
+
+            uploaded_file = st.file_uploader("Choose a PDF file", type="pdf")
+
+            output_path = st.text_input("Enter the output directory", ".")
+            output_file = st.text_input("Enter the output file name", "output")
+            output_file = f"{output_path}/{output_file}.md"
+
+            save = st.checkbox("Save as .md while extracting", True)
 
-        output_path = st.text_input("Enter the output directory", ".")
-        output_file = st.text_input("Enter the output file name", "output")
-        output_file = f"{output_path}/{output_file}.md"
+        else:
+
+            input_directory = st.text_input("Enter the directory with the PDF files")
+            uploaded_files = st.file_uploader(
+                "Or choose several PDF files", type="pdf", accept_multiple_files=True
+            )
+
+            output_path = st.text_input("Enter the output directory", "./markdown")
+
+            files_at_once = st.number_input(
+                "Number of files converted at once",
+                min_value=1,
+                value=2,
+                disabled=batch_busy(),
+                help="Can be changed once the queued files are converted.",
+            )
 
     with col2:
 
@@ -169,65 +304,140 @@ def main() -> None:
 
         st.info(
             """
+            + Auto method uses the text layer of each page and applies OCR only to the scanned ones.
             + PyPDF2 method may not work well with scanned PDFs or PDFs with complex layouts.
             + Ctrl+A method may not work well with PDFs that contain a lot of graphics or tables. 
             + The OCR method is generally the most accurate, but it can be slow and may not work well with PDFs that contain a lot of noise or distortion."""
         )
 
         extraction_method = st.selectbox(
-            "Select the extraction method", ["OCR", "PyPDF2", "Ctrl+A"]
+            "Select the extraction method", ["Auto", "OCR", "PyPDF2", "Ctrl+A"]
         )
 
-        if extraction_method == "OCR":
+        ln, workers = "eng", 1
+        preprocessing, rendering = PreprocessConfig(), RenderConfig()
+
+        if extraction_method in ("Auto", "OCR"):
 
             ln = st.multiselect(
-                "List of available languages", pytesseract.get_languages(), ["eng"]
+                "List of available languages", get_ocr_languages(), ["eng"]
             )
             ln = "+".join(ln)
 
-    if uploaded_file is not None and st.button("Extract text"):
+            # The files of a batch share the CPUs, so their pages do not oversubscribe them
+            max_workers = os.cpu_count() or 1
 
-        if extraction_method == "OCR":
+            if mode == "Batch":
 
-            with st.spinner("Applying OCR to the document..."):
+                max_workers = max(1, max_workers // int(files_at_once))
 
-                text = extract_text_from_pdf_ocr(uploaded_file, ln)
+            workers = st.number_input(
+                "Number of pages processed at once"
+                + (" per file" if mode == "Batch" else ""),
+                min_value=1,
+                max_value=max_workers,
+                value=max_workers,
+            )
 
-        elif extraction_method == "PyPDF2":
+            preprocessing = PreprocessConfig(
+                denoise=st.checkbox("Remove noise before OCR"),
+                deskew=st.checkbox("Straighten rotated scans before OCR"),
+            )
 
-            text = extract_text_from_pdf_pypdf2(uploaded_file)
+            rendering = RenderConfig(
+                max_pixels=int(
+                    st.number_input(
+                        "Maximum megapixels per rendered page",
+                        min_value=1,
+                        value=RenderConfig.max_pixels // 1_000_000,
+                    )
+                    * 1_000_000
+                ),
+                clip_to_text=st.checkbox(
+                    "Render only the area of the page with content"
+                ),
+            )
 
-        elif extraction_method == "Ctrl+A":
+    if mode == "Batch":
 
-            text = extract_text_from_pdf_ctrl_a(uploaded_file)
+        if st.button("Add to the queue"):
 
-        else:
+            queue = get_batch_queue(int(files_at_once))
+            cache = get_ocr_cache() if extraction_method in ("Auto", "OCR") else None
+            options = (
+                extraction_method,
+                ln,
+                int(workers),
+                cache,
+                preprocessing,
+                rendering,
+            )
+
+            if input_directory:
+
+                for pdf_path, md_path in plan_markdown_tree(
+                    input_directory, output_path
+                ):
+
+                    name = os.path.relpath(pdf_path, input_directory)
+                    queue.submit(name, pdf_path, md_path, *options)
+
+            for pdf_file in uploaded_files:
+
+                md_path = os.path.join(
+                    output_path, os.path.splitext(pdf_file.name)[0] + ".md"
+                )
+                queue.submit(pdf_file.name, pdf_file.getvalue(), md_path, *options)
+
+        show_batch_status()
+        return None
+
+    if uploaded_file is not None and st.button("Extract text"):
+
+        if extraction_method not in ("Auto", "OCR", "PyPDF2", "Ctrl+A"):
 
             st.error(f"Option not available.")
             return None
 
-        if text:
-
-            markdown_text = convert_text_to_markdown(text)
+        try:
 
-            st.subheader("Extracted text")
-            st.text_area("Extracted Text", text, height=300, label_visibility="hidden")
+            pages, total = extract_pages(
+                uploaded_file,
+                extraction_method,
+                ln,
+                int(workers),
+                preprocessing,
+                rendering,
+            )
 
-            save_button = st.button("Save as .md")
+        except Exception as e:
 
-            if save_button:
+            st.error(f"Error opening the PDF file: {e}")
+            return None
 
-                with open(output_file, "w", encoding="utf-8") as f:
+        if save:
 
-                    f.write(markdown_text)
+            pages = write_markdown(pages, output_file)
 
-                st.success(f"File saved as {output_file}")
+        st.subheader("Extracted text")
 
-        else:
+        if not show_pages(pages, total):
 
             st.error(f"An error has occurred during text extraction, please try again.")
             return None
 
+        if extraction_method in ("Auto", "OCR"):
+
+            stats = get_ocr_cache().stats()
+            st.caption(
+                f"OCR cache: {stats['hits']} hits, {stats['misses']} misses, "
+                f"{stats['entries']} pages stored ({stats['bytes'] / 1e6:.1f} MB)"
+            )
+
+        if save:
+
+            st.success(f"File saved as {output_file}")
+
 
 if __name__ == "__main__":
 
@@ -1,13 +1,51 @@
 import datetime
-import io
 import os
-import tempfile
+from typing import TYPE_CHECKING, Callable
 
 import streamlit as st
-import whisper
 import numpy as np
-import yt_dlp
-from audiorecorder import audiorecorder
+
+from university_helper.audio import SAMPLE_RATE, pcm_to_float32, resample
+from university_helper.batch_transcription import (
+    TranscriptionPipeline,
+    collect_unfinished_jobs,
+    plan_audio_tree,
+    plan_youtube_sources,
+)
+from university_helper.cache import DiskCache
+from university_helper.model_registry import PRELOAD_MODEL, ModelRegistry
+from university_helper.streaming import (
+    LiveTranscription,
+    StreamingTranscriber,
+    live_input_available,
+)
+from university_helper.transcription import (
+    BACKENDS,
+    audio_fingerprint,
+    compact_result,
+    get_cached_transcript,
+    load_audio,
+    open_transcript_cache,
+    plan_chunks,
+    put_cached_transcript,
+    stitch_segments,
+    transcribe,
+    transcribe_chunks,
+    transcript_key,
+    transcription_workers,
+)
+from university_helper.transcript_export import (
+    EXPORT_FORMATS,
+    export_path,
+    export_transcript,
+)
+from university_helper.youtube import download_audio, youtube_video_id
+
+if TYPE_CHECKING:
+
+    from audiorecorder import audiorecorder
+
+# The audio recorder widget is imported only when a recording is requested
 
 
 # Set the page configuration for Streamlit
@@ -20,62 +58,38 @@ st.title("🎙️ Audio Transcription")
 st.sidebar.image("./images/logo.png")
 
 
-def download_youtube_video(temp_dir: str) -> str:
+def download_youtube_video(url: str) -> str:
     """
-    Download a YouTube video as an audio file to a temporary directory using yt-dlp.
+    Download the audio of a YouTube video using yt-dlp, unless it was downloaded before.
 
     Args:
-        temp_dir (str): The temporary directory to save the audio file.
+        url (str): The URL of the YouTube video.
 
     Returns:
         str: The path to the downloaded audio file.
     """
 
-    url = st.text_input(
-        "Enter the URL of the YouTube video to transcribe:",
-        "https://www.youtube.com/watch?v=YbADVar8tjY",
-    )
+    # Create a progress bar
+    progress_bar = st.progress(0)
+    status_text = st.empty()
 
-    if st.button("Download video"):
-
-        # Create a progress bar
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-
-        ydl_opts = {
-            "format": "bestaudio/best",
-            "outtmpl": os.path.join(temp_dir, "%(title)s.%(ext)s"),
-            "postprocessors": [
-                {
-                    "key": "FFmpegExtractAudio",
-                    "preferredcodec": "mp3",
-                    "preferredquality": "192",
-                }
-            ],
-            "quiet": True,
-            "progress_hooks": [lambda d: update_progress(d, progress_bar, status_text)],
-        }
-
-        try:
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-
-                info_dict = ydl.extract_info(url, download=True)
-                audio_file_path = ydl.prepare_filename(info_dict).replace(
-                    ".webm", ".mp3"
-                )
+    try:
 
-            # Remove progress bar when done
-            progress_bar.empty()
-            status_text.success("Download completed")
+        audio_file_path = download_audio(
+            url, progress_hook=lambda d: update_progress(d, progress_bar, status_text)
+        )
 
-            return audio_file_path
+        # Remove progress bar when done
+        progress_bar.empty()
+        status_text.success("Download completed")
 
-        except Exception as e:
+        return audio_file_path
 
-            st.error(f"Error downloading video: {str(e)}")
+    except Exception as e:
 
-            return ""
+        st.error(f"Error downloading video: {str(e)}")
+
+        return ""
 
 
 def update_progress(d, progress_bar, status_text):
@@ -91,7 +105,7 @@ def update_progress(d, progress_bar, status_text):
     if d["status"] == "downloading":
 
         downloaded_bytes = d.get("downloaded_bytes", 0)
-        total_bytes = d.get("total_bytes", 0)
+        total_bytes = d.get("total_bytes") or d.get("total_bytes_estimate") or 0
 
         if total_bytes > 0:
 
@@ -105,56 +119,163 @@ def update_progress(d, progress_bar, status_text):
         status_text.text("Download finished.")
 
 
-def load_whisper_model(model_option: str) -> whisper.Whisper:
+def record_audio() -> "audiorecorder":
     """
-    Load the Whisper model.
-
-    Args:
-        model_option (str): The name of the Whisper model to load.
+    Record audio using the audiorecorder.
 
     Returns:
-        whisper.Whisper: The loaded Whisper model.
+        audiorecorder: The recorded audio.
     """
 
-    return whisper.load_model(model_option, in_memory=True)
+    from audiorecorder import audiorecorder
+
+    return audiorecorder("Click to record", "Click to stop recording")
 
 
-def record_audio() -> audiorecorder:
+@st.fragment(run_every=1)
+def show_live_transcription() -> None:
     """
-    Record audio using the audiorecorder.
+    Display the live transcription and its latency, refreshing it every second.
+    """
+
+    if "live_transcription" not in st.session_state:
+
+        return
+
+    status = st.session_state.live_transcription.status()
+
+    if status["error"] is not None:
+
+        st.error(f"Error transcribing audio: {str(status['error'])}")
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Window latency", f"{status['latency']:.2f} s")
+    col2.metric("Mean latency", f"{status['mean_latency']:.2f} s")
+    col3.metric("Windows", status["windows"])
+
+    # The pending words may still change, so they are shown apart from the rest
+    st.markdown(f"{status['text']} *{status['partial']}*")
+
+
+def transcribe_long(
+    model_option: str,
+    file: str | np.ndarray,
+    workers: int,
+    backend: str = "whisper",
+    **options,
+) -> dict:
+    """
+    Transcribe a long recording in chunks on several processes, showing the progress.
+
+    Args:
+        model_option (str): The name of the Whisper model each worker loads.
+        file (str | np.ndarray): The path to the audio file, or a 16 kHz waveform.
+        workers (int): The number of worker processes.
+        backend (str, optional): The inference backend running the model. Defaults to "whisper".
+        **options: Extra decoding options passed to Whisper (e.g. language).
 
     Returns:
-        audiorecorder: The recorded audio.
+        dict: The stitched Whisper result.
     """
 
-    return audiorecorder("Click to record", "Click to stop recording")
+    with st.spinner("Finding silences..."):
+
+        audio = load_audio(file)
+        chunks = plan_chunks(audio)
 
+    progress_bar = st.progress(0.0)
+    results = []
+
+    for chunk, result in transcribe_chunks(
+        model_option, audio, chunks, workers, backend, **options
+    ):
 
-def transcribe_file(model: whisper.Whisper, file: str) -> str:
+        results.append((chunk, result))
+        progress_bar.progress(
+            len(results) / len(chunks),
+            text=f"Transcribed {len(results)} of {len(chunks)} chunks",
+        )
+
+    progress_bar.empty()
+
+    return stitch_segments(results)
+
+
+def transcribe_file(
+    model_option: str,
+    file: str | np.ndarray | Callable[[], str],
+    workers: int = 1,
+    backend: str = "whisper",
+    source: str | None = None,
+    **options,
+) -> dict:
     """
-    Transcribe an audio file using the Whisper model.
+    Transcribe an audio file using the Whisper model, unless its transcript is cached.
 
     Args:
-        model (whisper.Whisper): The Whisper model to use for transcription.
-        file (str): The path to the audio file.
+        model_option (str): The name of the Whisper model to use for transcription.
+        file (str | np.ndarray | Callable[[], str]): The path to the audio file, a 16 kHz waveform, or a function downloading the file, only called if the transcript is not cached.
+        workers (int, optional): The number of worker processes of the long-form mode, or 1 to transcribe the whole file at once. Defaults to 1.
+        backend (str, optional): The inference backend running the model. Defaults to "whisper".
+        source (str | None, optional): A stable identifier of the audio, such as a video ID. Defaults to the hash of the audio.
+        **options: Extra decoding options passed to Whisper (e.g. language).
 
     Returns:
-        str: The transcribed text, or None if an error occurred.
+        dict: The transcript with its timestamped segments, or None if an error occurred.
     """
 
     try:
 
-        with st.spinner("Transcribing audio..."):
+        if source is None:
+
+            file = file() if callable(file) else file
+
+            # An empty path means the download failed, and it has shown why
+            if len(file) == 0:
+
+                return None
+
+            source = audio_fingerprint(file)
+
+        cache = get_transcript_cache()
+        key = transcript_key(source, model_option, backend, **options)
+        result = get_cached_transcript(cache, key)
 
-            result = model.transcribe(file, fp16=False)
+        if result is not None:
+
+            st.caption("Loaded from the transcript cache.")
+
+        else:
+
+            file = file() if callable(file) else file
+
+            if len(file) == 0:
+
+                return None
+
+            if workers > 1:
+
+                result = transcribe_long(
+                    model_option, file, workers, backend, **options
+                )
+
+            else:
+
+                with st.spinner("Transcribing audio..."), get_registry().use(
+                    model_option, backend
+                ) as model:
+
+                    result = transcribe(model, file, **options)
+
+            put_cached_transcript(cache, key, result)
 
-        transcription_text = result["text"]
         st.subheader("Transcription")
         st.text_area(
-            "Transcription", transcription_text, height=300, label_visibility="hidden"
+            "Transcription", result["text"], height=300, label_visibility="hidden"
         )
 
-        return transcription_text
+        # Only the segments are kept, so every export is made without decoding again
+        return compact_result(result)
 
     except Exception as e:
 
@@ -163,25 +284,20 @@ def transcribe_file(model: whisper.Whisper, file: str) -> str:
         return None
 
 
-def save_markdown(text: str, filename: str) -> None:
+def save_transcript(result: dict, filename: str, export_format: str) -> None:
     """
-    Save the transcribed text as a markdown file.
+    Save the transcript in the chosen format.
 
     Args:
-        text (str): The text to save.
+        result (dict): The transcript with its segments.
         filename (str): The name of the file to save.
+        export_format (str): One of EXPORT_FORMATS.
     """
 
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
-
     try:
 
-        with open(filename, "w", encoding="utf-8") as f:
-
-            f.write(text)
-
-        st.success(f"Transcription saved as markdown to {filename}")
-        st.session_state.transcription_text = None
+        export_transcript(result, filename, export_format)
+        st.success(f"Transcription saved as {export_format} to {filename}")
 
     except IOError as e:
 
@@ -192,19 +308,147 @@ def save_markdown(text: str, filename: str) -> None:
         st.error(f"Unexpected error: {str(e)}")
 
 
-@st.cache_resource
-def get_model(option: str) -> whisper.Whisper:
+def get_pipeline(
+    model_option: str,
+    backend: str,
+    cpu_workers: int,
+    io_workers: int,
+    export_format: str,
+    **options,
+) -> TranscriptionPipeline | None:
     """
-    Get the Whisper model, using caching to avoid reloading.
+    Get the batch transcription pipeline of the session, creating it on first use.
+
+    The pipeline lives in the session state, so its jobs keep running across reruns.
+    A pipeline with another configuration is replaced once it has no jobs left.
 
     Args:
-        option (str): The name of the Whisper model to load.
+        model_option (str): The name of the Whisper model.
+        backend (str): The inference backend running the model.
+        cpu_workers (int): The number of files transcribed at once.
+        io_workers (int): The number of files downloaded at once.
+        export_format (str): The format of the transcripts, one of EXPORT_FORMATS.
+        **options: Extra decoding options passed to Whisper (e.g. language).
+
+    Returns:
+        TranscriptionPipeline | None: The pipeline, or None if the current one is busy with another configuration.
+    """
+
+    config = (model_option, backend, cpu_workers, io_workers, export_format, options)
+    pipeline = st.session_state.get("transcription_jobs")
+
+    if pipeline is not None and st.session_state.transcription_config != config:
+
+        if pipeline.busy():
+
+            st.warning(
+                "The batch is still running with another configuration. "
+                "Wait for it to finish or stop it first."
+            )
+
+            return None
+
+        pipeline.shutdown()
+        pipeline = None
+
+    if pipeline is None:
+
+        st.session_state.transcription_jobs = TranscriptionPipeline(
+            model_option,
+            backend,
+            cpu_workers,
+            io_workers,
+            get_transcript_cache(),
+            export_format,
+            **options,
+        )
+        st.session_state.transcription_config = config
+
+    return st.session_state.transcription_jobs
+
+
+@st.fragment(run_every=2)
+def show_batch_status() -> None:
+    """
+    Display the status of the batch transcription, refreshing it every two seconds.
+    """
+
+    if "transcription_jobs" not in st.session_state:
+
+        return
+
+    queue = st.session_state.transcription_jobs.queue
+    summary = queue.summary()
+
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Queued", summary["queued"])
+    col2.metric("Running", summary["running"])
+    col3.metric("Done", summary["done"])
+    col4.metric("Failed", summary["failed"])
+    col5.metric("Audio s/s", f"{summary['units_per_second']:.1f}")
+
+    st.dataframe(
+        queue.table(),
+        use_container_width=True,
+        hide_index=True,
+        column_config={"units": "audio seconds"},
+    )
+
+
+@st.cache_resource
+def get_transcript_cache() -> DiskCache:
+    """
+    Get the persistent transcript cache, shared by every session of the process.
+
+    Returns:
+        DiskCache: The transcript cache.
+    """
+
+    return open_transcript_cache()
+
+
+@st.cache_resource
+def get_registry() -> ModelRegistry:
+    """
+    Get the registry of Whisper models shared by every session, preloading the default one.
 
     Returns:
-        whisper.Whisper: The loaded Whisper model.
+        ModelRegistry: The registry.
+    """
+
+    registry = ModelRegistry()
+
+    if PRELOAD_MODEL:
+
+        registry.preload(PRELOAD_MODEL)
+
+    return registry
+
+
+def show_model_diagnostics(registry: ModelRegistry) -> None:
+    """
+    Show the models held in memory and the budget they share in the sidebar.
+
+    Args:
+        registry (ModelRegistry): The registry of Whisper models.
     """
 
-    return load_whisper_model(option)
+    with st.sidebar.expander("Loaded models"):
+
+        resident = registry.resident()
+        used = sum(row["MB"] for row in resident)
+        st.caption(
+            f"{used:.0f} of {registry.max_bytes / 1024 / 1024:.0f} MB, "
+            f"{registry.evictions} evictions"
+        )
+
+        if resident:
+
+            st.dataframe(resident, hide_index=True)
+
+        else:
+
+            st.write("No model loaded.")
 
 
 def main() -> None:
@@ -222,7 +466,7 @@ def main() -> None:
 
         # Transcription type selection
         transcription_type = st.selectbox(
-            "Select transcription type:", ("File", "YouTube", "Microphone")
+            "Select transcription type:", ("File", "YouTube", "Microphone", "Batch")
         )
 
     with col2:
@@ -246,81 +490,270 @@ def main() -> None:
             index=2,
         )
 
-        model = get_model(model_option)
+        backend = st.selectbox(
+            "Select inference backend:",
+            BACKENDS,
+            help="The int8 backends trade a little accuracy for a faster transcription on CPU.",
+        )
+
+        # Each worker loads its own copy of the model, outside of the registry, so
+        # their number is capped by the CPUs and the memory budget of the models
+        max_workers = transcription_workers(model_option, backend, os.cpu_count())
+
+        # Long recordings are split on silences and transcribed by several processes,
+        # so the mode needs room for at least two copies of the model
+        long_form = st.checkbox(
+            "Long-form mode",
+            disabled=max_workers < 2,
+            help=(
+                "Split the audio on silences and transcribe the chunks in parallel."
+                if max_workers >= 2
+                else "Unavailable: the memory budget or the CPUs fit only one copy "
+                "of this model."
+            ),
+        )
+        workers = 1
+
+        if long_form and max_workers >= 2:
+
+            workers = st.number_input(
+                "Number of worker processes",
+                min_value=2,
+                max_value=max_workers,
+                value=2,
+                help="Each worker process loads its own copy of the model.",
+            )
+
+        language = st.text_input(
+            "Language of the audio (e.g. en, es), empty to detect it:"
+        ).strip()
+        options = {"language": language} if language else {}
 
     with col1:
 
-        if transcription_type == "File":
+        if transcription_type == "Batch":
+
+            urls = st.text_area(
+                "Enter the URLs of YouTube videos or playlists, one per line:"
+            ).split()
+            input_directory = st.text_input("Or the directory with the audio files:")
+            output_path = st.text_input(
+                "Enter the output directory", "./transcriptions"
+            )
+
+            io_workers = st.number_input(
+                "Number of files downloaded at once", min_value=1, value=4
+            )
+            cpu_workers = st.number_input(
+                "Number of files transcribed at once",
+                min_value=1,
+                max_value=max_workers,
+                value=1,
+                help="Each worker process loads its own copy of the model.",
+            )
+            batch_format = st.selectbox("Select the export format:", EXPORT_FORMATS)
+
+        elif transcription_type == "File":
 
             filepath = st.text_input("Enter audio file path:")
 
             if filepath and st.button("Transcribe"):
 
-                transcription_text = transcribe_file(model, filepath)
+                result = transcribe_file(
+                    model_option, filepath, workers, backend, **options
+                )
 
-                if transcription_text:
+                if result:
 
-                    st.session_state.transcription_text = transcription_text
+                    st.session_state.transcription_result = result
 
         elif transcription_type == "YouTube":
 
-            # Create a temporary directory
-            with tempfile.TemporaryDirectory() as temp_dir:
+            url = st.text_input(
+                "Enter the URL of the YouTube video to transcribe:",
+                "https://www.youtube.com/watch?v=YbADVar8tjY",
+            )
+
+            if st.button("Transcribe video"):
+
+                video_id = youtube_video_id(url)
 
-                # Download the video only if it's not already downloaded
-                if (
-                    "audio_path" not in st.session_state
-                    or not st.session_state.audio_path
-                    or not os.path.exists(st.session_state.audio_path)
-                ):
+                # The video is only downloaded if its transcript is not cached
+                result = transcribe_file(
+                    model_option,
+                    lambda: download_youtube_video(url),
+                    workers,
+                    backend,
+                    source=f"youtube:{video_id}" if video_id else None,
+                    **options,
+                )
+
+                if result:
+
+                    st.session_state.transcription_result = result
 
-                    st.session_state.audio_path = download_youtube_video(temp_dir)
+        # The live mode records on the server, so it is only offered when the app runs
+        # on a machine with a microphone, e.g. locally instead of in Docker
+        elif live_input_available() and st.checkbox(
+            "Live transcription (local microphone)",
+            help="Transcribe while recording from the microphone of the machine "
+            "running the app, not the one of the browser.",
+        ):
 
-                # Ensure the audio file path is valid before attempting transcription
-                if st.session_state.audio_path and os.path.exists(
-                    st.session_state.audio_path
-                ):
+            if "live_transcription" not in st.session_state:
 
-                    if "transcription_text" not in st.session_state:
+                if st.button("Start recording"):
 
-                        st.session_state.transcription_text = transcribe_file(
-                            model, st.session_state.audio_path
+                    try:
+
+                        st.session_state.live_transcription = LiveTranscription(
+                            StreamingTranscriber(
+                                get_registry(), model_option, backend, **options
+                            )
                         )
 
+                    except Exception as e:
+
+                        st.error(f"Error recording audio: {str(e)}")
+
+                    else:
+
+                        # Rerun, so the button to stop the recording is shown
+                        st.rerun()
+
+            elif st.button("Stop recording"):
+
+                try:
+
+                    with st.spinner("Transcribing the end of the recording..."):
+
+                        result = st.session_state.pop("live_transcription").stop()
+
+                    st.session_state.transcription_result = (
+                        result if result["segments"] else None
+                    )
+                    st.subheader("Transcription")
+                    st.text_area(
+                        "Transcription",
+                        result["text"],
+                        height=300,
+                        label_visibility="hidden",
+                    )
+
+                except Exception as e:
+
+                    st.error(f"Error transcribing audio: {str(e)}")
+
+            show_live_transcription()
+
         else:
 
             audio = record_audio()
 
             if len(audio) > 0:
 
-                st.audio(audio.export().read())
-
-                # Convert audio to the format expected by Whisper
-                audio_buffer = io.BytesIO()
-                audio.export(audio_buffer, format="wav", parameters=["-ar", str(16000)])
-                file = (
-                    np.frombuffer(audio_buffer.getvalue()[44:], dtype=np.int16).astype(
-                        np.float32
-                    )
-                    / 32768.0
+                # Convert the recorded samples to the format expected by Whisper
+                # directly, without encoding them to a file with ffmpeg
+                file = resample(
+                    pcm_to_float32(audio.raw_data, audio.sample_width, audio.channels),
+                    audio.frame_rate,
                 )
+                st.audio(file, sample_rate=SAMPLE_RATE)
 
                 if st.button("Transcribe"):
 
-                    transcription_text = transcribe_file(model, file)
+                    result = transcribe_file(
+                        model_option, file, workers, backend, **options
+                    )
+
+                    if result:
 
-                    if transcription_text:
+                        st.session_state.transcription_result = result
 
-                        st.session_state.transcription_text = transcription_text
+    if transcription_type == "Batch":
 
-    if (
-        "transcription_text" in st.session_state
-        and st.session_state.transcription_text is not None
-    ):
+        if st.button("Add to the queue"):
+
+            pipeline = get_pipeline(
+                model_option,
+                backend,
+                int(cpu_workers),
+                int(io_workers),
+                batch_format,
+                **options,
+            )
+
+            if pipeline is not None:
+
+                with st.spinner("Listing the videos and files..."):
+
+                    if input_directory:
+
+                        for audio_path, md_path in plan_audio_tree(
+                            input_directory, output_path
+                        ):
+
+                            name = os.path.relpath(audio_path, input_directory)
+                            pipeline.submit(
+                                name, audio_path, export_path(md_path, batch_format)
+                            )
+
+                    for name, url, md_path in plan_youtube_sources(urls, output_path):
+
+                        pipeline.submit(name, url, export_path(md_path, batch_format))
+
+        # Jobs left unfinished by a previous run of the app, e.g. after a restart
+        unfinished = collect_unfinished_jobs()
+        count = sum(len(jobs) for jobs in unfinished.values())
+
+        if count and st.button(f"Resume {count} unfinished jobs"):
+
+            pipeline = get_pipeline(
+                model_option,
+                backend,
+                int(cpu_workers),
+                int(io_workers),
+                batch_format,
+                **options,
+            )
+
+            if pipeline is not None:
+
+                for journal, jobs in unfinished.items():
+
+                    for job in jobs:
+
+                        source, output_file = job.args
+                        pipeline.submit(
+                            job.name, source, export_path(output_file, batch_format)
+                        )
+
+                    # The jobs are now saved in the journal of this pipeline
+                    os.remove(journal)
+
+        if "transcription_jobs" in st.session_state and st.button("Stop the batch"):
+
+            st.session_state.pop("transcription_jobs").shutdown()
+
+        show_batch_status()
+        show_model_diagnostics(get_registry())
+        return None
+
+    if st.session_state.get("transcription_result") is not None:
+
+        # Every format is made from the segments kept in the session
+        export_format = st.selectbox("Select the export format:", EXPORT_FORMATS)
+
+        if st.button(f"Save as {export_format}"):
 
-        if st.button("Save as Markdown"):
+            save_transcript(
+                st.session_state.transcription_result,
+                export_path(save_path, export_format),
+                export_format,
+            )
 
-            save_markdown(st.session_state.transcription_text, save_path)
+    # Shown last, so it includes the models loaded by this run
+    show_model_diagnostics(get_registry())
 
 
 if __name__ == "__main__":
@@ -1,7 +1,8 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import plotly.graph_objects as go
+
+from university_helper import stats
 
 
 # Set the page configuration for Streamlit
@@ -23,10 +24,8 @@ def load_data() -> pd.DataFrame:
     """
 
     data_path = st.text_input("Data path with csv format:", "./src/data/example_data.csv")
-    data = pd.read_csv(data_path)
-    data["Date"] = pd.to_datetime(data["Date"])
 
-    return data
+    return stats.load_data(data_path)
 
 
 def score_evolution(data: pd.DataFrame) -> None:
@@ -66,13 +65,8 @@ def year_comparison(data: pd.DataFrame) -> None:
         data (pd.DataFrame): The data to plot
     """
 
-    # Extract the year from the date column
-    data["Year"] = data["Date"].dt.year
-
-    # Group the data by subject and year, and calculate the mean score
-    subject_years = (
-        data.groupby(["Subject", "Year"])["Score"].mean().unstack().reset_index()
-    )
+    # Calculate the average score of each subject per year
+    subject_years = stats.subject_year_means(data)
 
     # Create a bar plot of the year comparison
     fig = px.bar(
@@ -103,9 +97,7 @@ def general_metrics(data: pd.DataFrame, top: int = 3) -> None:
     st.metric("Average score for all subjects", f"{mean_score:.2f}")
 
     # Calculate the top subjects by average score
-    top_subjects_df = (
-        data.groupby("Subject")["Score"].mean().nlargest(top).reset_index()
-    )
+    top_subjects_df = stats.top_subjects(data, top)
     st.metric("Average score for all subjects", f"{top_subjects_df['Subject'].values}")
 
 
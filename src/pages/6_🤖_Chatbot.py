@@ -1,10 +1,5 @@
 import streamlit as st
-from langchain_community.llms import Ollama
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_community.chat_message_histories import StreamlitChatMessageHistory
-from langchain_core.tools import tool
-from langchain.tools.render import render_text_description
-from langchain_core.output_parsers import JsonOutputParser
 from operator import itemgetter
 
 # https://github.com/jhicks2306/chatbot-with-tools/blob/main/chatbot.py
@@ -25,41 +20,56 @@ model_selection = st.sidebar.selectbox(
 st.sidebar.image("./images/logo.png")
 
 
-# Set up the LLM which will power our application.
-model = Ollama(model=model_selection)
+@st.cache_resource(show_spinner=False)
+def get_chain(model_selection: str):
+    """
+    Build the chain answering the user, once per model for every session.
 
+    Args:
+        model_selection (str): The name of the Ollama model.
 
-@tool
-def converse(input: str) -> str:
-    "Provide a natural language response using the user input."
-    return model.invoke(input)
+    Returns:
+        Runnable: The prompt, the LLM with tools and the output parser, chained.
+    """
 
+    from langchain_community.llms import Ollama
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.tools import tool
+    from langchain.tools.render import render_text_description
+    from langchain_core.output_parsers import JsonOutputParser
 
-tools = [converse]
+    # Set up the LLM which will power our application.
+    model = Ollama(model=model_selection)
 
-# Configure the system prompts
-rendered_tools = render_text_description(tools)
+    @tool
+    def converse(input: str) -> str:
+        "Provide a natural language response using the user input."
+        return model.invoke(input)
 
-system_prompt = f"""You are an assistant that has access to the following set of tools. Here are the names and descriptions for each tool:
+    tools = [converse]
+
+    # Configure the system prompts
+    rendered_tools = render_text_description(tools)
+
+    system_prompt = f"""You are an assistant that has access to the following set of tools. Here are the names and descriptions for each tool:
 
 {rendered_tools}
 
 Given the user input, return the name and input of the tool to use. Return your response as a JSON blob with 'name' and 'arguments' keys. The value associated with the 'arguments' key should be a dictionary of parameters."""
 
-prompt = ChatPromptTemplate.from_messages(
-    [("system", system_prompt), ("user", "{input}")]
-)
-
+    prompt = ChatPromptTemplate.from_messages(
+        [("system", system_prompt), ("user", "{input}")]
+    )
 
-# Define a function which returns the chosen tools as a runnable, based on user input.
-def tool_chain(model_output):
-    tool_map = {tool.name: tool for tool in tools}
-    chosen_tool = tool_map[model_output["name"]]
-    return itemgetter("arguments") | chosen_tool
+    # Define a function which returns the chosen tools as a runnable, based on user input.
+    def tool_chain(model_output):
+        tool_map = {tool.name: tool for tool in tools}
+        chosen_tool = tool_map[model_output["name"]]
+        return itemgetter("arguments") | chosen_tool
 
+    # The main chain: an LLM with tools.
+    return prompt | model | JsonOutputParser() | tool_chain
 
-# The main chain: an LLM with tools.
-chain = prompt | model | JsonOutputParser() | tool_chain
 
 # Set up message history.
 msgs = StreamlitChatMessageHistory(key="langchain_messages")
@@ -78,7 +88,7 @@ if input := st.chat_input("Send a message"):
     msgs.add_user_message(input)
 
     # Invoke chain to get reponse.
-    response = chain.invoke({"input": input})
+    response = get_chain(model_selection).invoke({"input": input})
 
     # Display AI assistant response and save to message history.
     st.chat_message("assistant").write(str(response))
@@ -0,0 +1,3 @@
+"""
+Core routines shared by the University Helper Streamlit pages.
+"""
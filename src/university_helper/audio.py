@@ -0,0 +1,353 @@
+import os
+import subprocess
+import wave
+from typing import Iterator
+
+import numpy as np
+
+# Sample rate of the waveforms expected by Whisper
+SAMPLE_RATE = 16000
+
+# Length of the blocks decoded at once when streaming a file, in seconds
+BLOCK_SECONDS = 30
+
+# Lowest bitrate expected from a compressed file, and longest duration assumed, used
+# to size the output array from the file size; the unused part of the allocation is
+# never touched, so it costs address space but no memory, and is released at the end
+MIN_BITRATE = 32_000
+MAX_ESTIMATED_SECONDS = 4 * 3600
+
+# Zero crossings of the windowed sinc on each side of the resampling filter, the
+# number of fractional positions it is tabulated for, and the outputs computed at once
+FILTER_ZERO_CROSSINGS = 16
+PHASES = 1024
+RESAMPLE_BATCH = 16384
+
+
+def pcm_to_float32(data: bytes, sample_width: int, channels: int = 1) -> np.ndarray:
+    """
+    Convert interleaved PCM samples to a mono float32 waveform in [-1, 1).
+
+    The integer samples are viewed in place and converted directly into the output,
+    so the only allocation is the returned array.
+
+    Args:
+        data (bytes): The PCM samples, little-endian, interleaved by channel.
+        sample_width (int): The bytes per sample, from 1 (unsigned) to 4.
+        channels (int, optional): The number of interleaved channels. Defaults to 1.
+
+    Returns:
+        np.ndarray: The float32 waveform.
+    """
+
+    if sample_width == 1:
+
+        samples, offset, scale = np.frombuffer(data, np.uint8), 128.0, 1 / 128
+
+    elif sample_width == 2:
+
+        samples, offset, scale = np.frombuffer(data, "<i2"), 0.0, 1 / 32768
+
+    elif sample_width == 3:
+
+        # 24-bit samples are placed in the upper bytes of 32-bit integers
+        raw = np.frombuffer(data, np.uint8).reshape(-1, 3)
+        samples = np.zeros((len(raw), 4), np.uint8)
+        samples[:, 1:] = raw
+        samples, offset, scale = samples.view("<i4").ravel(), 0.0, 1 / 2**31
+
+    elif sample_width == 4:
+
+        samples, offset, scale = np.frombuffer(data, "<i4"), 0.0, 1 / 2**31
+
+    else:
+
+        raise ValueError(f"Unsupported sample width: {sample_width} bytes")
+
+    if channels > 1:
+
+        audio = samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+
+    else:
+
+        audio = samples.astype(np.float32)
+
+    if offset:
+
+        audio -= offset
+
+    audio *= scale
+
+    return audio
+
+
+class Resampler:
+    """
+    Resample a waveform block by block, keeping the state between blocks.
+
+    Each output sample is a windowed-sinc interpolation of the input around its
+    position, with the cutoff at the lower of the two Nyquist frequencies, so the
+    same filter band-limits and interpolates. The filter is tabulated for PHASES
+    fractional positions and applied to many outputs at once.
+    """
+
+    def __init__(self, rate: int, target: int = SAMPLE_RATE) -> None:
+        """
+        Create a resampler.
+
+        Args:
+            rate (int): The sample rate of the input.
+            target (int, optional): The sample rate of the output. Defaults to SAMPLE_RATE.
+        """
+
+        self.step = rate / target
+        cutoff = min(1.0, 1 / self.step)
+        self.half = int(np.ceil(FILTER_ZERO_CROSSINGS / cutoff))
+
+        # Distance from each fractional position to the inputs around it
+        distance = (
+            np.arange(1 - self.half, self.half + 1)[None, :]
+            - (np.arange(PHASES) / PHASES)[:, None]
+        )
+        window = 0.5 + 0.5 * np.cos(np.pi * distance / self.half)
+        self.table = (cutoff * np.sinc(cutoff * distance) * window).astype(np.float32)
+
+        # Input samples still needed, the input position of the first one, starting
+        # with silence before the waveform, and the number of outputs computed, from
+        # which every output position is derived so that rounding never accumulates
+        self.pending = np.zeros(self.half, np.float32)
+        self.offset = -self.half
+        self.produced = 0
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """
+        Resample the next block of the waveform.
+
+        Args:
+            block (np.ndarray): The next input samples.
+
+        Returns:
+            np.ndarray: The output samples that can be computed so far.
+        """
+
+        if self.step == 1:
+
+            return block
+
+        self.pending = np.concatenate((self.pending, block))
+        last = self.offset + len(self.pending) - 1
+        count = max(0, int((last - self.half) // self.step) + 1 - self.produced)
+        output = np.empty(count, np.float32)
+
+        if count == 0:
+
+            return output
+
+        windows = np.lib.stride_tricks.sliding_window_view(self.pending, 2 * self.half)
+
+        # Bounded batches, since each output gathers a full window of inputs
+        for start in range(0, count, RESAMPLE_BATCH):
+
+            positions = self.step * np.arange(
+                self.produced + start,
+                self.produced + min(count, start + RESAMPLE_BATCH),
+            )
+            base = np.floor(positions)
+            phase = ((positions - base) * PHASES).astype(np.intp)
+            first = base.astype(np.intp) - self.half + 1 - self.offset
+            np.einsum(
+                "ij,ij->i",
+                windows[first],
+                self.table[phase],
+                out=output[start : start + len(positions)],
+            )
+
+        self.produced += count
+        consumed = (
+            int(np.floor(self.produced * self.step)) - self.half + 1 - self.offset
+        )
+        self.pending = self.pending[max(0, consumed) :]
+        self.offset += max(0, consumed)
+
+        return output
+
+    def flush(self) -> np.ndarray:
+        """
+        Output the end of the waveform, held back until the inputs after it are known.
+
+        Must be called once, after the last block.
+
+        Returns:
+            np.ndarray: The last output samples.
+        """
+
+        if self.step == 1:
+
+            return np.empty(0, np.float32)
+
+        # The outputs positioned before the end of the input, computed with silence
+        # after the waveform, as it is preceded by it
+        end = self.offset + len(self.pending)
+        remaining = max(0, int(np.ceil(end / self.step - 1e-6)) - self.produced)
+
+        return self.process(np.zeros(self.half + 1, np.float32))[:remaining]
+
+
+def resample(audio: np.ndarray, rate: int, target: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Resample a whole waveform.
+
+    Args:
+        audio (np.ndarray): The float32 waveform.
+        rate (int): The sample rate of the waveform.
+        target (int, optional): The sample rate of the output. Defaults to SAMPLE_RATE.
+
+    Returns:
+        np.ndarray: The resampled waveform.
+    """
+
+    resampler = Resampler(rate, target)
+
+    return np.concatenate((resampler.process(audio), resampler.flush()))
+
+
+def _iter_wav_blocks(wav: wave.Wave_read, block_seconds: float) -> Iterator[np.ndarray]:
+    """
+    Read a PCM WAV file block by block, resampled to 16 kHz mono.
+
+    Args:
+        wav (wave.Wave_read): The open file, with its header parsed.
+        block_seconds (float): The length of the blocks.
+
+    Yields:
+        np.ndarray: The float32 blocks of the waveform.
+    """
+
+    resampler = Resampler(wav.getframerate())
+    frames = max(1, int(block_seconds * wav.getframerate()))
+
+    while data := wav.readframes(frames):
+
+        yield resampler.process(
+            pcm_to_float32(data, wav.getsampwidth(), wav.getnchannels())
+        )
+
+    yield resampler.flush()
+
+
+def _iter_ffmpeg_blocks(path: str, block_seconds: float) -> Iterator[np.ndarray]:
+    """
+    Decode any audio or video file with ffmpeg, reading its output block by block.
+
+    Args:
+        path (str): The path to the file.
+        block_seconds (float): The length of the blocks.
+
+    Yields:
+        np.ndarray: The float32 blocks of the 16 kHz mono waveform.
+    """
+
+    command = [
+        "ffmpeg",
+        "-nostdin",
+        "-loglevel",
+        "error",
+        "-i",
+        path,
+        "-f",
+        "s16le",
+        "-ac",
+        "1",
+        "-ar",
+        str(SAMPLE_RATE),
+        "-",
+    ]
+    block_bytes = 2 * int(block_seconds * SAMPLE_RATE)
+
+    with subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    ) as process:
+
+        while data := process.stdout.read(block_bytes):
+
+            yield pcm_to_float32(data, 2)
+
+        error = process.stderr.read().decode(errors="replace").strip()
+
+    if process.returncode != 0:
+
+        raise RuntimeError(f"Failed to load audio: {error}")
+
+
+def iter_audio_blocks(
+    path: str, block_seconds: float = BLOCK_SECONDS
+) -> Iterator[np.ndarray]:
+    """
+    Decode an audio file block by block to the waveform expected by Whisper.
+
+    PCM WAV files are parsed and resampled in-process; every other format is decoded
+    by a streaming ffmpeg process.
+
+    Args:
+        path (str): The path to the file.
+        block_seconds (float, optional): The length of the blocks. Defaults to BLOCK_SECONDS.
+
+    Yields:
+        np.ndarray: The float32 blocks of the 16 kHz mono waveform.
+    """
+
+    try:
+
+        wav = wave.open(path, "rb")
+
+    except (wave.Error, EOFError):
+
+        yield from _iter_ffmpeg_blocks(path, block_seconds)
+        return
+
+    with wav:
+
+        yield from _iter_wav_blocks(wav, block_seconds)
+
+
+def decode_audio(path: str, block_seconds: float = BLOCK_SECONDS) -> np.ndarray:
+    """
+    Decode an audio file to a 16 kHz mono float32 waveform.
+
+    The blocks are written into a single array sized from the WAV header, or from the
+    file size for compressed formats, so no complete PCM or bytes copy of the file
+    is ever held next to the result.
+
+    Args:
+        path (str): The path to the file.
+        block_seconds (float, optional): The length of the decoded blocks. Defaults to BLOCK_SECONDS.
+
+    Returns:
+        np.ndarray: The waveform.
+    """
+
+    try:
+
+        with wave.open(path, "rb") as wav:
+
+            seconds = wav.getnframes() / wav.getframerate()
+
+    except (wave.Error, EOFError):
+
+        seconds = min(os.path.getsize(path) * 8 / MIN_BITRATE, MAX_ESTIMATED_SECONDS)
+
+    audio = np.empty(int(seconds * SAMPLE_RATE) + 1, np.float32)
+    length = 0
+
+    for block in iter_audio_blocks(path, block_seconds):
+
+        if length + len(block) > len(audio):
+
+            audio.resize(max(2 * len(audio), length + len(block)), refcheck=False)
+
+        audio[length : length + len(block)] = block
+        length += len(block)
+
+    audio.resize(length, refcheck=False)
+
+    return audio
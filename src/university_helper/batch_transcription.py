@@ -0,0 +1,350 @@
+import glob
+import os
+import re
+import threading
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+
+from university_helper.cache import CACHE_DIR, DiskCache
+from university_helper.jobs import Job, JobQueue, load_journal, set_stage
+from university_helper.transcription import (
+    audio_fingerprint,
+    get_cached_transcript,
+    put_cached_transcript,
+    start_transcription_pool,
+    transcribe_file_on_pool,
+    transcript_key,
+)
+from university_helper.transcript_export import export_transcript
+from university_helper.youtube import download_audio, expand_playlist, youtube_video_id
+
+# Directory with a journal per batch pipeline, read to resume its jobs after a restart
+JOURNAL_DIR = os.path.join(CACHE_DIR, "transcription_jobs")
+
+# Journals written by the pipelines of this process, never offered for resuming, since
+# even a stopped pipeline keeps saving the jobs it was running
+_active_journals: set[str] = set()
+_active_lock = threading.Lock()
+
+# Extensions of the files picked up from an input directory
+AUDIO_EXTENSIONS = (
+    ".aac",
+    ".flac",
+    ".m4a",
+    ".mkv",
+    ".mp3",
+    ".mp4",
+    ".ogg",
+    ".opus",
+    ".wav",
+    ".webm",
+)
+
+
+def safe_file_name(name: str) -> str:
+    """
+    Turn a title into a name usable as a file name on every platform.
+
+    Args:
+        name (str): The title.
+
+    Returns:
+        str: The name, without path separators or reserved characters.
+    """
+
+    return re.sub(r'[<>:"/\\|?*\x00-\x1f]', "_", name).strip(" .") or "untitled"
+
+
+def plan_audio_tree(
+    input_directory: str, output_directory: str
+) -> list[tuple[str, str]]:
+    """
+    List the audio files of a directory tree with the transcript mirroring each of them.
+
+    Args:
+        input_directory (str): The directory with the audio files.
+        output_directory (str): The directory where the mirrored tree will be written.
+
+    Returns:
+        list[tuple[str, str]]: The path of each audio file and of its Markdown file, sorted by path.
+    """
+
+    files = []
+
+    for root, dirs, names in os.walk(input_directory):
+
+        dirs.sort()
+        relative_path = os.path.relpath(root, input_directory)
+
+        for name in sorted(names):
+
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+
+                files.append(
+                    (
+                        os.path.join(root, name),
+                        os.path.join(
+                            output_directory,
+                            relative_path,
+                            os.path.splitext(name)[0] + ".md",
+                        ),
+                    )
+                )
+
+    return files
+
+
+def plan_youtube_sources(
+    urls: list[str], output_directory: str
+) -> list[tuple[str, str, str]]:
+    """
+    Expand video and playlist URLs into the videos to transcribe.
+
+    The transcripts of a playlist go to a directory named after it, numbered in
+    playlist order.
+
+    Args:
+        urls (list[str]): The URLs of videos or playlists.
+        output_directory (str): The directory where the transcripts will be written.
+
+    Returns:
+        list[tuple[str, str, str]]: The name, URL and Markdown path of each video.
+    """
+
+    sources = []
+
+    for url in urls:
+
+        playlist, videos = expand_playlist(url)
+
+        for index, video in enumerate(videos, 1):
+
+            title = safe_file_name(video["title"] or video["id"])
+
+            if playlist is None:
+
+                output_path = os.path.join(output_directory, f"{title}.md")
+
+            else:
+
+                output_path = os.path.join(
+                    output_directory,
+                    safe_file_name(playlist),
+                    f"{index:03d} {title}.md",
+                )
+
+            sources.append((video["title"] or video["id"], video["url"], output_path))
+
+    return sources
+
+
+def collect_unfinished_jobs(directory: str = JOURNAL_DIR) -> dict[str, list[Job]]:
+    """
+    Find the jobs left queued or running by pipelines that are no longer running.
+
+    The journals of the pipelines of this process are skipped, and the journals of
+    stopped pipelines without unfinished jobs are deleted.
+
+    Args:
+        directory (str, optional): The directory with the journals. Defaults to JOURNAL_DIR.
+
+    Returns:
+        dict[str, list[Job]]: The unfinished jobs of each journal, by its path.
+    """
+
+    unfinished = {}
+
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+
+        with _active_lock:
+
+            if path in _active_journals:
+
+                continue
+
+        jobs = [
+            job for job in load_journal(path) if job.status in ("queued", "running")
+        ]
+
+        if jobs:
+
+            unfinished[path] = jobs
+
+        else:
+
+            os.remove(path)
+
+    return unfinished
+
+
+class TranscriptionPipeline:
+    """
+    Transcribe a batch of files and videos, downloading while transcribing.
+
+    Each item is a job of a queue whose threads download the audio, check the
+    transcript cache and write the transcript, while the transcription itself runs on
+    a pool of worker processes that keep their models loaded. The queue has a thread
+    per download plus one per worker process, so downloads go on while every worker
+    is busy.
+    """
+
+    def __init__(
+        self,
+        model_option: str,
+        backend: str = "whisper",
+        cpu_workers: int = 1,
+        io_workers: int = 4,
+        cache: DiskCache | None = None,
+        export_format: str = "Markdown",
+        journal_directory: str | None = JOURNAL_DIR,
+        **options,
+    ) -> None:
+        """
+        Start the worker processes and the job queue.
+
+        Args:
+            model_option (str): The name of the Whisper model.
+            backend (str, optional): The inference backend running the model. Defaults to "whisper".
+            cpu_workers (int, optional): The number of files transcribed at once. Defaults to 1.
+            io_workers (int, optional): The number of files downloaded at once. Defaults to 4.
+            cache (DiskCache | None, optional): The transcript cache. Defaults to None.
+            export_format (str, optional): The format of the transcripts, one of EXPORT_FORMATS. Defaults to "Markdown".
+            journal_directory (str | None, optional): The directory where the pipeline gets its own journal, or None for no journal. Defaults to JOURNAL_DIR.
+            **options: Extra decoding options passed to Whisper (e.g. language).
+        """
+
+        self.model_option = model_option
+        self.backend = backend
+        self.cache = cache
+        self.export_format = export_format
+        self.options = options
+        self.journal = None
+
+        # A journal per pipeline, so sessions and restarts never overwrite each other
+        if journal_directory is not None:
+
+            self.journal = os.path.join(journal_directory, f"{uuid.uuid4().hex}.json")
+
+            with _active_lock:
+
+                _active_journals.add(self.journal)
+
+        self.cpu_workers = cpu_workers
+        self.pool = start_transcription_pool(model_option, cpu_workers, backend)
+        self.pool_lock = threading.Lock()
+        self.queue = JobQueue(self.run, io_workers + cpu_workers, journal=self.journal)
+
+    def run(self, source: str, output_path: str) -> int:
+        """
+        Transcribe a file or video and save its transcript.
+
+        Args:
+            source (str): The path to the audio file, or the URL of the video.
+            output_path (str): The path to the transcript.
+
+        Returns:
+            int: The seconds of audio transcribed.
+        """
+
+        video_id = youtube_video_id(source)
+        key = None
+        result = None
+
+        if self.cache is not None:
+
+            # Videos are looked up by their ID, so cached ones are never downloaded
+            set_stage("checking the cache")
+            key = transcript_key(
+                f"youtube:{video_id}" if video_id else audio_fingerprint(source),
+                self.model_option,
+                self.backend,
+                **self.options,
+            )
+            result = get_cached_transcript(self.cache, key)
+
+        if result is None:
+
+            path = source
+
+            if video_id is not None:
+
+                set_stage("downloading")
+                path = download_audio(source)
+
+            set_stage("transcribing")
+            result = self._transcribe(path)
+
+            if key is not None:
+
+                put_cached_transcript(self.cache, key, result)
+
+        set_stage("saving")
+        export_transcript(result, output_path, self.export_format)
+
+        return int(result["segments"][-1]["end"]) if result["segments"] else 0
+
+    def _transcribe(self, path: str) -> dict:
+        """
+        Transcribe a file on the pool, restarting the pool if a worker died.
+
+        A worker killed e.g. for running out of memory breaks the whole pool, so every
+        later job would fail without a new one.
+
+        Args:
+            path (str): The path to the audio file.
+
+        Returns:
+            dict: The Whisper result.
+        """
+
+        pool = self.pool
+
+        try:
+
+            return transcribe_file_on_pool(pool, path, **self.options)
+
+        except BrokenProcessPool:
+
+            with self.pool_lock:
+
+                # Restarted once, even if several jobs saw the same pool break
+                if self.pool is pool:
+
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    self.pool = start_transcription_pool(
+                        self.model_option, self.cpu_workers, self.backend
+                    )
+
+            return transcribe_file_on_pool(self.pool, path, **self.options)
+
+    def submit(self, name: str, source: str, output_path: str) -> None:
+        """
+        Add a file or video to the batch.
+
+        Args:
+            name (str): The name shown in the status table.
+            source (str): The path to the audio file, or the URL of the video.
+            output_path (str): The path to the transcript.
+        """
+
+        self.queue.submit(name, source, output_path)
+
+    def busy(self) -> bool:
+        """
+        Check whether the batch still has jobs to process.
+
+        Returns:
+            bool: Whether any job is queued or running.
+        """
+
+        summary = self.queue.summary()
+
+        return summary["queued"] + summary["running"] > 0
+
+    def shutdown(self) -> None:
+        """
+        Cancel the jobs that have not started and stop the worker processes.
+        """
+
+        self.queue.shutdown()
+        self.pool.shutdown(wait=False, cancel_futures=True)
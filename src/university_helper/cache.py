@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Root directory of the persistent caches, configurable through the environment
+CACHE_DIR = os.environ.get(
+    "UNIVERSITY_HELPER_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "university_helper"),
+)
+
+
+def make_key(*parts) -> str:
+    """
+    Build a cache key from JSON-serializable parts.
+
+    Args:
+        *parts: The values identifying the cached entry.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of the parts.
+    """
+
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+class DiskCache:
+    """
+    Persistent key-value cache stored in SQLite, bounded in size with LRU eviction.
+
+    The cache is tagged with a version string: when it changes (e.g. a new tesseract
+    release) every stored entry is dropped. Instances are safe to share across threads.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, version: str = "") -> None:
+        """
+        Open (or create) the cache.
+
+        Args:
+            directory (str): The directory where the cache is stored.
+            max_bytes (int): The maximum total size of the stored values.
+            version (str, optional): The version of the producer of the values. Defaults to "".
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            os.path.join(directory, "cache.sqlite"), check_same_thread=False
+        )
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+            """
+        )
+
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'version'"
+        ).fetchone()
+
+        if row is None or row[0] != version:
+
+            self.clear()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('version', ?)", (version,)
+            )
+            self.connection.commit()
+
+    def get(self, key: str) -> bytes | None:
+        """
+        Get a value from the cache, marking it as recently used.
+
+        Args:
+            key (str): The key of the entry.
+
+        Returns:
+            bytes | None: The stored value, or None if it is not cached.
+        """
+
+        with self.lock:
+
+            row = self.connection.execute(
+                "SELECT value FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.connection.execute(
+                "UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+            self.connection.commit()
+
+            return row[0]
+
+    def put(self, key: str, value: bytes) -> None:
+        """
+        Store a value, evicting the least recently used entries above the size limit.
+
+        Args:
+            key (str): The key of the entry.
+            value (bytes): The value to store.
+        """
+
+        with self.lock:
+
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+
+            total = self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()[0]
+
+            while total > self.max_bytes:
+
+                oldest_key, size = self.connection.execute(
+                    "SELECT key, size FROM entries ORDER BY accessed LIMIT 1"
+                ).fetchone()
+                self.connection.execute(
+                    "DELETE FROM entries WHERE key = ?", (oldest_key,)
+                )
+                total -= size
+
+            self.connection.commit()
+
+    def clear(self) -> None:
+        """
+        Remove every entry from the cache.
+        """
+
+        with self.lock:
+
+            self.connection.execute("DELETE FROM entries")
+            self.connection.commit()
+
+    def stats(self) -> dict:
+        """
+        Get the usage counters of the cache.
+
+        Returns:
+            dict: The hits, misses, number of entries and stored bytes.
+        """
+
+        with self.lock:
+
+            entries, size = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+        }
@@ -0,0 +1,517 @@
+"""
+Headless entry point running the University Helper pipelines without Streamlit.
+
+Each subcommand imports only the libraries it needs, so e.g. `pdf2md` never loads
+torch or whisper. Progress is printed one event per line, as plain text or JSON.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+# Export formats of the transcribe subcommand, by their name in the web app
+TRANSCRIPT_FORMATS = {
+    "md": "Markdown",
+    "timestamped-md": "Markdown with timestamps",
+    "srt": "SRT",
+    "vtt": "VTT",
+    "json": "JSON",
+}
+
+
+def positive_int(value: str) -> int:
+    """
+    Parse a count given on the command line, e.g. a number of jobs.
+
+    Args:
+        value (str): The argument.
+
+    Returns:
+        int: The count, at least 1.
+    """
+
+    count = int(value)
+
+    if count < 1:
+
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value}")
+
+    return count
+
+
+def emit(args: argparse.Namespace, event: str, **fields) -> None:
+    """
+    Print a progress event.
+
+    Args:
+        args (argparse.Namespace): The parsed command line, with the output format.
+        event (str): The name of the event.
+        **fields: The data of the event.
+    """
+
+    if args.format == "jsonl":
+
+        print(json.dumps({"event": event, "time": time.time(), **fields}), flush=True)
+
+    else:
+
+        details = ", ".join(f"{key}={value}" for key, value in fields.items())
+        print(f"[{event}] {details}", flush=True)
+
+
+def run_metadata(args: argparse.Namespace) -> int:
+    """
+    Modify the metadata of a directory tree and add a cover page to its PDFs.
+
+    Args:
+        args (argparse.Namespace): The parsed command line.
+
+    Returns:
+        int: The exit code.
+    """
+
+    from university_helper.manifest import Manifest
+    from university_helper.metadata import Throughput, plan_directory, process_files
+
+    with Manifest(args.output) as manifest:
+
+        tasks = plan_directory(args.input, args.output)
+
+        if not args.full:
+
+            tasks = list(manifest.pending(tasks))
+
+        emit(args, "start", files=len(tasks), skipped=manifest.skipped)
+        throughput = Throughput()
+
+        for result in process_files(
+            tasks, args.degree, jobs=args.jobs, link_strategy=args.link_strategy
+        ):
+
+            manifest.record(result)
+            throughput.update(result)
+
+            if result.error is not None:
+
+                status = "error"
+
+            elif result.skipped:
+
+                status = "skipped"
+
+            else:
+
+                status = "done"
+
+            emit(
+                args,
+                "file",
+                path=result.task.source_path,
+                status=status,
+                error=result.error,
+                throughput=str(throughput),
+            )
+
+    emit(
+        args,
+        "summary",
+        files=throughput.files,
+        skipped=manifest.skipped + throughput.skipped,
+        errors=throughput.errors,
+        bytes_moved=throughput.bytes_moved,
+        bytes_linked=throughput.bytes_linked,
+    )
+
+    return 1 if throughput.errors else 0
+
+
+def run_pdf2md(args: argparse.Namespace) -> int:
+    """
+    Convert a PDF, or a directory tree of PDFs, to Markdown.
+
+    Args:
+        args (argparse.Namespace): The parsed command line.
+
+    Returns:
+        int: The exit code.
+    """
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    from university_helper.pdf_to_markdown import (
+        PreprocessConfig,
+        convert_pdf_to_markdown,
+        open_ocr_cache,
+        plan_markdown_tree,
+    )
+
+    if os.path.isdir(args.input):
+
+        files = plan_markdown_tree(args.input, args.output)
+
+    else:
+
+        files = [(args.input, args.output)]
+
+    cache = None
+
+    if args.method in ("Auto", "OCR") and not args.no_cache:
+
+        cache = open_ocr_cache()
+
+    preprocessing = PreprocessConfig(denoise=args.denoise, deskew=args.deskew)
+
+    # The files converted at once share the CPUs, so their pages do not oversubscribe them
+    page_workers = args.page_workers or max(1, (os.cpu_count() or 1) // args.jobs)
+
+    def convert(pdf_path: str, md_path: str) -> int:
+
+        for attempt in range(args.retries + 1):
+
+            try:
+
+                return convert_pdf_to_markdown(
+                    pdf_path,
+                    md_path,
+                    args.method,
+                    args.lang,
+                    page_workers,
+                    cache,
+                    preprocessing,
+                )
+
+            except Exception:
+
+                if attempt == args.retries:
+
+                    raise
+
+    emit(args, "start", files=len(files))
+    start = time.monotonic()
+    pages = errors = 0
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+
+        futures = {
+            executor.submit(convert, pdf_path, md_path): pdf_path
+            for pdf_path, md_path in files
+        }
+
+        for future in as_completed(futures):
+
+            try:
+
+                file_pages = future.result()
+
+            except Exception as e:
+
+                errors += 1
+                emit(args, "file", path=futures[future], status="error", error=str(e))
+                continue
+
+            pages += file_pages
+            emit(args, "file", path=futures[future], status="done", pages=file_pages)
+
+    elapsed = time.monotonic() - start
+    emit(
+        args,
+        "summary",
+        files=len(files),
+        errors=errors,
+        pages=pages,
+        pages_per_second=round(pages / max(elapsed, 1e-9), 2),
+    )
+
+    return 1 if errors else 0
+
+
+def run_transcribe(args: argparse.Namespace) -> int:
+    """
+    Transcribe audio files to Markdown, subtitles or JSON.
+
+    Args:
+        args (argparse.Namespace): The parsed command line.
+
+    Returns:
+        int: The exit code.
+    """
+
+    from university_helper.transcript_export import export_path, export_transcript
+    from university_helper.transcription import (
+        audio_fingerprint,
+        get_cached_transcript,
+        load_audio,
+        load_whisper_model,
+        open_transcript_cache,
+        plan_chunks,
+        put_cached_transcript,
+        stitch_segments,
+        transcribe,
+        transcribe_chunks,
+        transcript_key,
+        transcription_workers,
+    )
+
+    cache = None if args.no_cache else open_transcript_cache()
+    options = {"language": args.language} if args.language else {}
+    model = None
+
+    # Each long-form worker loads its own copy of the model, so they are capped by
+    # the memory budget of the models
+    workers = transcription_workers(args.model, args.backend, args.jobs)
+
+    if workers < args.jobs:
+
+        emit(
+            args,
+            "warning",
+            message=f"--jobs lowered to {workers} to fit the CPUs and model budget",
+        )
+
+    # Transcripts keep the paths of their inputs below the common folder, so inputs
+    # with the same name in different folders do not overwrite each other
+    inputs = list(dict.fromkeys(os.path.abspath(path) for path in args.input))
+    root = os.path.commonpath([os.path.dirname(path) for path in inputs])
+    os.makedirs(args.output, exist_ok=True)
+    errors = 0
+
+    for audio_path in inputs:
+
+        emit(args, "start", path=audio_path, model=args.model)
+        start = time.monotonic()
+
+        try:
+
+            result = key = None
+
+            if cache is not None:
+
+                key = transcript_key(
+                    audio_fingerprint(audio_path), args.model, args.backend, **options
+                )
+                result = get_cached_transcript(cache, key)
+
+            cached = result is not None
+
+            if cached:
+
+                emit(args, "cached", path=audio_path)
+
+            elif workers == 1:
+
+                # Loaded on the first file missing from the cache
+                model = model or load_whisper_model(args.model, args.backend)
+                result = transcribe(model, audio_path, **options)
+
+            else:
+
+                # The long-form mode loads a model in each worker process instead
+                audio = load_audio(audio_path)
+                chunks = plan_chunks(audio)
+                results = []
+
+                for chunk, chunk_result in transcribe_chunks(
+                    args.model, audio, chunks, workers, args.backend, **options
+                ):
+
+                    results.append((chunk, chunk_result))
+                    emit(
+                        args,
+                        "chunk",
+                        path=audio_path,
+                        done=len(results),
+                        total=len(chunks),
+                    )
+
+                result = stitch_segments(results)
+
+            if key is not None and not cached:
+
+                put_cached_transcript(cache, key, result)
+
+        except Exception as e:
+
+            errors += 1
+            emit(args, "file", path=audio_path, status="error", error=str(e))
+            continue
+
+        export_format = TRANSCRIPT_FORMATS[args.export]
+        output_file = export_path(
+            os.path.join(args.output, os.path.relpath(audio_path, root)), export_format
+        )
+        export_transcript(result, output_file, export_format)
+
+        emit(
+            args,
+            "file",
+            path=audio_path,
+            status="done",
+            output=output_file,
+            seconds=round(time.monotonic() - start, 1),
+        )
+
+    return 1 if errors else 0
+
+
+def run_stats(args: argparse.Namespace) -> int:
+    """
+    Print the grade statistics of a CSV file.
+
+    Args:
+        args (argparse.Namespace): The parsed command line.
+
+    Returns:
+        int: The exit code.
+    """
+
+    from university_helper import stats
+
+    data = stats.load_data(args.input)
+    year_means = stats.subject_year_means(data)
+
+    emit(
+        args,
+        "stats",
+        mean_score=round(float(data["Score"].mean()), 2),
+        top_subjects=stats.top_subjects(data, args.top).to_dict("records"),
+        year_means=json.loads(year_means.to_json(orient="records")),
+    )
+
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Build the command line parser.
+
+    Returns:
+        argparse.ArgumentParser: The parser with one subcommand per pipeline.
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="university-helper", description="Run the University Helper pipelines."
+    )
+    parser.add_argument(
+        "--format",
+        choices=("text", "jsonl"),
+        default="text",
+        help="Format of the progress output.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    metadata = subparsers.add_parser(
+        "metadata", help="Modify the metadata of the PDFs of a tree and add a cover."
+    )
+    metadata.add_argument("input", help="Directory with the original documents.")
+    metadata.add_argument("output", help="Directory for the modified tree.")
+    metadata.add_argument("--degree", required=True, help="Degree shown on the cover.")
+    metadata.add_argument(
+        "--jobs",
+        type=positive_int,
+        default=None,
+        help="Files processed at once, the number of CPUs if unset.",
+    )
+    metadata.add_argument(
+        "--link-strategy",
+        choices=("copy", "reflink", "hardlink", "symlink"),
+        default="copy",
+        help="How to mirror files other than PDFs.",
+    )
+    metadata.add_argument(
+        "--full", action="store_true", help="Reprocess files unchanged since last run."
+    )
+    metadata.set_defaults(run=run_metadata)
+
+    pdf2md = subparsers.add_parser(
+        "pdf2md", help="Convert a PDF, or a tree of PDFs, to Markdown."
+    )
+    pdf2md.add_argument("input", help="PDF file or directory of PDF files.")
+    pdf2md.add_argument("output", help="Markdown file or output directory.")
+    pdf2md.add_argument(
+        "--method", choices=("Auto", "OCR", "PyPDF2", "Ctrl+A"), default="Auto"
+    )
+    pdf2md.add_argument(
+        "--lang", default="eng", help="Tesseract languages, e.g. eng+spa."
+    )
+    pdf2md.add_argument(
+        "--jobs", type=positive_int, default=1, help="Files converted at once."
+    )
+    pdf2md.add_argument(
+        "--page-workers",
+        type=positive_int,
+        default=None,
+        help="Pages OCRed at once per file (the CPUs shared among the --jobs files).",
+    )
+    pdf2md.add_argument("--retries", type=int, default=2, help="Retries per file.")
+    pdf2md.add_argument("--denoise", action="store_true", help="Denoise before OCR.")
+    pdf2md.add_argument("--deskew", action="store_true", help="Deskew before OCR.")
+    pdf2md.add_argument(
+        "--no-cache", action="store_true", help="Disable the OCR cache."
+    )
+    pdf2md.set_defaults(run=run_pdf2md)
+
+    transcribe = subparsers.add_parser("transcribe", help="Transcribe audio files.")
+    transcribe.add_argument("input", nargs="+", help="Audio files.")
+    transcribe.add_argument("--output", default="./transcriptions")
+    transcribe.add_argument(
+        "--model",
+        choices=("tiny", "base", "small", "medium", "large"),
+        default="small",
+    )
+    transcribe.add_argument(
+        "--backend",
+        choices=("whisper", "whisper-int8", "faster-whisper"),
+        default="whisper",
+        help="Inference engine running the model.",
+    )
+    transcribe.add_argument(
+        "--language", default=None, help="Language of the audio, detected if unset."
+    )
+    transcribe.add_argument(
+        "--no-cache", action="store_true", help="Disable the transcript cache."
+    )
+    transcribe.add_argument(
+        "--jobs",
+        "--workers",
+        type=positive_int,
+        default=1,
+        help="Processes transcribing chunks of each file at once (long-form mode), "
+        "each loading its own copy of the model.",
+    )
+    transcribe.add_argument(
+        "--export",
+        choices=TRANSCRIPT_FORMATS,
+        default="md",
+        help="Format of the transcripts.",
+    )
+    transcribe.set_defaults(run=run_transcribe)
+
+    stats = subparsers.add_parser("stats", help="Print grade statistics of a CSV.")
+    stats.add_argument("input", help="CSV file with Date, Subject and Score columns.")
+    stats.add_argument("--top", type=int, default=3, help="Number of top subjects.")
+    stats.set_defaults(run=run_stats)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Run the command line interface.
+
+    Args:
+        argv (list[str] | None, optional): The arguments. Defaults to the process arguments.
+
+    Returns:
+        int: The exit code.
+    """
+
+    args = build_parser().parse_args(argv)
+
+    return args.run(args)
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -0,0 +1,199 @@
+import errno
+import os
+import shutil
+
+# Strategies to mirror a file that does not need modifications
+LINK_STRATEGIES = ("copy", "reflink", "hardlink", "symlink")
+
+# Linux ioctl that makes the destination share the extents of the source (FICLONE)
+FICLONE = 0x40049409
+
+# Errors meaning that the filesystem cannot link the files, so we fall back to a copy
+FALLBACK_ERRNOS = {
+    errno.EXDEV,
+    errno.EPERM,
+    errno.ENOTSUP,
+    errno.EOPNOTSUPP,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.EMLINK,
+    errno.ENOTTY,
+}
+
+
+def copy_file(source_path: str, output_path: str, block_size: int = 1 << 24) -> None:
+    """
+    Copy a file inside the kernel, without moving its bytes through user space.
+
+    `os.copy_file_range` is preferred, since it lets the filesystem (e.g. NFS 4.2 or
+    Btrfs) copy server-side; `os.sendfile` is used otherwise, and a plain buffered copy
+    as the last resort. Permission bits are copied like `shutil.copy` does.
+
+    Args:
+        source_path (str): The path to the original file.
+        output_path (str): The path where the copy will be saved.
+        block_size (int, optional): The number of bytes copied per call. Defaults to 16 MiB.
+    """
+
+    with open(source_path, "rb") as source, open(output_path, "wb") as output:
+
+        size = os.fstat(source.fileno()).st_size
+        copied = 0
+
+        for copy in (_copy_file_range, _sendfile):
+
+            try:
+
+                copied = copy(source.fileno(), output.fileno(), size, block_size)
+                break
+
+            except (AttributeError, OSError) as e:
+
+                if isinstance(e, OSError) and e.errno not in FALLBACK_ERRNOS:
+
+                    raise
+
+                # Start over with the next helper
+                source.seek(0)
+                output.seek(0)
+                output.truncate()
+
+        # Copy whatever the kernel helpers could not
+        source.seek(copied)
+        output.seek(copied)
+        shutil.copyfileobj(source, output, block_size)
+
+    shutil.copymode(source_path, output_path)
+
+
+def _copy_file_range(source: int, output: int, size: int, block_size: int) -> int:
+    """
+    Copy a file descriptor with `os.copy_file_range`.
+
+    Args:
+        source (int): The file descriptor of the original file.
+        output (int): The file descriptor of the copy.
+        size (int): The number of bytes to copy.
+        block_size (int): The number of bytes copied per call.
+
+    Returns:
+        int: The number of bytes copied.
+    """
+
+    copied = 0
+
+    while copied < size:
+
+        sent = os.copy_file_range(source, output, min(block_size, size - copied))
+
+        if sent == 0:
+
+            break
+
+        copied += sent
+
+    return copied
+
+
+def _sendfile(source: int, output: int, size: int, block_size: int) -> int:
+    """
+    Copy a file descriptor with `os.sendfile`.
+
+    Args:
+        source (int): The file descriptor of the original file.
+        output (int): The file descriptor of the copy.
+        size (int): The number of bytes to copy.
+        block_size (int): The number of bytes copied per call.
+
+    Returns:
+        int: The number of bytes copied.
+    """
+
+    copied = 0
+
+    while copied < size:
+
+        sent = os.sendfile(output, source, copied, min(block_size, size - copied))
+
+        if sent == 0:
+
+            break
+
+        copied += sent
+
+    return copied
+
+
+def reflink_file(source_path: str, output_path: str) -> None:
+    """
+    Create a copy-on-write clone of a file, sharing its data blocks.
+
+    Args:
+        source_path (str): The path to the original file.
+        output_path (str): The path where the clone will be saved.
+    """
+
+    import fcntl
+
+    with open(source_path, "rb") as source, open(output_path, "wb") as output:
+
+        fcntl.ioctl(output.fileno(), FICLONE, source.fileno())
+
+    shutil.copymode(source_path, output_path)
+
+
+def transfer_file(source_path: str, output_path: str, strategy: str = "copy") -> bool:
+    """
+    Mirror an unmodified file into the output tree using the given strategy.
+
+    Linking strategies fall back to a copy when the filesystem does not support them
+    (e.g. hard links across devices or reflinks on ext4).
+
+    Args:
+        source_path (str): The path to the original file.
+        output_path (str): The path where the file will be mirrored.
+        strategy (str, optional): One of `LINK_STRATEGIES`. Defaults to "copy".
+
+    Returns:
+        bool: True if the file was linked, False if its bytes were copied.
+    """
+
+    if strategy not in LINK_STRATEGIES:
+
+        raise ValueError(f"Unknown link strategy: {strategy}")
+
+    # Links cannot overwrite the output of a previous run
+    if os.path.lexists(output_path):
+
+        os.remove(output_path)
+
+    try:
+
+        if strategy == "hardlink":
+
+            os.link(source_path, output_path)
+            return True
+
+        if strategy == "symlink":
+
+            os.symlink(os.path.abspath(source_path), output_path)
+            return True
+
+        if strategy == "reflink":
+
+            reflink_file(source_path, output_path)
+            return True
+
+    except (AttributeError, OSError) as e:
+
+        if isinstance(e, OSError) and e.errno not in FALLBACK_ERRNOS:
+
+            raise
+
+        if os.path.lexists(output_path):
+
+            os.remove(output_path)
+
+    copy_file(source_path, output_path)
+
+    return False
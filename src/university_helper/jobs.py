@@ -0,0 +1,312 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+# Job processed by the calling worker thread, so its function can report its stage
+_current = threading.local()
+
+
+@dataclass
+class Job:
+    """
+    A unit of work of a background queue.
+
+    Attributes:
+        name (str): The name shown in the status table (e.g. the input file).
+        args (tuple): The arguments passed to the function of the queue, dropped once the job is over.
+        status (str): One of "queued", "running", "done", "failed" or "cancelled".
+        attempts (int): The number of times the job has been started.
+        units (int): The amount of work done (e.g. pages), as returned by the function.
+        error (str | None): The error of the last attempt, if any.
+        started (float | None): When the job was first started.
+        finished (float | None): When the job finished.
+        stage (str | None): What the job is doing within its status (e.g. "downloading").
+    """
+
+    name: str
+    args: tuple
+    status: str = "queued"
+    attempts: int = 0
+    units: int = 0
+    error: str | None = None
+    started: float | None = None
+    finished: float | None = None
+    stage: str | None = None
+
+
+def set_stage(stage: str) -> None:
+    """
+    Report the stage of the job processed by the calling thread, shown in the status table.
+
+    Does nothing when called outside of a job queue.
+
+    Args:
+        stage (str): What the job is doing (e.g. "downloading").
+    """
+
+    job = getattr(_current, "job", None)
+
+    if job is not None:
+
+        job.stage = stage
+
+
+def load_journal(path: str) -> list[Job]:
+    """
+    Read the jobs saved by a queue with a journal, e.g. to resume the unfinished ones.
+
+    Args:
+        path (str): The path to the journal.
+
+    Returns:
+        list[Job]: The saved jobs, or an empty list if there is no journal.
+    """
+
+    try:
+
+        with open(path, encoding="utf-8") as f:
+
+            rows = json.load(f)
+
+    except (FileNotFoundError, json.JSONDecodeError):
+
+        return []
+
+    return [Job(**{**row, "args": tuple(row["args"])}) for row in rows]
+
+
+class JobQueue:
+    """
+    Run jobs on a pool of background threads, retrying the ones that fail.
+
+    The queue does not depend on the Streamlit script run, so it can be kept in the
+    session state and keep working across reruns while the page polls its status.
+    With a journal, the jobs are also saved to disk after every change, which needs
+    their arguments to be JSON-serializable.
+    """
+
+    def __init__(
+        self,
+        run: Callable[..., int],
+        workers: int = 1,
+        retries: int = 2,
+        journal: str | None = None,
+    ) -> None:
+        """
+        Create the queue and its worker threads.
+
+        Args:
+            run (Callable[..., int]): The function processing a job, returning the units of work done.
+            workers (int, optional): The number of jobs processed at once. Defaults to 1.
+            retries (int, optional): The number of times a failed job is retried. Defaults to 2.
+            journal (str | None, optional): The JSON file where the jobs are saved. Defaults to None.
+        """
+
+        self.run = run
+        self.workers = workers
+        self.retries = retries
+        self.journal = journal
+        self.jobs: list[Job] = []
+        self.lock = threading.Lock()
+        self.journal_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def submit(self, name: str, *args) -> Job:
+        """
+        Add a job to the queue.
+
+        Args:
+            name (str): The name shown in the status table.
+            *args: The arguments passed to the function of the queue.
+
+        Returns:
+            Job: The queued job.
+        """
+
+        job = Job(name, args)
+
+        with self.lock:
+
+            self.jobs.append(job)
+
+        self._save()
+        self.executor.submit(self._run, job)
+
+        return job
+
+    def _run(self, job: Job) -> None:
+        """
+        Process a job, requeueing it if it fails and has retries left.
+
+        Args:
+            job (Job): The job to process.
+        """
+
+        with self.lock:
+
+            # Cancelled by `shutdown` after a worker had already picked it up
+            if job.status == "cancelled":
+
+                return
+
+            job.status = "running"
+
+        job.stage = None
+        job.attempts += 1
+        job.started = job.started or time.time()
+        _current.job = job
+        self._save()
+
+        try:
+
+            job.units = self.run(*job.args)
+
+        except Exception as e:
+
+            job.error = f"{type(e).__name__}: {e}"
+
+            if job.attempts <= self.retries:
+
+                job.status = "queued"
+
+                try:
+
+                    self.executor.submit(self._run, job)
+                    self._save()
+                    return
+
+                except RuntimeError:
+
+                    # The queue has been shut down
+                    pass
+
+            job.status = "failed"
+
+        else:
+
+            job.status = "done"
+            job.error = None
+
+        finally:
+
+            _current.job = None
+
+        # Released, since the arguments may hold large inputs (e.g. uploaded files)
+        job.args = ()
+        job.stage = None
+        job.finished = time.time()
+        self._save()
+
+    def _save(self) -> None:
+        """
+        Write every job to the journal, if the queue has one.
+        """
+
+        if self.journal is None:
+
+            return
+
+        # Serialized, so an older snapshot never replaces a newer one
+        with self.journal_lock:
+
+            with self.lock:
+
+                rows = [asdict(job) for job in self.jobs]
+
+            # Written aside and renamed, so a crash never leaves a truncated journal
+            os.makedirs(os.path.dirname(self.journal) or ".", exist_ok=True)
+            temporary = f"{self.journal}.tmp"
+
+            with open(temporary, "w", encoding="utf-8") as f:
+
+                json.dump(rows, f)
+
+            os.replace(temporary, self.journal)
+
+    def table(self) -> list[dict]:
+        """
+        Get the status of every job, for display.
+
+        Returns:
+            list[dict]: One row per job, in submission order.
+        """
+
+        with self.lock:
+
+            jobs = list(self.jobs)
+
+        return [
+            {
+                "name": job.name,
+                "status": job.status,
+                "attempts": job.attempts,
+                "stage": job.stage,
+                "units": job.units,
+                "seconds": (
+                    round((job.finished or time.time()) - job.started, 1)
+                    if job.started
+                    else None
+                ),
+                "error": job.error,
+            }
+            for job in jobs
+        ]
+
+    def summary(self) -> dict:
+        """
+        Get the overall progress of the queue.
+
+        Returns:
+            dict: The number of jobs per status, the units done and the units per second.
+        """
+
+        with self.lock:
+
+            jobs = list(self.jobs)
+
+        summary = {
+            status: 0 for status in ("queued", "running", "done", "failed", "cancelled")
+        }
+
+        for job in jobs:
+
+            summary[job.status] += 1
+
+        done = [job for job in jobs if job.status == "done"]
+        summary["units"] = sum(job.units for job in done)
+        summary["units_per_second"] = 0.0
+
+        if done:
+
+            elapsed = max(job.finished for job in done) - min(
+                job.started for job in done
+            )
+            summary["units_per_second"] = summary["units"] / max(elapsed, 1e-9)
+
+        return summary
+
+    def shutdown(self) -> None:
+        """
+        Stop accepting jobs, cancelling the ones that have not started.
+
+        The running jobs are left to finish, while the queued ones are marked as
+        cancelled, so the journal does not list them as unfinished.
+        """
+
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+        with self.lock:
+
+            for job in self.jobs:
+
+                if job.status == "queued":
+
+                    job.status = "cancelled"
+                    job.args = ()
+                    job.finished = time.time()
+
+        self._save()
@@ -0,0 +1,131 @@
+import os
+import sqlite3
+from typing import Iterable, Iterator
+
+from university_helper.metadata import FileResult, FileTask
+
+# Name of the manifest file stored in the output directory
+MANIFEST_NAME = ".metadata_manifest.sqlite"
+
+# Number of recorded results between two commits of the manifest
+COMMIT_EVERY = 256
+
+
+class Manifest:
+    """
+    Record of the files processed into an output directory, used to make runs incremental.
+
+    Each source file is stored with its size, modification time, content hash and the
+    outcome of its processing. Results are committed in batches, so an interrupted run
+    loses at most the last batch and is resumed by the next one.
+    """
+
+    def __init__(self, new_directory: str) -> None:
+        """
+        Open (or create) the manifest of the output directory.
+
+        Args:
+            new_directory (str): The path to the output directory.
+        """
+
+        os.makedirs(new_directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(new_directory, MANIFEST_NAME))
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                source_path TEXT PRIMARY KEY,
+                output_path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                content_hash TEXT,
+                status TEXT NOT NULL,
+                error TEXT
+            )
+            """
+        )
+        self.connection.commit()
+        self.skipped = 0
+        self.uncommitted = 0
+
+    def __enter__(self) -> "Manifest":
+
+        return self
+
+    def __exit__(self, *args) -> None:
+
+        self.close()
+
+    def pending(self, tasks: Iterable[FileTask]) -> Iterator[FileTask]:
+        """
+        Filter out the files already processed by a previous run.
+
+        Files with the same size and modification time as recorded are skipped outright.
+        Otherwise the recorded hash is attached to the task, so the worker can still
+        skip the file if only its modification time changed.
+
+        Args:
+            tasks (Iterable[FileTask]): The files of the tree.
+
+        Yields:
+            FileTask: The files that need to be (re)processed.
+        """
+
+        for task in tasks:
+
+            row = self.connection.execute(
+                "SELECT size, mtime, content_hash, status FROM files WHERE source_path = ?",
+                (task.source_path,),
+            ).fetchone()
+
+            if row is not None and row[3] == "done":
+
+                size, mtime, content_hash, _ = row
+
+                if (
+                    size == task.size
+                    and mtime == task.mtime
+                    and os.path.exists(task.output_path)
+                ):
+
+                    self.skipped += 1
+                    continue
+
+                task.known_hash = content_hash
+
+            yield task
+
+    def record(self, result: FileResult) -> None:
+        """
+        Store the outcome of a processed file.
+
+        Args:
+            result (FileResult): The result of the processed file.
+        """
+
+        task = result.task
+        self.connection.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                task.source_path,
+                task.output_path,
+                task.size,
+                task.mtime,
+                result.content_hash,
+                "done" if result.error is None else "error",
+                result.error,
+            ),
+        )
+        self.uncommitted += 1
+
+        if self.uncommitted >= COMMIT_EVERY:
+
+            self.connection.commit()
+            self.uncommitted = 0
+
+    def close(self) -> None:
+        """
+        Commit the pending results and close the manifest.
+        """
+
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,498 @@
+import functools
+import hashlib
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Iterator
+
+from reportlab.lib.pagesizes import letter
+
+from university_helper.file_transfer import transfer_file
+
+if TYPE_CHECKING:
+
+    import pikepdf
+    from faker import Faker
+
+# pikepdf, Faker and the reportlab canvas are imported inside the functions using them
+
+# Number of (degree, page size) cover templates kept per process
+COVER_CACHE_SIZE = 32
+
+
+@dataclass
+class FileTask:
+    """
+    A single file of the tree to be mirrored into the output directory.
+
+    Attributes:
+        source_path (str): The path to the original file.
+        output_path (str): The path where the processed file will be saved.
+        size (int): The size of the original file in bytes.
+        mtime (float): The modification time of the original file.
+        known_hash (str | None): The content hash recorded by a previous run, if any.
+    """
+
+    source_path: str
+    output_path: str
+    size: int
+    mtime: float = 0.0
+    known_hash: str | None = None
+
+
+@dataclass
+class FileResult:
+    """
+    The outcome of processing a single file.
+
+    Attributes:
+        task (FileTask): The task that was processed.
+        error (str | None): The error message, or None if the file was processed.
+        content_hash (str | None): The hash of the original file contents, or None if it was not hashed.
+        skipped (bool): Whether the file was unchanged since the previous run.
+        bytes_moved (int): The number of bytes written to the output tree.
+        bytes_linked (int): The number of bytes mirrored through a link instead of a copy.
+    """
+
+    task: FileTask
+    error: str | None = None
+    content_hash: str | None = None
+    skipped: bool = False
+    bytes_moved: int = 0
+    bytes_linked: int = 0
+
+
+@dataclass
+class CoverTemplate:
+    """
+    A pre-rendered cover page with the degree name, waiting for the file name.
+
+    Attributes:
+        pdf (pikepdf.Pdf): The in-memory document holding the template page.
+        font (str): The resource name of the Helvetica font used by the page.
+        page_size (tuple[float, float]): The width and height of the page.
+    """
+
+    pdf: "pikepdf.Pdf"
+    font: str
+    page_size: tuple[float, float]
+
+
+class Throughput:
+    """
+    Keep track of the processed files and bytes to report the processing speed.
+    """
+
+    def __init__(self) -> None:
+
+        self.start = time.monotonic()
+        self.files = 0
+        self.bytes = 0
+        self.errors = 0
+        self.skipped = 0
+        self.bytes_moved = 0
+        self.bytes_linked = 0
+
+    def update(self, result: FileResult) -> None:
+        """
+        Account for a processed file.
+
+        Args:
+            result (FileResult): The result of the processed file.
+        """
+
+        self.files += 1
+        self.bytes += result.task.size
+        self.bytes_moved += result.bytes_moved
+        self.bytes_linked += result.bytes_linked
+
+        if result.error is not None:
+
+            self.errors += 1
+
+        if result.skipped:
+
+            self.skipped += 1
+
+    def __str__(self) -> str:
+
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+
+        return (
+            f"{self.files / elapsed:.1f} files/s, "
+            f"{self.bytes / elapsed / 1e6:.1f} MB/s"
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def get_faker() -> "Faker":
+    """
+    Get the generator of random metadata, created once per process.
+
+    Returns:
+        Faker: The random data generator.
+    """
+
+    from faker import Faker
+
+    return Faker()
+
+
+def create_cover(file_name: str, degree_name: str, output: str | BinaryIO) -> None:
+    """
+    Create a cover page for the PDF with the file name and degree name.
+
+    Args:
+        file_name (str): The name of the file to display on the cover.
+        degree_name (str): The name of the degree to display on the cover.
+        output (str | BinaryIO): The path or file object where the cover PDF will be saved.
+    """
+
+    from reportlab.pdfgen import canvas
+
+    c = canvas.Canvas(output, pagesize=letter)
+    width, height = letter
+
+    # Write the file name on the cover
+    c.setFont("Helvetica", 24)
+    c.drawCentredString(width / 2.0, height / 2.0 + 40, f"File Name: {file_name}")
+
+    # Write the degree name on the cover
+    c.setFont("Helvetica", 20)
+    c.drawCentredString(width / 2.0, height / 2.0, f"Degree: {degree_name}")
+
+    c.save()
+
+
+@functools.lru_cache(maxsize=COVER_CACHE_SIZE)
+def get_cover_template(
+    degree_name: str, page_size: tuple[float, float] = letter
+) -> CoverTemplate:
+    """
+    Render the part of the cover shared by a whole batch, caching it per process.
+
+    Args:
+        degree_name (str): The name of the degree to display on the cover.
+        page_size (tuple[float, float], optional): The size of the cover. Defaults to letter.
+
+    Returns:
+        CoverTemplate: The cover template.
+    """
+
+    import pikepdf
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=page_size)
+    width, height = page_size
+
+    # Write the degree name on the cover
+    c.setFont("Helvetica", 20)
+    c.drawCentredString(width / 2.0, height / 2.0, f"Degree: {degree_name}")
+
+    c.save()
+    buffer.seek(0)
+
+    pdf = pikepdf.open(buffer)
+    fonts = pdf.pages[0].Resources.Font
+    font = next(
+        str(name) for name, value in fonts.items() if value.BaseFont == "/Helvetica"
+    )
+
+    return CoverTemplate(pdf, font, page_size)
+
+
+def add_cover(
+    pdf: "pikepdf.Pdf",
+    file_name: str,
+    degree_name: str,
+    page_size: tuple[float, float] = letter,
+) -> None:
+    """
+    Insert a cover page in front of the document, stamping the file name on the cached template.
+
+    Args:
+        pdf (pikepdf.Pdf): The document that receives the cover.
+        file_name (str): The name of the file to display on the cover.
+        degree_name (str): The name of the degree to display on the cover.
+        page_size (tuple[float, float], optional): The size of the cover. Defaults to letter.
+    """
+
+    import pikepdf
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    template = get_cover_template(degree_name, page_size)
+    pdf.pages.insert(0, template.pdf.pages[0])
+
+    # Write the file name on the cover, centred as reportlab would do
+    text = f"File Name: {file_name}"
+    width, height = template.page_size
+    x = width / 2.0 - stringWidth(text, "Helvetica", 24) / 2.0
+    y = height / 2.0 + 40
+
+    content = pikepdf.unparse_content_stream(
+        [
+            ([], pikepdf.Operator("BT")),
+            ([pikepdf.Name(template.font), 24], pikepdf.Operator("Tf")),
+            ([x, y], pikepdf.Operator("Td")),
+            (
+                [pikepdf.String(text.encode("cp1252", errors="replace"))],
+                pikepdf.Operator("Tj"),
+            ),
+            ([], pikepdf.Operator("ET")),
+        ]
+    )
+    pdf.pages[0].contents_add(pikepdf.Stream(pdf, content))
+
+
+def modify_metadata_and_add_cover(
+    pdf_path: str, degree_name: str, output_path: str
+) -> None:
+    """
+    Modify the metadata and add a cover page to the PDF.
+
+    The cover comes from the cached template and the merged, compressed document is
+    serialized a single time straight to the output path.
+
+    Args:
+        pdf_path (str): The path to the original PDF.
+        degree_name (str): The name of the degree to display on the cover.
+        output_path (str): The path where the modified PDF will be saved.
+    """
+
+    import pikepdf
+
+    fake = get_faker()
+
+    with pikepdf.open(pdf_path) as pdf:
+
+        # Add the cover in front of the original pages
+        add_cover(pdf, os.path.basename(pdf_path), degree_name)
+
+        # Random metadata
+        metadata = {
+            "/Title": fake.sentence(nb_words=5),
+            "/Author": fake.name(),
+            "/Subject": fake.sentence(nb_words=7),
+            "/Producer": fake.company(),
+            "/Creator": fake.name(),
+            "/Keywords": ", ".join(fake.words(nb=5)),
+        }
+
+        for key, value in metadata.items():
+
+            pdf.docinfo[key] = value
+
+        # Save the compressed file with modified metadata and added cover
+        pdf.save(
+            output_path,
+            compress_streams=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+        )
+
+
+def plan_directory(original_directory: str, new_directory: str) -> list[FileTask]:
+    """
+    Walk the original directory once, mirroring its folders into the new directory.
+
+    Every file of the tree appears exactly once in the returned list, sorted by path
+    so that the output tree does not depend on the walk order.
+
+    Args:
+        original_directory (str): The path to the original directory.
+        new_directory (str): The path to the new directory.
+
+    Returns:
+        list[FileTask]: The files to process.
+    """
+
+    tasks = []
+
+    for root, dirs, files in os.walk(original_directory):
+
+        dirs.sort()
+
+        # Create the directory structure in the new directory
+        relative_path = os.path.relpath(root, original_directory)
+        new_root = os.path.join(new_directory, relative_path)
+        os.makedirs(new_root, exist_ok=True)
+
+        for file in sorted(files):
+
+            source_path = os.path.join(root, file)
+            stat = os.stat(source_path)
+            tasks.append(
+                FileTask(
+                    source_path,
+                    os.path.join(new_root, file),
+                    stat.st_size,
+                    stat.st_mtime,
+                )
+            )
+
+    return tasks
+
+
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    """
+    Compute the SHA-256 hash of a file, reading it in blocks.
+
+    Args:
+        path (str): The path to the file.
+        block_size (int, optional): The number of bytes read at a time. Defaults to 1 MiB.
+
+    Returns:
+        str: The hexadecimal digest of the file contents.
+    """
+
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as f:
+
+        while block := f.read(block_size):
+
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def process_file(
+    task: FileTask, degree_name: str, link_strategy: str = "copy"
+) -> FileResult:
+    """
+    Process a single file: PDFs get new metadata and a cover, any other file is mirrored.
+
+    Files whose contents match the hash recorded by a previous run are skipped. Other
+    files are only hashed if they are PDFs, whose processing costs far more than
+    reading them, so linked and copied files are never read in Python. Errors are
+    captured in the result so that a broken file does not stop the batch.
+
+    Args:
+        task (FileTask): The file to process.
+        degree_name (str): The name of the degree to display on the cover.
+        link_strategy (str, optional): How to mirror files other than PDFs. Defaults to "copy".
+
+    Returns:
+        FileResult: The outcome of the processing.
+    """
+
+    bytes_moved = bytes_linked = 0
+
+    try:
+
+        is_pdf = task.source_path.lower().endswith(".pdf")
+        content_hash = None
+
+        if is_pdf or task.known_hash is not None:
+
+            content_hash = hash_file(task.source_path)
+
+            if content_hash == task.known_hash and os.path.exists(task.output_path):
+
+                return FileResult(task, content_hash=content_hash, skipped=True)
+
+        if is_pdf:
+
+            modify_metadata_and_add_cover(
+                task.source_path, degree_name, task.output_path
+            )
+            bytes_moved = os.path.getsize(task.output_path)
+
+        elif transfer_file(task.source_path, task.output_path, link_strategy):
+
+            bytes_linked = task.size
+
+        else:
+
+            bytes_moved = task.size
+
+    except Exception as e:
+
+        return FileResult(task, f"{type(e).__name__}: {e}")
+
+    return FileResult(
+        task,
+        content_hash=content_hash,
+        bytes_moved=bytes_moved,
+        bytes_linked=bytes_linked,
+    )
+
+
+def process_files(
+    tasks: Iterable[FileTask],
+    degree_name: str,
+    jobs: int | None = None,
+    max_in_flight: int | None = None,
+    link_strategy: str = "copy",
+) -> Iterator[FileResult]:
+    """
+    Process the files on a pool of worker processes, yielding results as they finish.
+
+    Tasks are consumed lazily and at most `max_in_flight` of them are submitted to
+    the pool at any time, so memory stays bounded regardless of the tree size.
+
+    Args:
+        tasks (Iterable[FileTask]): The files to process.
+        degree_name (str): The name of the degree to display on the cover.
+        jobs (int | None, optional): The number of worker processes. Defaults to the number of CPUs.
+        max_in_flight (int | None, optional): The maximum number of submitted tasks. Defaults to 4 per worker.
+        link_strategy (str, optional): How to mirror files other than PDFs. Defaults to "copy".
+
+    Yields:
+        FileResult: The outcome of each processed file, in completion order.
+    """
+
+    jobs = jobs or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 4 * jobs
+
+    # Spawned, since forking the threads of the Streamlit server can deadlock
+    with ProcessPoolExecutor(
+        max_workers=jobs, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+
+        pending: dict[Future, FileTask] = {}
+
+        for task in tasks:
+
+            future = executor.submit(process_file, task, degree_name, link_strategy)
+            pending[future] = task
+
+            if len(pending) >= max_in_flight:
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+
+                    yield _collect(future, pending.pop(future))
+
+        while pending:
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+
+                yield _collect(future, pending.pop(future))
+
+
+def _collect(future: Future, task: FileTask) -> FileResult:
+    """
+    Get the result of a finished future, turning worker failures into a file error.
+
+    Args:
+        future (Future): The finished future.
+        task (FileTask): The task the future was processing.
+
+    Returns:
+        FileResult: The outcome of the processing.
+    """
+
+    try:
+
+        return future.result()
+
+    except Exception as e:
+
+        return FileResult(task, f"{type(e).__name__}: {e}")
@@ -0,0 +1,334 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator
+
+from university_helper.transcription import load_whisper_model
+
+# Memory the resident models may use together, configurable through the environment
+MODEL_BUDGET_BYTES = (
+    int(os.environ.get("UNIVERSITY_HELPER_MODEL_BUDGET_MB", "4096")) * 1024 * 1024
+)
+
+# Model loaded in the background when the registry is created, empty to disable
+PRELOAD_MODEL = os.environ.get("UNIVERSITY_HELPER_PRELOAD_MODEL", "small")
+
+# Parameters of each Whisper model and bytes per parameter of each backend, used to
+# make room for a model before it is loaded and its real size is known
+MODEL_PARAMETERS = {
+    "tiny": 39_000_000,
+    "base": 74_000_000,
+    "small": 244_000_000,
+    "medium": 769_000_000,
+    "large": 1_550_000_000,
+}
+BYTES_PER_PARAMETER = {"whisper": 4, "whisper-int8": 2, "faster-whisper": 1}
+
+
+@dataclass
+class ResidentModel:
+    """
+    A model kept in memory by the registry.
+
+    Attributes:
+        model_option (str): The name of the Whisper model.
+        backend (str): The inference backend running the model.
+        model (Any): The loaded model, or None while it is loading.
+        size (int): The memory used by the model in bytes.
+        users (int): The number of transcriptions currently using the model.
+        uses (int): The number of times the model has been used.
+        last_used (float): When the model was last used.
+        loaded (threading.Event): Set once the model has been loaded, or has failed to.
+        lock (threading.Lock): Held while the model transcribes.
+        error (BaseException | None): The error raised while loading, if any.
+    """
+
+    model_option: str
+    backend: str
+    model: Any = None
+    size: int = 0
+    users: int = 0
+    uses: int = 0
+    last_used: float = 0.0
+    loaded: threading.Event = field(default_factory=threading.Event)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    error: BaseException | None = None
+
+
+def estimate_model_bytes(model_option: str, backend: str) -> int:
+    """
+    Estimate the memory a model will use before loading it.
+
+    Args:
+        model_option (str): The name of the Whisper model.
+        backend (str): The inference backend running the model.
+
+    Returns:
+        int: The estimated size in bytes.
+    """
+
+    return MODEL_PARAMETERS.get(model_option, 0) * BYTES_PER_PARAMETER.get(backend, 4)
+
+
+def max_model_copies(
+    model_option: str, backend: str, max_bytes: int = MODEL_BUDGET_BYTES
+) -> int:
+    """
+    Count the copies of a model that fit in the memory budget, e.g. one per worker process.
+
+    Args:
+        model_option (str): The name of the Whisper model.
+        backend (str): The inference backend running the model.
+        max_bytes (int, optional): The memory the copies may use together. Defaults to MODEL_BUDGET_BYTES.
+
+    Returns:
+        int: The number of copies, at least 1.
+    """
+
+    return max(1, max_bytes // max(1, estimate_model_bytes(model_option, backend)))
+
+
+def model_bytes(model: Any) -> int:
+    """
+    Measure the memory used by the tensors of a loaded PyTorch model.
+
+    Args:
+        model (Any): The loaded model.
+
+    Returns:
+        int: The size in bytes, or 0 if the model does not expose its tensors.
+    """
+
+    if not hasattr(model, "state_dict"):
+
+        return 0
+
+    total = 0
+    values = list(model.state_dict().values())
+
+    while values:
+
+        value = values.pop()
+
+        # Quantized layers store their weights and biases packed in tuples
+        if isinstance(value, (tuple, list)):
+
+            values.extend(value)
+
+        elif hasattr(value, "element_size"):
+
+            total += value.nelement() * value.element_size()
+
+    return total
+
+
+class ModelRegistry:
+    """
+    Keep the Whisper models loaded by every session, within a memory budget.
+
+    Each (model, backend) pair is loaded once and shared by all sessions. When a new
+    model does not fit in the budget, the least recently used models that are not
+    transcribing are evicted first. A model can be used by one transcription at a
+    time, since Whisper installs its decoding caches as hooks on the shared modules.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = MODEL_BUDGET_BYTES,
+        loader: Callable[[str, str], Any] = load_whisper_model,
+    ) -> None:
+        """
+        Create an empty registry.
+
+        Args:
+            max_bytes (int, optional): The memory the resident models may use together. Defaults to MODEL_BUDGET_BYTES.
+            loader (Callable[[str, str], Any], optional): The function loading a model on a backend. Defaults to load_whisper_model.
+        """
+
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.models: dict[tuple[str, str], ResidentModel] = {}
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def _acquire(self, model_option: str, backend: str) -> ResidentModel:
+        """
+        Get the entry of a model, loading it if it is not resident.
+
+        Args:
+            model_option (str): The name of the Whisper model.
+            backend (str): The inference backend running the model.
+
+        Returns:
+            ResidentModel: The entry, counted as being used until released.
+        """
+
+        key = (model_option, backend)
+
+        with self.lock:
+
+            entry = self.models.get(key)
+            load = entry is None
+
+            if load:
+
+                size = estimate_model_bytes(model_option, backend)
+                self._make_room(size)
+                entry = self.models[key] = ResidentModel(
+                    model_option, backend, size=size
+                )
+
+            entry.users += 1
+
+        if load:
+
+            # Loaded outside of the registry lock, so other models stay available;
+            # concurrent requests for this one wait on its event instead
+            try:
+
+                entry.model = self.loader(model_option, backend)
+                entry.size = model_bytes(entry.model) or estimate_model_bytes(
+                    model_option, backend
+                )
+
+            except BaseException as e:
+
+                entry.error = e
+
+                with self.lock:
+
+                    self.models.pop(key, None)
+
+            entry.loaded.set()
+
+        entry.loaded.wait()
+
+        if entry.error is not None:
+
+            with self.lock:
+
+                entry.users -= 1
+
+            raise entry.error
+
+        return entry
+
+    def _make_room(self, size: int, keep: ResidentModel | None = None) -> None:
+        """
+        Evict the least recently used idle models until `size` more bytes fit.
+
+        Must be called with the registry lock held.
+
+        Args:
+            size (int): The bytes needed by the model about to be loaded.
+            keep (ResidentModel | None, optional): A model never evicted, so one larger than the budget stays usable. Defaults to None.
+        """
+
+        idle = sorted(
+            (
+                entry
+                for entry in self.models.values()
+                if entry.users == 0 and entry is not keep
+            ),
+            key=lambda entry: entry.last_used,
+        )
+        used = sum(entry.size for entry in self.models.values())
+
+        while idle and used + size > self.max_bytes:
+
+            entry = idle.pop(0)
+            del self.models[(entry.model_option, entry.backend)]
+            used -= entry.size
+            self.evictions += 1
+
+    @contextmanager
+    def use(self, model_option: str, backend: str = "whisper") -> Iterator[Any]:
+        """
+        Borrow a model for a transcription, loading it if needed.
+
+        The model is locked while borrowed, so concurrent sessions using the same
+        model take turns instead of corrupting each other's decoding state.
+
+        Args:
+            model_option (str): The name of the Whisper model.
+            backend (str, optional): The inference backend running the model. Defaults to "whisper".
+
+        Yields:
+            Any: The loaded model.
+        """
+
+        entry = self._acquire(model_option, backend)
+
+        try:
+
+            with entry.lock:
+
+                yield entry.model
+
+        finally:
+
+            with self.lock:
+
+                entry.users -= 1
+                entry.uses += 1
+                entry.last_used = time.time()
+                self._make_room(0, keep=entry)
+
+    def preload(self, model_option: str, backend: str = "whisper") -> threading.Thread:
+        """
+        Load a model on a background thread, so it is ready for the first request.
+
+        Args:
+            model_option (str): The name of the Whisper model.
+            backend (str, optional): The inference backend running the model. Defaults to "whisper".
+
+        Returns:
+            threading.Thread: The thread loading the model.
+        """
+
+        def load() -> None:
+
+            with self.use(model_option, backend):
+
+                pass
+
+        thread = threading.Thread(
+            target=load, name=f"preload-{model_option}", daemon=True
+        )
+        thread.start()
+
+        return thread
+
+    def resident(self) -> list[dict]:
+        """
+        Get the models currently held by the registry, for display.
+
+        Returns:
+            list[dict]: One row per model, most recently used first.
+        """
+
+        with self.lock:
+
+            entries = list(self.models.values())
+
+        return [
+            {
+                "model": entry.model_option,
+                "backend": entry.backend,
+                "status": (
+                    "loading"
+                    if not entry.loaded.is_set()
+                    else "in use" if entry.users else "idle"
+                ),
+                "MB": round(entry.size / 1024 / 1024, 1),
+                "uses": entry.uses,
+                "last used": (
+                    time.strftime("%H:%M:%S", time.localtime(entry.last_used))
+                    if entry.last_used
+                    else None
+                ),
+            }
+            for entry in sorted(entries, key=lambda entry: -entry.last_used)
+        ]
@@ -0,0 +1,679 @@
+import hashlib
+import io
+import math
+import os
+import statistics
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+import fitz
+import numpy as np
+import pytesseract
+
+from university_helper.cache import CACHE_DIR, DiskCache, make_key
+
+if TYPE_CHECKING:
+
+    from PyPDF2 import PdfReader
+
+# OpenCV (preprocessing), PyPDF2 and markdownify (text extraction) load on first call
+
+# Resolution used to render pages without any font size information
+DEFAULT_DPI = 300
+
+# Maximum size of the persistent OCR cache
+OCR_CACHE_BYTES = 256 * 1024 * 1024
+
+# Pages with fewer characters in their text layer are considered scanned
+MIN_TEXT_CHARS = 32
+
+# Pages whose images cover a larger fraction of the page are OCRed unless text dominates
+MAX_IMAGE_COVERAGE = 0.5
+
+# Characters per unit of image coverage above which the text layer is trusted anyway
+MIN_TEXT_DENSITY = 1000
+
+# Fraction of unknown glyphs above which the text layer is considered broken
+MAX_UNKNOWN_GLYPHS = 0.05
+
+
+# Per-thread output buffers of the preprocessing steps, reused across pages
+_buffers = threading.local()
+
+
+@dataclass(frozen=True)
+class PreprocessConfig:
+    """
+    Optional steps applied to the grayscale page before the Otsu binarization.
+
+    Attributes:
+        denoise (bool): Whether to remove salt-and-pepper noise with a median filter.
+        deskew (bool): Whether to straighten rotated scans.
+    """
+
+    denoise: bool = False
+    deskew: bool = False
+
+
+@dataclass(frozen=True)
+class RenderConfig:
+    """
+    How pages are rasterized before OCR.
+
+    The resolution of each page is chosen so that its median font size is rendered at
+    `text_height` pixels, clamped to [`min_dpi`, `max_dpi`] and lowered further if the
+    raster would exceed `max_pixels`.
+
+    Attributes:
+        text_height (int): The target height in pixels of the typical font size.
+        min_dpi (int): The lowest resolution used.
+        max_dpi (int): The highest resolution used.
+        max_pixels (int): The maximum number of pixels of a rendered page.
+        clip_to_text (bool): Whether to render only the area of the page with content.
+    """
+
+    text_height: int = 32
+    min_dpi: int = 150
+    max_dpi: int = 400
+    max_pixels: int = 25_000_000
+    clip_to_text: bool = False
+
+
+def open_ocr_cache(max_bytes: int = OCR_CACHE_BYTES) -> DiskCache:
+    """
+    Open the persistent OCR cache, invalidated whenever the tesseract version changes.
+
+    Args:
+        max_bytes (int, optional): The maximum size of the cache. Defaults to 256 MiB.
+
+    Returns:
+        DiskCache: The OCR cache.
+    """
+
+    return DiskCache(
+        os.path.join(CACHE_DIR, "ocr"),
+        max_bytes,
+        version=str(pytesseract.get_tesseract_version()),
+    )
+
+
+def _buffer(name: str, shape: tuple[int, ...]) -> np.ndarray:
+    """
+    Get a reusable output buffer of the calling thread.
+
+    Args:
+        name (str): The name of the preprocessing step using the buffer.
+        shape (tuple[int, ...]): The shape of the buffer.
+
+    Returns:
+        np.ndarray: The uint8 buffer, with undefined contents.
+    """
+
+    arrays = getattr(_buffers, "arrays", None)
+
+    if arrays is None:
+
+        arrays = _buffers.arrays = {}
+
+    if name not in arrays or arrays[name].shape != shape:
+
+        arrays[name] = np.empty(shape, dtype=np.uint8)
+
+    return arrays[name]
+
+
+def deskew_image(gray: np.ndarray) -> np.ndarray:
+    """
+    Rotate a grayscale page so that its text lines are horizontal.
+
+    Args:
+        gray (np.ndarray): The grayscale page.
+
+    Returns:
+        np.ndarray: The straightened page.
+    """
+
+    import cv2
+
+    mask = _buffer("deskew_mask", gray.shape)
+    cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU, mask)
+    coords = cv2.findNonZero(mask)
+
+    if coords is None:
+
+        return gray
+
+    # Bring the angle of the text block into [-45, 45] for any OpenCV convention
+    angle = cv2.minAreaRect(coords)[-1]
+
+    if angle > 45:
+
+        angle -= 90
+
+    elif angle < -45:
+
+        angle += 90
+
+    if abs(angle) < 0.1:
+
+        return gray
+
+    height, width = gray.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+
+    return cv2.warpAffine(
+        gray,
+        matrix,
+        (width, height),
+        dst=_buffer("deskew", gray.shape),
+        flags=cv2.INTER_LINEAR,
+        borderMode=cv2.BORDER_CONSTANT,
+        borderValue=255,
+    )
+
+
+def preprocess_image(
+    gray: np.ndarray, config: PreprocessConfig = PreprocessConfig()
+) -> np.ndarray:
+    """
+    Apply basic image preprocessing techniques to improve OCR accuracy.
+
+    The page is binarized with Otsu's threshold into a single-channel buffer owned by
+    the calling thread, so no full-frame copy is allocated per page.
+
+    Args:
+        gray (np.ndarray): The grayscale page.
+        config (PreprocessConfig, optional): The optional preprocessing steps. Defaults to none.
+
+    Returns:
+        np.ndarray: The binarized page, valid until the thread preprocesses another page.
+    """
+
+    import cv2
+
+    if config.denoise:
+
+        gray = cv2.medianBlur(gray, 3, _buffer("denoise", gray.shape))
+
+    if config.deskew:
+
+        gray = deskew_image(gray)
+
+    thresh = _buffer("threshold", gray.shape)
+    cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU, thresh)
+
+    return thresh
+
+
+def ocr_image(
+    gray: np.ndarray, ln: str, config: PreprocessConfig = PreprocessConfig()
+) -> str:
+    """
+    Preprocess a page image and apply OCR to it.
+
+    Args:
+        gray (np.ndarray): The grayscale page.
+        ln (str): The tesseract languages, joined with "+".
+        config (PreprocessConfig, optional): The optional preprocessing steps. Defaults to none.
+
+    Returns:
+        str: The text of the page.
+    """
+
+    return pytesseract.image_to_string(preprocess_image(gray, config), lang=ln)
+
+
+def content_area(page: fitz.Page) -> fitz.Rect:
+    """
+    Get the area of the page covered by text, images and drawings.
+
+    Args:
+        page (fitz.Page): The page to inspect.
+
+    Returns:
+        fitz.Rect: The bounding box of the content, or the whole page if it is empty.
+    """
+
+    boxes = [fitz.Rect(bbox) & page.rect for _, bbox in page.get_bboxlog()]
+    boxes = [box for box in boxes if not box.is_empty]
+
+    if not boxes:
+
+        return page.rect
+
+    return fitz.Rect(
+        min(box.x0 for box in boxes),
+        min(box.y0 for box in boxes),
+        max(box.x1 for box in boxes),
+        max(box.y1 for box in boxes),
+    )
+
+
+def choose_dpi(page: fitz.Page, clip: fitz.Rect, config: RenderConfig) -> int:
+    """
+    Pick the resolution of a page from its font sizes, within the pixel budget.
+
+    Args:
+        page (fitz.Page): The page to render.
+        clip (fitz.Rect): The area of the page that will be rendered.
+        config (RenderConfig): The rendering settings.
+
+    Returns:
+        int: The resolution in dots per inch.
+    """
+
+    sizes = [
+        span["size"]
+        for block in page.get_text("dict", clip=clip)["blocks"]
+        for line in block.get("lines", ())
+        for span in line["spans"]
+        if span["text"].strip()
+    ]
+
+    if sizes:
+
+        # Font sizes are in points (1/72 inch)
+        dpi = config.text_height * 72 / statistics.median(sizes)
+
+    else:
+
+        dpi = DEFAULT_DPI
+
+    dpi = min(max(dpi, config.min_dpi), config.max_dpi)
+
+    # Keep the raster within the pixel budget, whatever the page size
+    budget_dpi = 72 * math.sqrt(config.max_pixels / max(abs(clip), 1.0))
+
+    return max(int(min(dpi, budget_dpi)), 1)
+
+
+def render_page(
+    page: fitz.Page, config: RenderConfig = RenderConfig()
+) -> tuple[bytes, np.ndarray, int]:
+    """
+    Render a page straight to an 8-bit grayscale raster at an adaptive resolution.
+
+    Args:
+        page (fitz.Page): The page to render.
+        config (RenderConfig, optional): The rendering settings. Defaults to RenderConfig().
+
+    Returns:
+        tuple[bytes, np.ndarray, int]: The raw samples, a (height, width) view over them and the resolution used.
+    """
+
+    clip = content_area(page) if config.clip_to_text else page.rect
+    dpi = choose_dpi(page, clip, config)
+
+    pix = page.get_pixmap(dpi=dpi, clip=clip, colorspace=fitz.csGRAY, alpha=False)
+    samples = pix.samples
+    gray = np.frombuffer(samples, dtype=np.uint8).reshape(pix.height, pix.stride)
+
+    return samples, gray[:, : pix.width], dpi
+
+
+def needs_ocr(page: fitz.Page, text: str) -> bool:
+    """
+    Decide whether a page has to be OCRed or its text layer can be used as is.
+
+    A page needs OCR when its text layer is (almost) empty, when it is mostly covered by
+    images with little text on top, or when the text layer is full of unknown glyphs
+    (fonts without a usable encoding).
+
+    Args:
+        page (fitz.Page): The page to check.
+        text (str): The text layer of the page.
+
+    Returns:
+        bool: True if the page has to be OCRed.
+    """
+
+    stripped = "".join(text.split())
+
+    if len(stripped) < MIN_TEXT_CHARS:
+
+        return True
+
+    if stripped.count("\ufffd") / len(stripped) > MAX_UNKNOWN_GLYPHS:
+
+        return True
+
+    page_area = abs(page.rect) or 1.0
+    image_area = sum(
+        abs(fitz.Rect(image["bbox"]) & page.rect) for image in page.get_image_info()
+    )
+    coverage = min(image_area / page_area, 1.0)
+
+    return coverage > MAX_IMAGE_COVERAGE and len(stripped) < MIN_TEXT_DENSITY * coverage
+
+
+def ocr_pages(
+    pdf_document: fitz.Document,
+    ln: str,
+    workers: int | None = None,
+    cache: DiskCache | None = None,
+    auto: bool = False,
+    preprocessing: PreprocessConfig = PreprocessConfig(),
+    rendering: RenderConfig = RenderConfig(),
+) -> Iterator[str]:
+    """
+    Apply OCR to the pages of a PDF on a pool of worker threads.
+
+    Pages are rendered one at a time in the calling thread, since PyMuPDF documents are
+    not thread-safe, while each worker waits on its own tesseract process. At most two
+    rendered pages per worker are kept in flight. With a cache, pages whose raster was
+    already recognized with the same languages and settings skip OCR altogether. In
+    auto mode, only the pages without a usable text layer are OCRed.
+
+    Args:
+        pdf_document (fitz.Document): The opened PDF.
+        ln (str): The tesseract languages, joined with "+".
+        workers (int | None, optional): The number of pages processed at once. Defaults to the number of CPUs.
+        cache (DiskCache | None, optional): The cache of recognized pages. Defaults to None.
+        auto (bool, optional): Whether to use the text layer of the pages that have one. Defaults to False.
+        preprocessing (PreprocessConfig, optional): The optional preprocessing steps. Defaults to none.
+        rendering (RenderConfig, optional): The rendering settings. Defaults to RenderConfig().
+
+    Yields:
+        str: The text of each page, in page order.
+    """
+
+    workers = workers or os.cpu_count() or 1
+
+    # The pool provides the parallelism, so every tesseract process uses a single core
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        pending = deque()
+
+        for page in pdf_document:
+
+            text = page.get_text() if auto else None
+
+            if text is not None and not needs_ocr(page, text):
+
+                pending.append((None, _done(text)))
+
+            else:
+
+                pending.append(
+                    _submit_page(executor, page, ln, cache, preprocessing, rendering)
+                )
+
+            if len(pending) >= 2 * workers:
+
+                yield _page_result(*pending.popleft(), cache)
+
+        while pending:
+
+            yield _page_result(*pending.popleft(), cache)
+
+
+def _submit_page(
+    executor: ThreadPoolExecutor,
+    page: fitz.Page,
+    ln: str,
+    cache: DiskCache | None,
+    preprocessing: PreprocessConfig,
+    rendering: RenderConfig,
+) -> tuple[str | None, Future]:
+    """
+    Render a page and submit it to the OCR pool, unless its text is already cached.
+
+    Args:
+        executor (ThreadPoolExecutor): The OCR pool.
+        page (fitz.Page): The page to recognize.
+        ln (str): The tesseract languages, joined with "+".
+        cache (DiskCache | None): The cache of recognized pages.
+        preprocessing (PreprocessConfig): The optional preprocessing steps.
+        rendering (RenderConfig): The rendering settings.
+
+    Returns:
+        tuple[str | None, Future]: The cache key to store the text under, and the future holding it.
+    """
+
+    samples, gray, dpi = render_page(page, rendering)
+
+    if cache is None:
+
+        key = None
+
+    else:
+
+        key = make_key(
+            hashlib.sha256(samples).hexdigest(),
+            gray.shape,
+            ln,
+            dpi,
+            asdict(preprocessing),
+        )
+        cached = cache.get(key)
+
+        if cached is not None:
+
+            return None, _done(cached.decode("utf-8"))
+
+    return key, executor.submit(ocr_image, gray, ln, preprocessing)
+
+
+def _done(text: str) -> Future:
+    """
+    Wrap an already known page text in a finished future.
+
+    Args:
+        text (str): The text of the page.
+
+    Returns:
+        Future: The finished future.
+    """
+
+    future = Future()
+    future.set_result(text)
+
+    return future
+
+
+def _page_result(key: str | None, future: Future, cache: DiskCache | None) -> str:
+    """
+    Wait for the text of a page, storing it in the cache if it was recognized now.
+
+    Args:
+        key (str | None): The cache key of the page, or None if it must not be stored.
+        future (Future): The future holding the text of the page.
+        cache (DiskCache | None): The cache of recognized pages.
+
+    Returns:
+        str: The text of the page.
+    """
+
+    text = future.result()
+
+    if cache is not None and key is not None:
+
+        cache.put(key, text.encode("utf-8"))
+
+    return text
+
+
+def extract_pages_pypdf2(pdf_reader: "PdfReader") -> Iterator[str]:
+    """
+    Extract the text of a PDF with PyPDF2, one page at a time.
+
+    Args:
+        pdf_reader (PdfReader): The opened PDF.
+
+    Yields:
+        str: The text of each page, in page order.
+    """
+
+    for page in pdf_reader.pages:
+
+        yield page.extract_text()
+
+
+def extract_pages_ctrl_a(pdf_document: fitz.Document) -> Iterator[str]:
+    """
+    Extract the text of a PDF by emulating Ctrl+A, one page at a time.
+
+    Args:
+        pdf_document (fitz.Document): The opened PDF.
+
+    Yields:
+        str: The text of each page, in page order.
+    """
+
+    for page in pdf_document:
+
+        yield page.get_text()
+
+
+def convert_text_to_markdown(text: str) -> str:
+    """
+    Convert plain text to Markdown format.
+
+    Args:
+        text (str): The plain text to convert.
+
+    Returns:
+        str: The converted Markdown text.
+    """
+
+    from markdownify import markdownify as md
+
+    markdown_text = md(text)
+    return markdown_text
+
+
+def write_markdown(pages: Iterable[str], output_file: str) -> Iterator[str]:
+    """
+    Convert the pages to Markdown and append them to the output file as they arrive.
+
+    Only one page is held in memory at a time, whatever the length of the document.
+
+    Args:
+        pages (Iterable[str]): The text of each page.
+        output_file (str): The path of the Markdown file.
+
+    Yields:
+        str: The text of each page, once it has been written.
+    """
+
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+
+    with open(output_file, "w", encoding="utf-8") as f:
+
+        for page_text in pages:
+
+            f.write(convert_text_to_markdown(page_text + "\n"))
+            yield page_text
+
+
+def plan_markdown_tree(
+    input_directory: str, output_directory: str
+) -> list[tuple[str, str]]:
+    """
+    List the PDFs of a directory tree with the Markdown file mirroring each of them.
+
+    Args:
+        input_directory (str): The directory with the PDFs.
+        output_directory (str): The directory where the mirrored tree will be written.
+
+    Returns:
+        list[tuple[str, str]]: The path of each PDF and of its Markdown file, sorted by path.
+    """
+
+    files = []
+
+    for root, dirs, names in os.walk(input_directory):
+
+        dirs.sort()
+        relative_path = os.path.relpath(root, input_directory)
+
+        for name in sorted(names):
+
+            if name.lower().endswith(".pdf"):
+
+                files.append(
+                    (
+                        os.path.join(root, name),
+                        os.path.join(
+                            output_directory,
+                            relative_path,
+                            os.path.splitext(name)[0] + ".md",
+                        ),
+                    )
+                )
+
+    return files
+
+
+def convert_pdf_to_markdown(
+    source: str | bytes,
+    output_file: str,
+    extraction_method: str = "Auto",
+    ln: str = "eng",
+    workers: int | None = None,
+    cache: DiskCache | None = None,
+    preprocessing: PreprocessConfig = PreprocessConfig(),
+    rendering: RenderConfig = RenderConfig(),
+) -> int:
+    """
+    Convert a whole PDF to a Markdown file, streaming the pages to disk.
+
+    Args:
+        source (str | bytes): The path to the PDF, or its contents.
+        output_file (str): The path of the Markdown file.
+        extraction_method (str, optional): One of "Auto", "OCR", "PyPDF2" or "Ctrl+A". Defaults to "Auto".
+        ln (str, optional): The tesseract languages, joined with "+". Defaults to "eng".
+        workers (int | None, optional): The number of pages processed at once. Defaults to the number of CPUs.
+        cache (DiskCache | None, optional): The cache of recognized pages. Defaults to None.
+        preprocessing (PreprocessConfig, optional): The optional preprocessing steps. Defaults to none.
+        rendering (RenderConfig, optional): The rendering settings. Defaults to RenderConfig().
+
+    Returns:
+        int: The number of converted pages.
+    """
+
+    if extraction_method not in ("Auto", "OCR", "PyPDF2", "Ctrl+A"):
+
+        raise ValueError(f"Unknown extraction method: {extraction_method}")
+
+    if extraction_method == "PyPDF2":
+
+        from PyPDF2 import PdfReader
+
+        pages = extract_pages_pypdf2(
+            PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+        )
+        return sum(1 for _ in write_markdown(pages, output_file))
+
+    if isinstance(source, bytes):
+
+        pdf_document = fitz.open(stream=source, filetype="pdf")
+
+    else:
+
+        pdf_document = fitz.open(source)
+
+    with pdf_document:
+
+        if extraction_method == "Ctrl+A":
+
+            pages = extract_pages_ctrl_a(pdf_document)
+
+        else:
+
+            pages = ocr_pages(
+                pdf_document,
+                ln,
+                workers,
+                cache,
+                extraction_method == "Auto",
+                preprocessing,
+                rendering,
+            )
+
+        return sum(1 for _ in write_markdown(pages, output_file))
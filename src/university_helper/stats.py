@@ -0,0 +1,51 @@
+import pandas as pd
+
+
+def load_data(data_path: str) -> pd.DataFrame:
+    """
+    Load a CSV file and convert the 'Date' column to datetime.
+
+    Args:
+        data_path (str): The path to the CSV file.
+
+    Returns:
+        pd.DataFrame: The loaded data
+    """
+
+    data = pd.read_csv(data_path)
+    data["Date"] = pd.to_datetime(data["Date"])
+
+    return data
+
+
+def subject_year_means(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calculate the average score of each subject per year.
+
+    Args:
+        data (pd.DataFrame): The data to calculate the averages from
+
+    Returns:
+        pd.DataFrame: One row per subject and one column per year
+    """
+
+    # Extract the year from the date column
+    data["Year"] = data["Date"].dt.year
+
+    # Group the data by subject and year, and calculate the mean score
+    return data.groupby(["Subject", "Year"])["Score"].mean().unstack().reset_index()
+
+
+def top_subjects(data: pd.DataFrame, top: int = 3) -> pd.DataFrame:
+    """
+    Calculate the subjects with the highest average score.
+
+    Args:
+        data (pd.DataFrame): The data to calculate the averages from
+        top (int, optional): The number of subjects to return. Defaults to 3.
+
+    Returns:
+        pd.DataFrame: The top subjects with their average score
+    """
+
+    return data.groupby("Subject")["Score"].mean().nlargest(top).reset_index()
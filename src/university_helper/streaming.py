@@ -0,0 +1,461 @@
+import queue
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from university_helper.audio import SAMPLE_RATE, Resampler
+from university_helper.model_registry import ModelRegistry
+from university_helper.transcription import frame_energy, transcribe
+
+# Seconds of new audio after which the window is transcribed again
+STEP_SECONDS = 1.0
+
+# Longest audio kept in the window, below the 30 seconds Whisper decodes at once;
+# past it, the pending words are committed so the window can be trimmed
+WINDOW_SECONDS = 20.0
+
+# Committed text passed to Whisper as the context of the next window
+PROMPT_CHARS = 200
+
+# Longest subtitle-like segment built from the committed words, in seconds
+SEGMENT_SECONDS = 10.0
+
+# Loudness below which a window is considered silent and not transcribed, in dBFS,
+# since Whisper tends to invent text for silence
+SILENCE_DBFS = -50.0
+
+
+@dataclass
+class Word:
+    """
+    A transcribed word, with its times from the start of the stream.
+
+    Attributes:
+        text (str): The word, with its leading space.
+        start (float): When the word starts, in seconds.
+        end (float): When the word ends, in seconds.
+    """
+
+    text: str
+    start: float
+    end: float
+
+
+def _normalize(word: Word) -> str:
+    """
+    Reduce a word to the form compared between two transcriptions of a window.
+
+    Args:
+        word (Word): The word.
+
+    Returns:
+        str: The lowercase word without punctuation.
+    """
+
+    return re.sub(r"[^\w']", "", word.text.lower())
+
+
+class StreamingTranscriber:
+    """
+    Transcribe a stream of audio incrementally, in rolling windows.
+
+    The audio not yet committed is transcribed again every STEP_SECONDS, so new
+    speech appears as partial text within about a step plus the decoding time. The
+    words on which two consecutive transcriptions of the window agree are committed
+    and never change again; the window is then trimmed at the end of the last
+    committed word, and the committed text is passed to Whisper as context.
+    """
+
+    def __init__(
+        self,
+        registry: ModelRegistry,
+        model_option: str,
+        backend: str = "whisper",
+        step_seconds: float = STEP_SECONDS,
+        window_seconds: float = WINDOW_SECONDS,
+        **options,
+    ) -> None:
+        """
+        Create a transcriber with an empty stream.
+
+        Args:
+            registry (ModelRegistry): The registry the model is borrowed from for each window.
+            model_option (str): The name of the Whisper model.
+            backend (str, optional): The inference backend running the model. Defaults to "whisper".
+            step_seconds (float, optional): The new audio after which the window is transcribed. Defaults to STEP_SECONDS.
+            window_seconds (float, optional): The longest audio kept in the window. Defaults to WINDOW_SECONDS.
+            **options: Extra decoding options passed to Whisper (e.g. language).
+        """
+
+        self.registry = registry
+        self.model_option = model_option
+        self.backend = backend
+        self.step = int(step_seconds * SAMPLE_RATE)
+        self.window = int(window_seconds * SAMPLE_RATE)
+        self.options = options
+
+        self.buffer = np.empty(0, np.float32)
+        self.offset = 0
+        self.new = 0
+        self.committed: list[Word] = []
+        self.pending: list[Word] = []
+        self.latencies: list[float] = []
+
+    def feed(self, audio: np.ndarray) -> bool:
+        """
+        Append audio to the stream, transcribing the window once a step is complete.
+
+        Args:
+            audio (np.ndarray): The next 16 kHz float32 samples.
+
+        Returns:
+            bool: Whether the window was transcribed.
+        """
+
+        self.buffer = np.concatenate((self.buffer, audio))
+        self.new += len(audio)
+
+        if self.new < self.step:
+
+            return False
+
+        self.new = 0
+        self._transcribe_window()
+
+        return True
+
+    def _transcribe_window(self) -> None:
+        """
+        Transcribe the window, committing the words confirmed by the previous pass.
+        """
+
+        if len(self.buffer) == 0:
+
+            return
+
+        energy = frame_energy(self.buffer)
+
+        # A silent window only ends the pending words, which will not change anymore
+        if len(energy) and energy.max() < SILENCE_DBFS:
+
+            self._commit(len(self.pending))
+            self._trim(len(self.buffer))
+
+            return
+
+        start = time.perf_counter()
+
+        with self.registry.use(self.model_option, self.backend) as model:
+
+            result = transcribe(
+                model,
+                self.buffer,
+                word_timestamps=True,
+                temperature=0.0,
+                initial_prompt=self.text()[-PROMPT_CHARS:] or None,
+                **self.options,
+            )
+
+        self.latencies.append(time.perf_counter() - start)
+
+        # Words from the trimmed part that Whisper repeats are dropped
+        offset = self.offset / SAMPLE_RATE
+        committed_end = self.committed[-1].end if self.committed else 0.0
+        words = [
+            Word(word["word"], offset + word["start"], offset + word["end"])
+            for segment in result["segments"]
+            for word in segment.get("words", [])
+            if offset + word["end"] > committed_end + 0.05
+        ]
+
+        agreed = 0
+
+        for word, previous in zip(words, self.pending):
+
+            if _normalize(word) != _normalize(previous):
+
+                break
+
+            agreed += 1
+
+        self.pending = words
+        self._commit(agreed)
+
+        # A full window is cut even without agreement, or it could not grow anymore
+        if len(self.buffer) >= self.window:
+
+            self._commit(len(self.pending))
+
+        if self.committed:
+
+            self._trim(int(self.committed[-1].end * SAMPLE_RATE) - self.offset)
+
+    def _commit(self, count: int) -> None:
+        """
+        Commit the first pending words.
+
+        Args:
+            count (int): The number of words to commit.
+        """
+
+        self.committed.extend(self.pending[:count])
+        self.pending = self.pending[count:]
+
+    def _trim(self, samples: int) -> None:
+        """
+        Drop the start of the window, once its words are committed.
+
+        Args:
+            samples (int): The number of samples to drop.
+        """
+
+        samples = min(max(0, samples), len(self.buffer))
+        self.buffer = self.buffer[samples:]
+        self.offset += samples
+
+    def finish(self) -> str:
+        """
+        Transcribe the rest of the stream and commit every word.
+
+        Returns:
+            str: The complete transcript.
+        """
+
+        self._transcribe_window()
+        self._commit(len(self.pending))
+        self._trim(len(self.buffer))
+
+        return self.text()
+
+    def text(self) -> str:
+        """
+        Get the committed text, which does not change anymore.
+
+        Returns:
+            str: The committed text.
+        """
+
+        return "".join(word.text for word in self.committed).strip()
+
+    def result(self) -> dict:
+        """
+        Get the committed words as a Whisper result, split into segments.
+
+        A segment ends with a sentence, or once it is SEGMENT_SECONDS long.
+
+        Returns:
+            dict: The result in the format of Whisper, with "text", "segments" and "language".
+        """
+
+        segments = []
+        words: list[Word] = []
+
+        for word in self.committed:
+
+            words.append(word)
+
+            if (
+                word.text.rstrip().endswith((".", "?", "!"))
+                or word.end - words[0].start >= SEGMENT_SECONDS
+                or word is self.committed[-1]
+            ):
+
+                segments.append(
+                    {
+                        "id": len(segments),
+                        "start": words[0].start,
+                        "end": words[-1].end,
+                        "text": "".join(word.text for word in words),
+                        "words": [
+                            {"word": word.text, "start": word.start, "end": word.end}
+                            for word in words
+                        ],
+                    }
+                )
+                words = []
+
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": self.options.get("language"),
+        }
+
+    def partial_text(self) -> str:
+        """
+        Get the pending text, which may still change with the next window.
+
+        Returns:
+            str: The pending text.
+        """
+
+        return "".join(word.text for word in self.pending).strip()
+
+
+def live_input_available() -> bool:
+    """
+    Check whether the machine running the app can record, for the live mode.
+
+    The live mode records with `sounddevice` on the server, not in the browser, so it
+    needs the package, the PortAudio library and an input device on that machine.
+
+    Returns:
+        bool: Whether a default input device can be opened.
+    """
+
+    try:
+
+        import sounddevice
+
+    # Raised as OSError when the PortAudio library is missing
+    except (ImportError, OSError):
+
+        return False
+
+    try:
+
+        sounddevice.query_devices(kind="input")
+
+    except (sounddevice.PortAudioError, ValueError):
+
+        return False
+
+    return True
+
+
+class LiveTranscription:
+    """
+    Record the microphone of the machine running the app and transcribe it live.
+
+    A capture callback queues the recorded blocks and a background thread resamples
+    them and feeds them to a StreamingTranscriber, so the page only has to poll the
+    text and the latency.
+    """
+
+    def __init__(self, transcriber: StreamingTranscriber) -> None:
+        """
+        Start recording and transcribing.
+
+        Args:
+            transcriber (StreamingTranscriber): The transcriber fed with the recording.
+        """
+
+        # Imported here, since it is only needed by the live mode
+        try:
+
+            import sounddevice
+
+        except ImportError as e:
+
+            raise ImportError(
+                "Live transcription requires `poetry install --extras live`"
+            ) from e
+
+        self.transcriber = transcriber
+        self.blocks: queue.Queue[np.ndarray | None] = queue.Queue()
+        self.error: BaseException | None = None
+        self.stream_lock = threading.Lock()
+
+        rate = int(sounddevice.query_devices(kind="input")["default_samplerate"])
+        self.resampler = Resampler(rate)
+        self.stream = sounddevice.InputStream(
+            samplerate=rate,
+            channels=1,
+            dtype="float32",
+            callback=lambda data, *_: self.blocks.put(data[:, 0].copy()),
+        )
+        self.thread = threading.Thread(
+            target=self._run, name="live-transcription", daemon=True
+        )
+        self.thread.start()
+        self.stream.start()
+
+    def _run(self) -> None:
+        """
+        Feed the recorded blocks to the transcriber until the recording stops.
+        """
+
+        try:
+
+            while (block := self.blocks.get()) is not None:
+
+                audio = [self.resampler.process(block)]
+
+                # Blocks recorded while the last window was transcribed are fed at
+                # once, so a slow model skips steps instead of falling behind
+                while not self.blocks.empty():
+
+                    block = self.blocks.get()
+
+                    if block is None:
+
+                        self.blocks.put(None)
+                        break
+
+                    audio.append(self.resampler.process(block))
+
+                self.transcriber.feed(np.concatenate(audio))
+
+            # The end of the recording, held back by the resampler until now
+            self.transcriber.feed(self.resampler.flush())
+            self.transcriber.finish()
+
+        except BaseException as e:
+
+            self.error = e
+
+            # Nothing reads the queue anymore, so the recording would fill it until
+            # the user stops it
+            self._close_stream()
+
+    def _close_stream(self) -> None:
+        """
+        Stop recording, if it has not been stopped yet.
+        """
+
+        with self.stream_lock:
+
+            if not self.stream.closed:
+
+                self.stream.stop()
+                self.stream.close()
+
+    def stop(self) -> dict:
+        """
+        Stop recording and wait for the rest of the recording to be transcribed.
+
+        Returns:
+            dict: The complete transcript as a Whisper result, from `StreamingTranscriber.result`.
+        """
+
+        self._close_stream()
+        self.blocks.put(None)
+        self.thread.join()
+
+        if self.error is not None:
+
+            raise self.error
+
+        return self.transcriber.result()
+
+    def status(self) -> dict:
+        """
+        Get the text transcribed so far and the latency of the windows, for display.
+
+        Returns:
+            dict: The committed and partial text, the number of windows, and the last and mean seconds spent transcribing a window.
+        """
+
+        # Read without a lock, so polling never waits for a window to be transcribed
+        latencies = list(self.transcriber.latencies)
+
+        return {
+            "text": self.transcriber.text(),
+            "partial": self.transcriber.partial_text(),
+            "windows": len(latencies),
+            "latency": latencies[-1] if latencies else 0.0,
+            "mean_latency": float(np.mean(latencies)) if latencies else 0.0,
+            "error": self.error,
+        }
@@ -0,0 +1,214 @@
+import json
+import os
+from typing import Callable, Iterator
+
+from university_helper.transcription import compact_result
+
+# Longest paragraph of the timestamped Markdown, and the pause that starts a new one,
+# in seconds
+PARAGRAPH_SECONDS = 60.0
+PARAGRAPH_PAUSE = 2.0
+
+
+def format_timestamp(seconds: float, separator: str = ".", hours: bool = True) -> str:
+    """
+    Format a time as used by subtitles and timestamped notes.
+
+    Args:
+        seconds (float): The time from the start of the recording.
+        separator (str, optional): The separator of the milliseconds, "," for SRT. Defaults to ".".
+        hours (bool, optional): Whether to include the hours. Defaults to True.
+
+    Returns:
+        str: The time as HH:MM:SS.mmm, or HH:MM:SS (or MM:SS) without a separator.
+    """
+
+    milliseconds = round(max(0.0, seconds) * 1000)
+    hour, milliseconds = divmod(milliseconds, 3_600_000)
+    minute, milliseconds = divmod(milliseconds, 60_000)
+    second, milliseconds = divmod(milliseconds, 1000)
+    timestamp = (
+        f"{hour:02d}:{minute:02d}:{second:02d}"
+        if hours
+        else f"{minute:02d}:{second:02d}"
+    )
+
+    return f"{timestamp}{separator}{milliseconds:03d}" if separator else timestamp
+
+
+def iter_text(result: dict) -> Iterator[str]:
+    """
+    Write a transcript as plain Markdown, one segment at a time.
+
+    Args:
+        result (dict): The Whisper result.
+
+    Yields:
+        str: The pieces of the file.
+    """
+
+    for segment in result["segments"]:
+
+        yield segment["text"]
+
+
+def iter_timestamped_markdown(result: dict) -> Iterator[str]:
+    """
+    Write a transcript as Markdown paragraphs, each starting with its timestamp.
+
+    A paragraph ends at a pause or once it is PARAGRAPH_SECONDS long, so the notes
+    can be followed along the recording.
+
+    Args:
+        result (dict): The Whisper result.
+
+    Yields:
+        str: The pieces of the file.
+    """
+
+    paragraph_start = previous_end = None
+    hours = bool(result["segments"]) and result["segments"][-1]["end"] >= 3600
+
+    for segment in result["segments"]:
+
+        if (
+            paragraph_start is None
+            or segment["start"] - previous_end >= PARAGRAPH_PAUSE
+            or segment["end"] - paragraph_start > PARAGRAPH_SECONDS
+        ):
+
+            prefix = "" if paragraph_start is None else "\n\n"
+            paragraph_start = segment["start"]
+            yield f"{prefix}**[{format_timestamp(paragraph_start, '', hours)}]** "
+            yield segment["text"].strip()
+
+        else:
+
+            yield segment["text"]
+
+        previous_end = segment["end"]
+
+    yield "\n"
+
+
+def iter_srt(result: dict) -> Iterator[str]:
+    """
+    Write a transcript as SRT subtitles.
+
+    Args:
+        result (dict): The Whisper result.
+
+    Yields:
+        str: The pieces of the file.
+    """
+
+    for index, segment in enumerate(result["segments"], 1):
+
+        yield (
+            f"{index}\n"
+            f"{format_timestamp(segment['start'], ',')} --> "
+            f"{format_timestamp(segment['end'], ',')}\n"
+            f"{segment['text'].strip()}\n\n"
+        )
+
+
+def iter_vtt(result: dict) -> Iterator[str]:
+    """
+    Write a transcript as WebVTT subtitles.
+
+    Args:
+        result (dict): The Whisper result.
+
+    Yields:
+        str: The pieces of the file.
+    """
+
+    yield "WEBVTT\n\n"
+
+    for segment in result["segments"]:
+
+        yield (
+            f"{format_timestamp(segment['start'])} --> "
+            f"{format_timestamp(segment['end'])}\n"
+            f"{segment['text'].strip()}\n\n"
+        )
+
+
+def iter_json(result: dict) -> Iterator[str]:
+    """
+    Write a transcript as JSON, with its language, text and segments.
+
+    The result is compacted with `compact_result`, and its segments are serialized
+    one at a time, so the whole document is never held as a single string.
+
+    Args:
+        result (dict): The Whisper result.
+
+    Yields:
+        str: The pieces of the file.
+    """
+
+    result = compact_result(result)
+
+    yield '{"language": ' + json.dumps(result.get("language"))
+    yield ', "text": ' + json.dumps(result["text"], ensure_ascii=False)
+    yield ', "segments": ['
+
+    for index, segment in enumerate(result["segments"]):
+
+        yield (", " if index else "") + json.dumps(
+            segment, ensure_ascii=False, default=float
+        )
+
+    yield "]}\n"
+
+
+# Export formats, with their file extension and writer
+EXPORT_FORMATS: dict[str, tuple[str, Callable[[dict], Iterator[str]]]] = {
+    "Markdown": (".md", iter_text),
+    "Markdown with timestamps": (".md", iter_timestamped_markdown),
+    "SRT": (".srt", iter_srt),
+    "VTT": (".vtt", iter_vtt),
+    "JSON": (".json", iter_json),
+}
+
+
+def export_path(filename: str, export_format: str) -> str:
+    """
+    Replace the extension of a path with the one of an export format.
+
+    Args:
+        filename (str): The path to the output file.
+        export_format (str): One of EXPORT_FORMATS.
+
+    Returns:
+        str: The path with the extension of the format.
+    """
+
+    return os.path.splitext(filename)[0] + EXPORT_FORMATS[export_format][0]
+
+
+def export_transcript(result: dict, filename: str, export_format: str) -> None:
+    """
+    Save a transcript in one of the export formats, streaming it to disk.
+
+    Every format is derived from the segments of the same result, so no export
+    transcribes the audio again.
+
+    Args:
+        result (dict): The Whisper result, with its segments.
+        filename (str): The path to the output file.
+        export_format (str): One of EXPORT_FORMATS.
+    """
+
+    if export_format not in EXPORT_FORMATS:
+
+        raise ValueError(
+            f"Unknown format {export_format!r}, expected one of {list(EXPORT_FORMATS)}"
+        )
+
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+
+    with open(filename, "w", encoding="utf-8") as f:
+
+        f.writelines(EXPORT_FORMATS[export_format][1](result))
@@ -0,0 +1,730 @@
+import hashlib
+import importlib.metadata
+import json
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterator
+
+import numpy as np
+
+from university_helper.audio import SAMPLE_RATE, decode_audio
+from university_helper.cache import CACHE_DIR, DiskCache, make_key
+
+if TYPE_CHECKING:
+
+    import whisper
+
+# Length of the frames whose energy is measured to find silences, in seconds
+VAD_FRAME_SECONDS = 0.03
+
+# Length of the moving average smoothing the frame energies, in seconds
+VAD_SMOOTH_SECONDS = 0.5
+
+# Frames quieter than the loud speech of the recording by this many dB are silence
+VAD_SILENCE_DB = 35.0
+
+# Default length of the chunks of the long-form mode, and the margins around them
+CHUNK_SECONDS = 240.0
+OVERLAP_SECONDS = 2.0
+
+# Inference engines able to run the Whisper models:
+#   whisper: the reference PyTorch implementation
+#   whisper-int8: the reference model with its linear layers quantized to int8
+#   faster-whisper: the CTranslate2 int8 runtime, from the optional faster-whisper package
+BACKENDS = ("whisper", "whisper-int8", "faster-whisper")
+
+# Maximum size of the persistent transcript cache
+TRANSCRIPT_CACHE_BYTES = 512 * 1024 * 1024
+
+# Model loaded once by each worker process of the long-form mode
+_worker_model = None
+
+
+@dataclass
+class Chunk:
+    """
+    A piece of a long recording transcribed on its own.
+
+    The chunk covers `[start, end)` of the waveform, which includes a margin on each
+    side of the part it is responsible for, `[keep_start, keep_end)`. Each word is
+    kept by the chunk whose own part contains its midpoint, so a sentence crossing a
+    cut is split between the chunks without losing or repeating words. Segments
+    without word times are kept whole by the chunk containing their midpoint.
+
+    Attributes:
+        index (int): The position of the chunk in the recording.
+        start (int): The first sample transcribed.
+        end (int): The sample after the last one transcribed.
+        keep_start (int): The first sample of the part the chunk is responsible for.
+        keep_end (int): The sample after the part the chunk is responsible for.
+        speech (bool): Whether the chunk contains any frame louder than silence.
+    """
+
+    index: int
+    start: int
+    end: int
+    keep_start: int
+    keep_end: int
+    speech: bool = True
+
+
+class FasterWhisperModel:
+    """
+    Adapter giving a faster-whisper model the `transcribe` interface of Whisper.
+
+    The segments are decoded eagerly and converted to the dictionaries returned by
+    Whisper, so the rest of the application does not depend on the backend.
+    """
+
+    def __init__(self, model_option: str, threads: int = 0) -> None:
+        """
+        Load the CTranslate2 conversion of a Whisper model, quantized to int8.
+
+        Args:
+            model_option (str): The name of the Whisper model to load.
+            threads (int, optional): The number of CPU threads, or 0 for the default. Defaults to 0.
+        """
+
+        try:
+
+            from faster_whisper import WhisperModel
+
+        except ImportError as e:
+
+            raise ImportError(
+                "The faster-whisper backend requires `pip install faster-whisper`"
+            ) from e
+
+        self.model = WhisperModel(
+            model_option, device="cpu", compute_type="int8", cpu_threads=threads
+        )
+
+    def transcribe(
+        self, audio: str | np.ndarray, fp16: bool = False, **options
+    ) -> dict:
+        """
+        Transcribe an audio file or waveform.
+
+        Args:
+            audio (str | np.ndarray): The path to the audio file, or a 16 kHz float32 waveform.
+            fp16 (bool, optional): Ignored, the model always runs in int8. Defaults to False.
+            **options: Decoding options shared with Whisper (e.g. language, word_timestamps).
+
+        Returns:
+            dict: The result in the format of Whisper, with "text", "segments" and "language".
+        """
+
+        segments, info = self.model.transcribe(audio, **options)
+        result = []
+
+        for segment in segments:
+
+            converted = {
+                "id": len(result),
+                "seek": segment.seek,
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text,
+                "tokens": list(segment.tokens),
+                "temperature": segment.temperature,
+                "avg_logprob": segment.avg_logprob,
+                "compression_ratio": segment.compression_ratio,
+                "no_speech_prob": segment.no_speech_prob,
+            }
+
+            if segment.words:
+
+                converted["words"] = [
+                    {
+                        "word": word.word,
+                        "start": word.start,
+                        "end": word.end,
+                        "probability": word.probability,
+                    }
+                    for word in segment.words
+                ]
+
+            result.append(converted)
+
+        return {
+            "text": "".join(segment["text"] for segment in result),
+            "segments": result,
+            "language": info.language,
+        }
+
+
+def load_whisper_model(
+    model_option: str, backend: str = "whisper", threads: int = 0
+) -> "whisper.Whisper | FasterWhisperModel":
+    """
+    Load the Whisper model on the given inference backend.
+
+    Args:
+        model_option (str): The name of the Whisper model to load.
+        backend (str, optional): One of BACKENDS. Defaults to "whisper".
+        threads (int, optional): The number of CPU threads, or 0 for the default. Defaults to 0.
+
+    Returns:
+        whisper.Whisper | FasterWhisperModel: The loaded model, with the `transcribe` method of Whisper.
+    """
+
+    if backend not in BACKENDS:
+
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+
+    if backend == "faster-whisper":
+
+        return FasterWhisperModel(model_option, threads)
+
+    # Imported here, since loading torch takes seconds
+    import torch
+    import whisper
+
+    if threads:
+
+        torch.set_num_threads(threads)
+
+    model = whisper.load_model(model_option, device="cpu", in_memory=True)
+
+    if backend == "whisper-int8":
+
+        # Whisper subclasses the linear layer to cast its weights, which dynamic
+        # quantization does not recognize, so they are turned back into plain ones
+        for module in model.modules():
+
+            if isinstance(module, torch.nn.Linear):
+
+                module.__class__ = torch.nn.Linear
+
+        model = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+    return model
+
+
+def transcribe(
+    model: "whisper.Whisper | FasterWhisperModel", audio: str | np.ndarray, **options
+) -> dict:
+    """
+    Transcribe an audio file or waveform using the Whisper model.
+
+    Args:
+        model (whisper.Whisper | FasterWhisperModel): The model to use for transcription.
+        audio (str | np.ndarray): The path to the audio file, or a 16 kHz float32 waveform.
+        **options: Extra decoding options passed to Whisper (e.g. language).
+
+    Returns:
+        dict: The Whisper result, with the full "text" and its "segments".
+    """
+
+    # Files are decoded here rather than by the backend, in blocks and without a
+    # complete PCM copy; every backend runs on the CPU, where fp16 is not supported
+    return model.transcribe(load_audio(audio), fp16=False, **options)
+
+
+def open_transcript_cache(max_bytes: int = TRANSCRIPT_CACHE_BYTES) -> DiskCache:
+    """
+    Open the persistent transcript cache, invalidated whenever Whisper is upgraded.
+
+    Args:
+        max_bytes (int, optional): The maximum size of the cache. Defaults to 512 MiB.
+
+    Returns:
+        DiskCache: The transcript cache.
+    """
+
+    try:
+
+        version = importlib.metadata.version("openai-whisper")
+
+    except importlib.metadata.PackageNotFoundError:
+
+        version = ""
+
+    return DiskCache(os.path.join(CACHE_DIR, "transcripts"), max_bytes, version)
+
+
+def audio_fingerprint(audio: str | np.ndarray, block_size: int = 1 << 20) -> str:
+    """
+    Identify a recording by the hash of its contents, whatever its name or location.
+
+    Args:
+        audio (str | np.ndarray): The path to the audio file, or a waveform.
+        block_size (int, optional): The size of the blocks read from the file. Defaults to 1 MiB.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of the file or of the waveform samples.
+    """
+
+    digest = hashlib.sha256()
+
+    if isinstance(audio, np.ndarray):
+
+        digest.update(np.ascontiguousarray(audio, dtype=np.float32).data)
+
+        return digest.hexdigest()
+
+    with open(audio, "rb") as f:
+
+        while block := f.read(block_size):
+
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def transcript_key(
+    source: str, model_option: str, backend: str = "whisper", **options
+) -> str:
+    """
+    Build the cache key of a transcript.
+
+    Args:
+        source (str): The fingerprint of the audio, or another stable identifier such as a video ID.
+        model_option (str): The name of the Whisper model.
+        backend (str, optional): The inference backend running the model. Defaults to "whisper".
+        **options: The decoding options changing the result (e.g. language).
+
+    Returns:
+        str: The cache key.
+    """
+
+    return make_key("transcript", source, model_option, backend, options)
+
+
+def get_cached_transcript(cache: DiskCache, key: str) -> dict | None:
+    """
+    Get a transcript from the cache.
+
+    Args:
+        cache (DiskCache): The transcript cache.
+        key (str): The key from `transcript_key`.
+
+    Returns:
+        dict | None: The Whisper result with its segments, or None if it is not cached.
+    """
+
+    cached = cache.get(key)
+
+    return None if cached is None else json.loads(cached)
+
+
+def compact_result(result: dict) -> dict:
+    """
+    Keep only the parts of a Whisper result used by the transcript and its exports.
+
+    The tokens and decoding statistics of each segment take most of the size of a
+    result and are never used after decoding.
+
+    Args:
+        result (dict): The Whisper result.
+
+    Returns:
+        dict: The result with "text", "language" and the times, text and words of each segment.
+    """
+
+    return {
+        "text": result["text"],
+        "language": result.get("language"),
+        "segments": [
+            {
+                key: segment[key]
+                for key in ("id", "start", "end", "text", "words")
+                if key in segment
+            }
+            for segment in result["segments"]
+        ],
+    }
+
+
+def put_cached_transcript(cache: DiskCache, key: str, result: dict) -> None:
+    """
+    Store a transcript in the cache, compacted with `compact_result`.
+
+    Args:
+        cache (DiskCache): The transcript cache.
+        key (str): The key from `transcript_key`.
+        result (dict): The Whisper result with its segments.
+    """
+
+    # Numpy scalars, which some backends leave in the segments, are stored as floats
+    cache.put(key, json.dumps(compact_result(result), default=float).encode("utf-8"))
+
+
+def load_audio(audio: str | np.ndarray) -> np.ndarray:
+    """
+    Decode an audio file to the waveform expected by Whisper.
+
+    Args:
+        audio (str | np.ndarray): The path to the audio file, or an already decoded waveform.
+
+    Returns:
+        np.ndarray: The 16 kHz mono float32 waveform.
+    """
+
+    if isinstance(audio, np.ndarray):
+
+        return audio.astype(np.float32, copy=False)
+
+    return decode_audio(audio)
+
+
+def frame_energy(audio: np.ndarray) -> np.ndarray:
+    """
+    Measure the smoothed energy of the recording frame by frame.
+
+    Args:
+        audio (np.ndarray): The 16 kHz waveform.
+
+    Returns:
+        np.ndarray: The energy of each frame in dB.
+    """
+
+    frame = int(VAD_FRAME_SECONDS * SAMPLE_RATE)
+    frames = audio[: len(audio) // frame * frame].reshape(-1, frame)
+
+    if len(frames) == 0:
+
+        return np.empty(0)
+
+    power = np.mean(np.square(frames, dtype=np.float64), axis=1)
+    width = max(1, round(VAD_SMOOTH_SECONDS / VAD_FRAME_SECONDS))
+    power = np.convolve(power, np.ones(width) / width, mode="same")
+
+    return 10 * np.log10(power + 1e-10)
+
+
+def plan_chunks(
+    audio: np.ndarray,
+    chunk_seconds: float = CHUNK_SECONDS,
+    overlap_seconds: float = OVERLAP_SECONDS,
+) -> list[Chunk]:
+    """
+    Split a recording into chunks, cutting at the quietest moment near each boundary.
+
+    A simple energy-based voice activity detector marks as silence the frames much
+    quieter than the loud speech of the recording. Each cut is placed at the quietest
+    frame of the last fifth of its chunk, which falls on a pause between sentences
+    for lectures and talks, and chunks without any speech are marked to be skipped.
+
+    Args:
+        audio (np.ndarray): The 16 kHz waveform.
+        chunk_seconds (float, optional): The target length of the chunks. Defaults to CHUNK_SECONDS.
+        overlap_seconds (float, optional): The margin transcribed on each side of a cut. Defaults to OVERLAP_SECONDS.
+
+    Returns:
+        list[Chunk]: The chunks covering the whole recording, in order.
+    """
+
+    frame = int(VAD_FRAME_SECONDS * SAMPLE_RATE)
+    chunk_frames = max(1, int(chunk_seconds / VAD_FRAME_SECONDS))
+    overlap = int(overlap_seconds * SAMPLE_RATE)
+    energy = frame_energy(audio)
+
+    if len(energy) == 0:
+
+        return [Chunk(0, 0, len(audio), 0, len(audio))]
+
+    speech = energy > np.percentile(energy, 95) - VAD_SILENCE_DB
+    cuts = [0]
+
+    while len(energy) - cuts[-1] > chunk_frames:
+
+        window_start = cuts[-1] + max(1, chunk_frames * 4 // 5)
+        window_end = cuts[-1] + chunk_frames
+        cuts.append(window_start + int(np.argmin(energy[window_start:window_end])))
+
+    cuts.append(len(energy))
+    chunks = []
+
+    for index, (first, last) in enumerate(zip(cuts, cuts[1:])):
+
+        keep_start = first * frame
+        keep_end = len(audio) if last == len(energy) else last * frame
+        chunks.append(
+            Chunk(
+                index,
+                max(0, keep_start - overlap),
+                min(len(audio), keep_end + overlap),
+                keep_start,
+                keep_end,
+                bool(speech[first:last].any()),
+            )
+        )
+
+    return chunks
+
+
+def _init_worker(model_option: str, backend: str, threads: int) -> None:
+    """
+    Load the model of a worker process of a transcription pool.
+
+    Args:
+        model_option (str): The name of the Whisper model to load.
+        backend (str): The inference backend running the model.
+        threads (int): The number of CPU threads the model may use in this process.
+    """
+
+    global _worker_model
+
+    _worker_model = load_whisper_model(model_option, backend, threads)
+
+
+def _transcribe_chunk(audio: np.ndarray, options: dict) -> dict:
+    """
+    Transcribe a chunk with the model of the worker process.
+
+    Args:
+        audio (np.ndarray): The waveform of the chunk.
+        options (dict): Extra decoding options passed to Whisper.
+
+    Returns:
+        dict: The language and segments of the chunk, with times relative to its start.
+    """
+
+    # Word times let the margins around the cuts be trimmed word by word
+    result = transcribe(_worker_model, audio, **{"word_timestamps": True, **options})
+
+    return {"language": result["language"], "segments": result["segments"]}
+
+
+def _transcribe_path(path: str, options: dict) -> dict:
+    """
+    Transcribe a whole file with the model of the worker process.
+
+    The file is decoded by the worker, so only its path is sent to the pool.
+
+    Args:
+        path (str): The path to the audio file.
+        options (dict): Extra decoding options passed to Whisper.
+
+    Returns:
+        dict: The Whisper result.
+    """
+
+    return transcribe(_worker_model, path, **options)
+
+
+def transcription_workers(
+    model_option: str, backend: str = "whisper", workers: int | None = None
+) -> int:
+    """
+    Choose the number of worker processes of a transcription pool.
+
+    Each worker loads its own copy of the model, outside of the model registry, so
+    the number is capped by the CPUs and by the copies that fit in the memory budget.
+
+    Args:
+        model_option (str): The name of the Whisper model each worker loads.
+        backend (str, optional): The inference backend running the model. Defaults to "whisper".
+        workers (int | None, optional): The number of worker processes requested. Defaults to 2.
+
+    Returns:
+        int: The number of worker processes, at least 1.
+    """
+
+    # Imported here, since the model registry imports this module
+    from university_helper.model_registry import max_model_copies
+
+    return max(
+        1,
+        min(
+            workers or 2,
+            os.cpu_count() or 1,
+            max_model_copies(model_option, backend),
+        ),
+    )
+
+
+def start_transcription_pool(
+    model_option: str, workers: int | None = None, backend: str = "whisper"
+) -> ProcessPoolExecutor:
+    """
+    Start a pool of worker processes, each loading its own copy of the model.
+
+    Every worker gets an equal share of the CPU threads, so the workers together use
+    every core without oversubscribing them.
+
+    Args:
+        model_option (str): The name of the Whisper model each worker loads.
+        workers (int | None, optional): The number of worker processes, capped by `transcription_workers`. Defaults to 2.
+        backend (str, optional): The inference backend running the model. Defaults to "whisper".
+
+    Returns:
+        ProcessPoolExecutor: The pool.
+    """
+
+    workers = transcription_workers(model_option, backend, workers)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    # Spawned, since forking a process that has already loaded torch can deadlock
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(model_option, backend, threads),
+    )
+
+
+def transcribe_file_on_pool(pool: ProcessPoolExecutor, path: str, **options) -> dict:
+    """
+    Transcribe a whole file on a pool from `start_transcription_pool`.
+
+    Args:
+        pool (ProcessPoolExecutor): The transcription pool.
+        path (str): The path to the audio file.
+        **options: Extra decoding options passed to Whisper (e.g. language).
+
+    Returns:
+        dict: The Whisper result.
+    """
+
+    return pool.submit(_transcribe_path, path, options).result()
+
+
+def transcribe_chunks(
+    model_option: str,
+    audio: np.ndarray,
+    chunks: list[Chunk],
+    workers: int | None = None,
+    backend: str = "whisper",
+    **options,
+) -> Iterator[tuple[Chunk, dict]]:
+    """
+    Transcribe the chunks of a recording on a pool of worker processes.
+
+    At most two chunks per worker are submitted at any time, so only those waveform
+    slices are being sent to the pool. Chunks without speech are not transcribed.
+
+    Args:
+        model_option (str): The name of the Whisper model each worker loads.
+        audio (np.ndarray): The 16 kHz waveform.
+        chunks (list[Chunk]): The chunks to transcribe, from `plan_chunks`.
+        workers (int | None, optional): The number of worker processes, capped by `transcription_workers`. Defaults to 2.
+        backend (str, optional): The inference backend running the model. Defaults to "whisper".
+        **options: Extra decoding options passed to Whisper (e.g. language).
+
+    Yields:
+        tuple[Chunk, dict]: Each chunk with its result, in completion order.
+    """
+
+    workers = transcription_workers(model_option, backend, workers)
+
+    with start_transcription_pool(model_option, workers, backend) as executor:
+
+        pending: dict[Future, Chunk] = {}
+
+        for chunk in chunks:
+
+            if not chunk.speech:
+
+                yield chunk, {"language": None, "segments": []}
+                continue
+
+            future = executor.submit(
+                _transcribe_chunk, audio[chunk.start : chunk.end], options
+            )
+            pending[future] = chunk
+
+            if len(pending) >= 2 * workers:
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+
+                    yield pending.pop(future), future.result()
+
+        while pending:
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+
+                yield pending.pop(future), future.result()
+
+
+def stitch_segments(results: list[tuple[Chunk, dict]]) -> dict:
+    """
+    Merge the results of the chunks into a single transcription.
+
+    Times are shifted from the chunk to the recording, and each word is kept only by
+    the chunk whose own part contains its midpoint, which drops the copies
+    transcribed twice in the margins around the cuts. Whisper merges the speech of a
+    margin into the first or last segment of the chunk, so segments are trimmed to
+    their kept words rather than kept or dropped whole; segments without word times
+    fall back to the midpoint of the segment.
+
+    Args:
+        results (list[tuple[Chunk, dict]]): Each chunk with its result, in any order.
+
+    Returns:
+        dict: The result in the format of Whisper, with "text", "segments" and "language".
+    """
+
+    segments = []
+    languages = []
+
+    for chunk, result in sorted(results, key=lambda item: item[0].index):
+
+        offset = chunk.start / SAMPLE_RATE
+        keep_start = chunk.keep_start / SAMPLE_RATE
+        keep_end = chunk.keep_end / SAMPLE_RATE
+
+        if result["language"]:
+
+            languages.append(result["language"])
+
+        for segment in result["segments"]:
+
+            if segment.get("words"):
+
+                words = [
+                    {
+                        **word,
+                        "start": word["start"] + offset,
+                        "end": word["end"] + offset,
+                    }
+                    for word in segment["words"]
+                    if keep_start
+                    <= (word["start"] + word["end"]) / 2 + offset
+                    < keep_end
+                ]
+
+                if not words:
+
+                    continue
+
+                # The text is rebuilt from the kept words when a margin dropped some
+                segment = {
+                    **segment,
+                    "start": words[0]["start"],
+                    "end": words[-1]["end"],
+                    "text": (
+                        segment["text"]
+                        if len(words) == len(segment["words"])
+                        else "".join(word["word"] for word in words)
+                    ),
+                    "words": words,
+                }
+
+            else:
+
+                start = segment["start"] + offset
+                end = segment["end"] + offset
+
+                if not keep_start <= (start + end) / 2 < keep_end:
+
+                    continue
+
+                segment = {**segment, "start": start, "end": end}
+
+            segments.append({**segment, "id": len(segments)})
+
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": max(set(languages), key=languages.count) if languages else None,
+    }
@@ -0,0 +1,220 @@
+import os
+import re
+from typing import Callable
+from urllib.parse import parse_qs, urlparse
+
+from university_helper.cache import CACHE_DIR
+
+# Directory and maximum size of the downloaded audio, kept to be transcribed again
+DOWNLOAD_DIR = os.path.join(CACHE_DIR, "youtube")
+DOWNLOAD_CACHE_BYTES = 2 * 1024 * 1024 * 1024
+
+# Video IDs are 11 characters long, from the URL-safe base64 alphabet
+VIDEO_ID = re.compile(r"[\w-]{11}")
+
+
+def youtube_video_id(url: str) -> str | None:
+    """
+    Get the ID of a YouTube video from its URL, without contacting YouTube.
+
+    Handles the watch, short (youtu.be), shorts, live and embed URL forms.
+
+    Args:
+        url (str): The URL of the video.
+
+    Returns:
+        str | None: The video ID, or None if the URL is not a YouTube video URL.
+    """
+
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or "").removeprefix("www.").removeprefix("m.")
+
+    if host == "youtu.be":
+
+        candidate = parsed.path.strip("/").split("/")[0]
+
+    elif host in ("youtube.com", "music.youtube.com", "youtube-nocookie.com"):
+
+        parts = parsed.path.strip("/").split("/")
+
+        if parts[0] == "watch":
+
+            candidate = parse_qs(parsed.query).get("v", [""])[0]
+
+        elif parts[0] in ("shorts", "live", "embed", "v") and len(parts) > 1:
+
+            candidate = parts[1]
+
+        else:
+
+            return None
+
+    else:
+
+        return None
+
+    return candidate if VIDEO_ID.fullmatch(candidate) else None
+
+
+def cached_download(video_id: str, directory: str = DOWNLOAD_DIR) -> str | None:
+    """
+    Get the audio of a video downloaded before, marking it as recently used.
+
+    Args:
+        video_id (str): The ID of the video.
+        directory (str, optional): The directory of the download cache. Defaults to DOWNLOAD_DIR.
+
+    Returns:
+        str | None: The path to the audio file, or None if it has not been downloaded.
+    """
+
+    if not os.path.isdir(directory):
+
+        return None
+
+    for name in os.listdir(directory):
+
+        stem, extension = os.path.splitext(name)
+
+        # Partial downloads end with .part, or .ytdl for their resume state
+        if stem == video_id and extension not in (".part", ".ytdl"):
+
+            path = os.path.join(directory, name)
+            os.utime(path)
+
+            return path
+
+    return None
+
+
+def prune_downloads(
+    directory: str = DOWNLOAD_DIR,
+    max_bytes: int = DOWNLOAD_CACHE_BYTES,
+    keep: str | None = None,
+) -> None:
+    """
+    Delete the least recently used downloads until the cache fits in its size limit.
+
+    Args:
+        directory (str, optional): The directory of the download cache. Defaults to DOWNLOAD_DIR.
+        max_bytes (int, optional): The maximum total size of the downloads. Defaults to DOWNLOAD_CACHE_BYTES.
+        keep (str | None, optional): A download never deleted, such as the one about to be used. Defaults to None.
+    """
+
+    entries = []
+
+    for entry in os.scandir(directory):
+
+        # Downloads still in progress are left alone
+        if entry.is_file() and not entry.name.endswith((".part", ".ytdl")):
+
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+
+    for _, size, path in sorted(entries):
+
+        if total <= max_bytes:
+
+            break
+
+        if path == keep:
+
+            continue
+
+        try:
+
+            os.remove(path)
+            total -= size
+
+        except FileNotFoundError:
+
+            # Already removed by another session
+            total -= size
+
+
+def download_audio(
+    url: str,
+    directory: str = DOWNLOAD_DIR,
+    progress_hook: Callable[[dict], None] | None = None,
+) -> str:
+    """
+    Download the audio of a video in its native container, reusing earlier downloads.
+
+    The best audio-only format is saved as served (usually Opus in WebM or AAC in
+    MP4), without transcoding it, since it is decoded to 16 kHz PCM right after.
+
+    Args:
+        url (str): The URL of the video.
+        directory (str, optional): The directory of the download cache. Defaults to DOWNLOAD_DIR.
+        progress_hook (Callable[[dict], None] | None, optional): Called with the yt-dlp download status. Defaults to None.
+
+    Returns:
+        str: The path to the audio file.
+    """
+
+    video_id = youtube_video_id(url)
+
+    if video_id is not None and (path := cached_download(video_id, directory)):
+
+        return path
+
+    import yt_dlp
+
+    os.makedirs(directory, exist_ok=True)
+    ydl_opts = {
+        "format": "bestaudio/best",
+        "outtmpl": os.path.join(directory, "%(id)s.%(ext)s"),
+        "quiet": True,
+        "noplaylist": True,
+        "progress_hooks": [progress_hook] if progress_hook else [],
+    }
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+
+        info_dict = ydl.extract_info(url, download=True)
+        path = ydl.prepare_filename(info_dict)
+
+    os.utime(path)
+    prune_downloads(directory, keep=path)
+
+    return path
+
+
+def expand_playlist(url: str) -> tuple[str | None, list[dict]]:
+    """
+    List the videos of a playlist URL, or the single video of a video URL.
+
+    Only the playlist page is fetched, not the pages of its videos.
+
+    Args:
+        url (str): The URL of the playlist or video.
+
+    Returns:
+        tuple[str | None, list[dict]]: The title of the playlist, or None for a video, and the "id", "title" and "url" of each video, in playlist order.
+    """
+
+    import yt_dlp
+
+    ydl_opts = {"quiet": True, "extract_flat": "in_playlist"}
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+
+        info = ydl.extract_info(url, download=False)
+
+    if info.get("_type") != "playlist":
+
+        return None, [{"id": info["id"], "title": info.get("title"), "url": url}]
+
+    videos = [
+        {
+            "id": entry["id"],
+            "title": entry.get("title"),
+            "url": f"https://www.youtube.com/watch?v={entry['id']}",
+        }
+        for entry in info.get("entries") or []
+        if entry and entry.get("id")
+    ]
+
+    return info.get("title"), videos
@@ -0,0 +1,110 @@
+import math
+import wave
+
+import numpy as np
+import pytest
+
+from university_helper.audio import (
+    SAMPLE_RATE,
+    Resampler,
+    decode_audio,
+    pcm_to_float32,
+    resample,
+)
+
+RATES = (8000, 11025, 22050, 44100, 48000)
+
+
+def sine(frequency: float, seconds: float, rate: int) -> np.ndarray:
+
+    return np.sin(2 * np.pi * frequency * np.arange(int(seconds * rate)) / rate).astype(
+        np.float32
+    )
+
+
+@pytest.mark.parametrize("rate", RATES)
+def test_resample_keeps_the_duration(rate):
+
+    audio = sine(440, 1.37, rate)
+
+    assert len(resample(audio, rate)) == math.ceil(len(audio) * SAMPLE_RATE / rate)
+
+
+@pytest.mark.parametrize("rate", RATES)
+def test_resample_matches_the_band_limited_signal(rate):
+
+    audio = resample(sine(440, 1.0, rate), rate)
+    expected = sine(440, 1.0, SAMPLE_RATE)[: len(audio)]
+
+    # The edges are filtered against the silence around the waveform
+    margin = SAMPLE_RATE // 100
+    assert np.abs(audio - expected)[margin:-margin].max() < 1e-3
+
+
+@pytest.mark.parametrize("rate", RATES)
+@pytest.mark.parametrize("block", (1, 317, 4096))
+def test_resample_by_blocks_matches_a_whole_call(rate, block):
+
+    audio = np.random.default_rng(0).uniform(-1, 1, rate // 2).astype(np.float32)
+    resampler = Resampler(rate)
+    blocks = [
+        resampler.process(audio[i : i + block]) for i in range(0, len(audio), block)
+    ]
+    blocks.append(resampler.flush())
+
+    np.testing.assert_allclose(np.concatenate(blocks), resample(audio, rate), atol=1e-6)
+
+
+def test_resample_at_the_target_rate_is_the_identity():
+
+    audio = sine(440, 0.5, SAMPLE_RATE)
+
+    np.testing.assert_array_equal(resample(audio, SAMPLE_RATE), audio)
+
+
+@pytest.mark.parametrize("sample_width", (1, 2, 3, 4))
+def test_pcm_to_float32_scales_to_unit_range(sample_width):
+
+    bits = 8 * sample_width
+    values = [-(2 ** (bits - 1)), 0, 2 ** (bits - 1) - 1]
+
+    if sample_width == 1:
+
+        data = bytes(value + 128 for value in values)
+
+    else:
+
+        data = b"".join(
+            value.to_bytes(sample_width, "little", signed=True) for value in values
+        )
+
+    audio = pcm_to_float32(data, sample_width)
+
+    assert audio.dtype == np.float32
+    np.testing.assert_allclose(audio, [-1, 0, 1], atol=1e-2)
+
+
+def test_pcm_to_float32_mixes_channels_down():
+
+    stereo = np.array([[16384, -16384], [8192, 8192]], "<i2").tobytes()
+
+    np.testing.assert_allclose(pcm_to_float32(stereo, 2, 2), [0, 0.25])
+
+
+def test_decode_audio_reads_a_wav_file_block_by_block(tmp_path):
+
+    rate = 44100
+    audio = sine(440, 2.5, rate)
+    path = tmp_path / "tone.wav"
+
+    with wave.open(str(path), "wb") as wav:
+
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((audio * 32767).astype("<i2").tobytes())
+
+    decoded = decode_audio(str(path), block_seconds=0.3)
+
+    assert len(decoded) == math.ceil(len(audio) * SAMPLE_RATE / rate)
+    np.testing.assert_allclose(decoded, resample(audio, rate), atol=1e-3)
@@ -0,0 +1,83 @@
+import itertools
+
+import pytest
+
+from university_helper import cache as cache_module
+from university_helper.cache import DiskCache, make_key
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    """
+    Make every access time distinct, so the LRU order does not depend on the clock.
+    """
+
+    ticks = itertools.count()
+    monkeypatch.setattr(cache_module.time, "time", lambda: float(next(ticks)))
+
+
+def test_make_key_is_stable_and_distinct():
+
+    assert make_key("page", 1, {"lang": "eng"}) == make_key("page", 1, {"lang": "eng"})
+    assert make_key("page", 1) != make_key("page", 2)
+
+
+def test_get_returns_what_was_put(tmp_path):
+
+    cache = DiskCache(str(tmp_path), max_bytes=100)
+    cache.put("a", b"value")
+
+    assert cache.get("a") == b"value"
+    assert cache.get("b") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1, "bytes": 5}
+
+
+def test_put_evicts_the_least_recently_used(tmp_path):
+
+    cache = DiskCache(str(tmp_path), max_bytes=30)
+
+    for key in "abc":
+
+        cache.put(key, b"x" * 10)
+
+    # Reading "a" makes "b" the least recently used entry
+    cache.get("a")
+    cache.put("d", b"x" * 10)
+
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in "acd")
+    assert cache.stats()["bytes"] == 30
+
+
+def test_put_evicts_until_the_value_fits(tmp_path):
+
+    cache = DiskCache(str(tmp_path), max_bytes=30)
+
+    for key in "abc":
+
+        cache.put(key, b"x" * 10)
+
+    cache.put("big", b"x" * 25)
+
+    assert [key for key in ("a", "b", "c", "big") if cache.get(key)] == ["big"]
+
+
+def test_entries_survive_reopening_with_the_same_version(tmp_path):
+
+    DiskCache(str(tmp_path), max_bytes=100, version="1").put("a", b"value")
+
+    assert DiskCache(str(tmp_path), max_bytes=100, version="1").get("a") == b"value"
+
+
+def test_a_new_version_drops_every_entry(tmp_path):
+
+    DiskCache(str(tmp_path), max_bytes=100, version="1").put("a", b"value")
+    cache = DiskCache(str(tmp_path), max_bytes=100, version="2")
+
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+    # The new version is recorded, so reopening keeps the new entries
+    cache.put("b", b"value")
+
+    assert DiskCache(str(tmp_path), max_bytes=100, version="2").get("b") == b"value"
@@ -0,0 +1,132 @@
+import threading
+import time
+
+from university_helper.jobs import JobQueue, load_journal, set_stage
+
+
+def wait_until(condition, timeout: float = 5.0) -> None:
+
+    deadline = time.monotonic() + timeout
+
+    while not condition():
+
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def idle(queue: JobQueue) -> bool:
+
+    summary = queue.summary()
+
+    return summary["queued"] + summary["running"] == 0
+
+
+def test_jobs_report_their_units_and_stage():
+
+    def run(pages: int) -> int:
+
+        set_stage("converting")
+        return pages
+
+    queue = JobQueue(run, workers=2)
+    jobs = [queue.submit(f"file {i}", i) for i in range(5)]
+    wait_until(lambda: idle(queue))
+
+    assert [job.status for job in jobs] == ["done"] * 5
+    assert queue.summary()["units"] == sum(range(5))
+    assert [row["stage"] for row in queue.table()] == [None] * 5
+
+
+def test_a_failed_job_is_retried():
+
+    calls = []
+
+    def run(name: str) -> int:
+
+        calls.append(name)
+
+        if len(calls) < 3:
+
+            raise OSError("network down")
+
+        return 1
+
+    queue = JobQueue(run, retries=2)
+    job = queue.submit("video", "video")
+    wait_until(lambda: idle(queue))
+
+    assert job.status == "done"
+    assert job.attempts == 3
+    assert job.error is None
+
+
+def test_a_job_fails_once_its_retries_are_exhausted():
+
+    def run() -> int:
+
+        raise ValueError("broken file")
+
+    queue = JobQueue(run, retries=1)
+    job = queue.submit("file")
+    wait_until(lambda: idle(queue))
+
+    assert job.status == "failed"
+    assert job.attempts == 2
+    assert job.error == "ValueError: broken file"
+    assert queue.summary()["failed"] == 1
+
+
+def test_finished_jobs_release_their_arguments():
+
+    queue = JobQueue(len)
+    job = queue.submit("upload", b"%PDF" * 1000)
+    wait_until(lambda: idle(queue))
+
+    assert job.status == "done" and job.units == 4000
+    assert job.args == ()
+
+
+def test_shutdown_cancels_the_queued_jobs(tmp_path):
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def run(name: str) -> int:
+
+        started.set()
+        release.wait(5)
+        return 1
+
+    journal = str(tmp_path / "jobs.json")
+    queue = JobQueue(run, workers=1, journal=journal)
+    running = queue.submit("first", "first")
+    queued = [queue.submit(name, name) for name in ("second", "third")]
+    started.wait(5)
+    queue.shutdown()
+    release.set()
+    wait_until(lambda: running.status == "done")
+
+    assert [job.status for job in queued] == ["cancelled", "cancelled"]
+    assert queue.summary()["cancelled"] == 2
+
+    saved = {job.name: job.status for job in load_journal(journal)}
+    assert saved == {"first": "done", "second": "cancelled", "third": "cancelled"}
+
+
+def test_the_journal_keeps_the_arguments_of_unfinished_jobs(tmp_path):
+
+    release = threading.Event()
+    journal = str(tmp_path / "jobs.json")
+    queue = JobQueue(lambda source, output: release.wait(5), journal=journal)
+    queue.submit("a", "a.mp3", "a.md")
+    queue.submit("b", "b.mp3", "b.md")
+
+    unfinished = {job.name: job.args for job in load_journal(journal)}
+    release.set()
+
+    assert unfinished == {"a": ("a.mp3", "a.md"), "b": ("b.mp3", "b.md")}
+
+
+def test_load_journal_without_a_file(tmp_path):
+
+    assert load_journal(str(tmp_path / "missing.json")) == []
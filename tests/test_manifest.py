@@ -0,0 +1,152 @@
+import os
+
+import pytest
+
+# The manifest records the results of the metadata pipeline, which needs reportlab
+pytest.importorskip("reportlab")
+
+from university_helper import manifest as manifest_module
+from university_helper.manifest import Manifest
+from university_helper.metadata import (
+    FileResult,
+    hash_file,
+    plan_directory,
+    process_file,
+)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """
+    Create a tree of text files and plan it, with the outputs already written.
+    """
+
+    original = tmp_path / "original"
+    new = tmp_path / "new"
+
+    for name in ("a.txt", "b.txt", os.path.join("sub", "c.txt")):
+
+        path = original / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+
+    tasks = plan_directory(str(original), str(new))
+
+    for task in tasks:
+
+        with open(task.output_path, "w") as f:
+
+            f.write("output")
+
+    return str(new), tasks
+
+
+def plan_directory_again(tasks: list, new: str) -> list:
+    """
+    Plan the tree again, as the next run does.
+    """
+
+    original = os.path.dirname(tasks[0].source_path)
+
+    return plan_directory(original, new)
+
+
+def record_done(new: str, tasks: list) -> None:
+
+    with Manifest(new) as manifest:
+
+        for task in tasks:
+
+            manifest.record(FileResult(task, content_hash=hash_file(task.source_path)))
+
+
+def test_pending_skips_files_done_by_a_previous_run(tree):
+
+    new, tasks = tree
+    record_done(new, tasks)
+
+    with Manifest(new) as manifest:
+
+        assert list(manifest.pending(plan_directory_again(tasks, new))) == []
+        assert manifest.skipped == len(tasks)
+
+
+def test_pending_yields_new_failed_and_missing_files(tree):
+
+    new, tasks = tree
+
+    with Manifest(new) as manifest:
+
+        manifest.record(FileResult(tasks[0], content_hash="a"))
+        manifest.record(FileResult(tasks[1], "OSError: disk full"))
+        manifest.record(FileResult(tasks[2], content_hash="c"))
+
+    os.remove(tasks[2].output_path)
+    added = os.path.join(os.path.dirname(tasks[0].source_path), "d.txt")
+
+    with open(added, "w") as f:
+
+        f.write("d.txt")
+
+    with Manifest(new) as manifest:
+
+        pending = [
+            task.source_path
+            for task in manifest.pending(plan_directory_again(tasks, new))
+        ]
+
+    assert pending == [tasks[1].source_path, added, tasks[2].source_path]
+
+
+def test_pending_attaches_the_hash_of_modified_files(tree):
+
+    new, tasks = tree
+    record_done(new, tasks)
+    os.utime(tasks[0].source_path, (0, 0))
+
+    with Manifest(new) as manifest:
+
+        (task,) = manifest.pending(plan_directory_again(tasks, new))
+
+    assert task.source_path == tasks[0].source_path
+    assert task.known_hash == hash_file(task.source_path)
+
+    # Only the modification time changed, so the worker skips the file
+    result = process_file(task, "Degree")
+    assert result.skipped and result.content_hash == task.known_hash
+
+
+def test_an_interrupted_run_resumes_after_its_last_commit(tree, monkeypatch):
+
+    new, tasks = tree
+    monkeypatch.setattr(manifest_module, "COMMIT_EVERY", 2)
+
+    # Recorded without closing the manifest, as when the process is killed
+    manifest = Manifest(new)
+
+    for task in tasks:
+
+        manifest.record(FileResult(task, content_hash=hash_file(task.source_path)))
+
+    with Manifest(new) as resumed:
+
+        pending = list(resumed.pending(plan_directory_again(tasks, new)))
+
+    manifest.connection.close()
+
+    assert [task.source_path for task in pending] == [tasks[2].source_path]
+
+
+def test_process_file_does_not_hash_mirrored_files(tree, monkeypatch):
+
+    new, tasks = tree
+    os.remove(tasks[0].output_path)
+    monkeypatch.setattr(
+        "university_helper.metadata.hash_file",
+        lambda path: pytest.fail("a mirrored file without a known hash was read"),
+    )
+
+    result = process_file(tasks[0], "Degree")
+
+    assert result.error is None and result.content_hash is None
+    assert open(tasks[0].output_path).read() == "a.txt"
@@ -0,0 +1,183 @@
+import numpy as np
+import pytest
+
+from university_helper.audio import SAMPLE_RATE
+from university_helper.transcription import Chunk, plan_chunks, stitch_segments
+
+# Length of each word of the synthetic transcripts, in seconds
+WORD_SECONDS = 0.4
+
+
+def speech_with_pauses(seconds: float, pauses: list[float]) -> np.ndarray:
+    """
+    Build loud noise with a one second silence starting at each pause.
+    """
+
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, int(seconds * SAMPLE_RATE))
+
+    for pause in pauses:
+
+        audio[int(pause * SAMPLE_RATE) : int((pause + 1) * SAMPLE_RATE)] = 0
+
+    return audio.astype(np.float32)
+
+
+def transcribe_words(chunk: Chunk, words: list[str], per_segment: int = 4) -> dict:
+    """
+    Fake the result of a chunk: every word within the chunk, in chunk time.
+    """
+
+    offset = chunk.start / SAMPLE_RATE
+    heard = [
+        {
+            "word": f" {word}",
+            "start": i * WORD_SECONDS - offset,
+            "end": (i + 1) * WORD_SECONDS - offset,
+        }
+        for i, word in enumerate(words)
+        if chunk.start <= i * WORD_SECONDS * SAMPLE_RATE
+        and (i + 1) * WORD_SECONDS * SAMPLE_RATE <= chunk.end
+    ]
+    segments = [
+        {
+            "id": index,
+            "start": group[0]["start"],
+            "end": group[-1]["end"],
+            "text": "".join(word["word"] for word in group),
+            "words": group,
+        }
+        for index, group in enumerate(
+            heard[i : i + per_segment] for i in range(0, len(heard), per_segment)
+        )
+    ]
+
+    return {"language": "en", "segments": segments}
+
+
+def test_plan_chunks_tiles_the_recording():
+
+    audio = speech_with_pauses(47.3, [8.5, 17.5, 27.0, 36.5])
+    chunks = plan_chunks(audio, chunk_seconds=10, overlap_seconds=1)
+
+    assert chunks[0].keep_start == 0 and chunks[-1].keep_end == len(audio)
+    assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+
+    for previous, chunk in zip(chunks, chunks[1:]):
+
+        assert previous.keep_end == chunk.keep_start
+
+    for chunk in chunks:
+
+        assert 0 <= chunk.start <= chunk.keep_start < chunk.keep_end <= chunk.end
+        assert chunk.keep_start - chunk.start <= SAMPLE_RATE
+        assert chunk.end - chunk.keep_end <= SAMPLE_RATE
+
+
+def test_plan_chunks_cuts_at_silences():
+
+    pauses = [8.5, 17.5, 27.0, 36.5]
+    audio = speech_with_pauses(47.3, pauses)
+    chunks = plan_chunks(audio, chunk_seconds=10, overlap_seconds=1)
+
+    for chunk, pause in zip(chunks, pauses):
+
+        assert pause <= chunk.keep_end / SAMPLE_RATE <= pause + 1
+
+
+def test_plan_chunks_marks_silent_chunks():
+
+    audio = speech_with_pauses(30, [])
+    audio[int(9.5 * SAMPLE_RATE) : int(20.5 * SAMPLE_RATE)] = 0
+    chunks = plan_chunks(audio, chunk_seconds=10, overlap_seconds=1)
+
+    # The energy is smoothed, so the frames just around the silence still sound loud
+    silent = [
+        chunk
+        for chunk in chunks
+        if 9.5 * SAMPLE_RATE <= chunk.keep_start
+        and chunk.keep_end <= 20.5 * SAMPLE_RATE
+    ]
+    loud = [
+        chunk
+        for chunk in chunks
+        if chunk.keep_start < 9 * SAMPLE_RATE or chunk.keep_end > 21 * SAMPLE_RATE
+    ]
+
+    assert silent and not any(chunk.speech for chunk in silent)
+    assert loud and all(chunk.speech for chunk in loud)
+
+
+def test_plan_chunks_of_a_short_recording():
+
+    assert plan_chunks(np.zeros(100, np.float32)) == [Chunk(0, 0, 100, 0, 100)]
+
+
+@pytest.mark.parametrize("overlap_seconds", (0.5, 1.0, 2.0))
+@pytest.mark.parametrize("per_segment", (1, 3, 7))
+def test_stitch_segments_keeps_every_word_once(overlap_seconds, per_segment):
+
+    audio = speech_with_pauses(47.3, [8.5, 17.5, 27.0, 36.5])
+    chunks = plan_chunks(audio, chunk_seconds=10, overlap_seconds=overlap_seconds)
+    words = [f"w{i}" for i in range(int(len(audio) / SAMPLE_RATE / WORD_SECONDS))]
+
+    # Completion order, as returned by the pool
+    results = [(chunk, transcribe_words(chunk, words, per_segment)) for chunk in chunks]
+    stitched = stitch_segments(results[::-1])
+
+    kept = [
+        word["word"].strip()
+        for segment in stitched["segments"]
+        for word in segment["words"]
+    ]
+    assert kept == words
+    assert stitched["text"].split() == words
+    assert [segment["id"] for segment in stitched["segments"]] == list(
+        range(len(stitched["segments"]))
+    )
+
+    for segment in stitched["segments"]:
+
+        assert segment["start"] == segment["words"][0]["start"]
+        assert segment["end"] == segment["words"][-1]["end"]
+        assert segment["text"] == "".join(word["word"] for word in segment["words"])
+
+
+def test_stitch_segments_without_word_times_uses_the_segment_midpoint():
+
+    chunks = [
+        Chunk(0, 0, 12 * SAMPLE_RATE, 0, 10 * SAMPLE_RATE),
+        Chunk(1, 8 * SAMPLE_RATE, 20 * SAMPLE_RATE, 10 * SAMPLE_RATE, 20 * SAMPLE_RATE),
+    ]
+    first = {
+        "language": "en",
+        "segments": [
+            {"start": 0.0, "end": 5.0, "text": " a"},
+            {"start": 5.0, "end": 9.0, "text": " b"},
+            {"start": 9.0, "end": 12.0, "text": " c"},
+        ],
+    }
+    second = {
+        "language": "es",
+        "segments": [
+            {"start": 0.0, "end": 1.0, "text": " b"},
+            {"start": 1.0, "end": 4.0, "text": " c"},
+            {"start": 4.0, "end": 12.0, "text": " d"},
+        ],
+    }
+
+    stitched = stitch_segments([(chunks[1], second), (chunks[0], first)])
+
+    assert stitched["text"] == " a b c d"
+    assert [segment["start"] for segment in stitched["segments"]] == [0, 5, 9, 12]
+    assert stitched["language"] in ("en", "es")
+
+
+def test_stitch_segments_skips_silent_chunks():
+
+    chunk = Chunk(0, 0, SAMPLE_RATE, 0, SAMPLE_RATE, speech=False)
+
+    assert stitch_segments([(chunk, {"language": None, "segments": []})]) == {
+        "text": "",
+        "segments": [],
+        "language": None,
+    }